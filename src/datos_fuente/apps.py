@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class DatosFuenteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'datos_fuente'
+
+    def ready(self):
+        # El contexto provincial en memoria se vuelve a leer después de cada carga, y la
+        # réplica de los informes se vuelve a verificar contra la nueva carga; el navegador
+        # de agregados vuelve a medir las vistas recién refrescadas
+        from .signals import carga_finalizada
+        from .contexto import invalidar_contextos
+        from .data_handler import invalidar_replica
+        from .navegador_agregados import invalidar_navegador
+        carga_finalizada.connect(invalidar_contextos, dispatch_uid='datos_fuente.invalidar_contextos')
+        carga_finalizada.connect(invalidar_replica, dispatch_uid='datos_fuente.invalidar_replica')
+        carga_finalizada.connect(invalidar_navegador, dispatch_uid='datos_fuente.invalidar_navegador')
@@ -0,0 +1,178 @@
+import re
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .plantillas_jinja import renderizar_plantilla
+
+logger = logging.getLogger(__name__)
+
+# Parámetros que pueden usarse como identificador (por ejemplo, el nombre de una columna
+# entre comillas dobles, como "{{ anio }}" en expo_por_provincia_top5). El valor se
+# inserta textualmente en el SQL, por eso debe cumplir con la expresión regular asociada.
+IDENTIFICADORES_PERMITIDOS = {
+    'anio': re.compile(r'^\d{4}$'),
+}
+
+# Literales entre comillas simples, identificadores entre comillas dobles, comentarios
+# (-- y /* */, que pueden contener comillas sueltas) y el resto del SQL
+_SEGMENTOS = re.compile(
+    r"('(?:[^']|'')*')|(\"(?:[^\"]|\"\")*\")|(--[^\n]*|/\*.*?\*/)|((?:[^'\"/-]|-(?!-)|/(?!\*))+|['\"/-])",
+    re.DOTALL,
+)
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_PLACEHOLDER_EXACTO = re.compile(r"^['\"]\{\{\s*(\w+)\s*\}\}['\"]$")
+_MARCADOR_IDENTIFICADOR = re.compile(r"\{ident:(\w+)\}")
+
+
+class PlantillaNoCompilable(Exception):
+    """ La plantilla usa construcciones de Jinja que no pueden traducirse a parámetros. """
+
+
+@dataclass(frozen=True)
+class ConsultaCompilada:
+    """
+    Resultado de compilar una plantilla SQL: el texto con parámetros ligados (:nombre),
+    los nombres de esos parámetros y los identificadores que se sustituyen al ejecutar.
+    `textos` son los parámetros que la plantilla usaba entre comillas simples, que se
+    ligan como texto. Si `jinja` es True, la plantilla no pudo compilarse y se renderiza
+    como texto.
+    """
+    sql: str
+    parametros: tuple = ()
+    identificadores: tuple = ()
+    textos: tuple = ()
+    jinja: bool = False
+
+    def preparar(self, params: dict) -> tuple:
+        """
+        Devuelve el SQL listo para ejecutar y el diccionario de valores a ligar.
+
+        Raises:
+            KeyError: Si falta un parámetro requerido por la plantilla.
+            ValueError: Si el valor de un identificador no está permitido.
+        """
+        if self.jinja:
+            return renderizar_plantilla(self.sql, params), {}
+
+        sql = self.sql
+        if self.identificadores:
+            sql = _MARCADOR_IDENTIFICADOR.sub(lambda m: _validar_identificador(m.group(1), params), sql)
+        valores = {nombre: params[nombre] for nombre in self.parametros}
+        for nombre in self.textos:
+            # Igual que al renderizar el literal con Jinja
+            valores[nombre] = str(valores[nombre])
+        return sql, valores
+
+    def sustituir(self, expresiones: dict) -> 'ConsultaCompilada':
+        """
+        Devuelve una copia en la que los parámetros indicados se reemplazan por
+        expresiones SQL (por ejemplo, una columna de una tabla externa).
+
+        Args:
+            expresiones: Un diccionario {nombre_parametro: expresion_sql}.
+        """
+        sql = self.sql
+        for nombre, expresion in expresiones.items():
+            if nombre in self.parametros:
+                sql = re.sub(rf"(?<![:\w]):{nombre}\b", lambda m: expresion, sql)
+        return ConsultaCompilada(
+            sql=sql,
+            parametros=tuple(p for p in self.parametros if p not in expresiones),
+            identificadores=self.identificadores,
+            textos=tuple(p for p in self.textos if p not in expresiones),
+            jinja=self.jinja,
+        )
+
+
+def _validar_identificador(nombre: str, params: dict) -> str:
+    valor = str(params[nombre])
+    if not IDENTIFICADORES_PERMITIDOS[nombre].match(valor):
+        raise ValueError(f"El valor '{valor}' no es válido como identificador para '{nombre}'.")
+    return valor
+
+
+def _compilar(plantilla_sql: str) -> ConsultaCompilada:
+    partes = []
+    parametros = []
+    identificadores = []
+    textos = []
+    ligados = []
+
+    for literal, identificador, comentario, codigo in _SEGMENTOS.findall(plantilla_sql):
+        if comentario:
+            partes.append(" ")
+            continue
+        segmento = literal or identificador or codigo
+        if "{{" not in segmento:
+            partes.append(segmento)
+            continue
+
+        if literal:
+            # Solo se admite un literal que sea exactamente el placeholder: '{{ nombre }}'
+            exacto = _PLACEHOLDER_EXACTO.match(segmento)
+            if not exacto:
+                raise PlantillaNoCompilable(f"Placeholder dentro de un literal: {segmento}")
+            # El literal era texto sin tipo: el parámetro se liga como texto, para que las
+            # comparaciones y los casts ('{{ anio }}'::date) se resuelvan igual que antes
+            parametros.append(exacto.group(1))
+            textos.append(exacto.group(1))
+            partes.append(f"CAST(:{exacto.group(1)} AS text)")
+        elif identificador:
+            for nombre in _PLACEHOLDER.findall(segmento):
+                if nombre not in IDENTIFICADORES_PERMITIDOS:
+                    raise ValueError(f"El parámetro '{nombre}' no está permitido como identificador.")
+                identificadores.append(nombre)
+            partes.append(_PLACEHOLDER.sub(lambda m: f"{{ident:{m.group(1)}}}", segmento))
+        else:
+            ligados.extend(_PLACEHOLDER.findall(segmento))
+            parametros.extend(_PLACEHOLDER.findall(segmento))
+            partes.append(_PLACEHOLDER.sub(lambda m: f":{m.group(1)}", segmento))
+
+    sql = "".join(partes)
+    if "{{" in sql or "{%" in sql or "{#" in sql:
+        raise PlantillaNoCompilable("La plantilla usa expresiones o bloques de Jinja.")
+    # Un mismo parámetro ligado como texto y con su propio tipo necesitaría dos valores
+    ambiguos = set(textos) & set(ligados)
+    if ambiguos:
+        raise PlantillaNoCompilable(f"Parámetros usados dentro y fuera de un literal: {', '.join(sorted(ambiguos))}")
+
+    return ConsultaCompilada(
+        sql=sql,
+        parametros=tuple(dict.fromkeys(parametros)),
+        identificadores=tuple(dict.fromkeys(identificadores)),
+        textos=tuple(dict.fromkeys(textos)),
+    )
+
+
+@lru_cache(maxsize=512)
+def compilar_plantilla(plantilla_sql: str) -> ConsultaCompilada:
+    """
+    Convierte los placeholders {{ nombre }} de una plantilla SQL en parámetros ligados
+    (:nombre), de modo que el texto de la consulta sea el mismo para todas las
+    provincias y años y el driver pueda reutilizar sentencias preparadas y planes.
+
+    Un literal que es exactamente un placeholder ('{{ nombre }}') pasa a CAST(:nombre AS
+    text), así conserva el tipo texto del literal. Los placeholders entre comillas dobles
+    se tratan como identificadores y solo se aceptan si figuran en
+    IDENTIFICADORES_PERMITIDOS. Los comentarios del SQL se descartan. Las plantillas con construcciones
+    que no pueden traducirse (filtros, bloques, placeholders dentro de literales) se
+    marcan para seguir renderizándose con Jinja.
+
+    El resultado se cachea por texto de plantilla, así que cada componente se compila
+    una sola vez por proceso.
+
+    Args:
+        plantilla_sql: El texto de Componente.plantilla_sql.
+
+    Returns:
+        Una ConsultaCompilada.
+
+    Raises:
+        ValueError: Si la plantilla usa como identificador un parámetro no permitido.
+    """
+    try:
+        return _compilar(plantilla_sql)
+    except PlantillaNoCompilable as e:
+        logger.warning(f"La plantilla no pudo compilarse a parámetros ligados, se renderiza con Jinja: {e}")
+        return ConsultaCompilada(sql=plantilla_sql, jinja=True)
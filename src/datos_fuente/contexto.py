@@ -0,0 +1,84 @@
+import threading
+import time
+import logging
+
+from .models import IndicadoresContexto, Provincia
+
+logger = logging.getLogger(__name__)
+
+# Parámetros derivados de la provincia que se agregan a los de cada informe, con el
+# campo de Provincia o de IndicadoresContexto del que salen. Así las plantillas pueden
+# comparar contra {{ region_cofecyt }} en lugar de repetir
+# (SELECT region_cofecyt FROM ref_provincia WHERE provincia_id = {{ provincia_id }}).
+CAMPOS_PROVINCIA = {
+    'provincia_nombre': 'nombre',
+    'region_cofecyt': 'region_cofecyt',
+    'region_id': 'region_id',
+    'region_mincyt': 'region_mincyt',
+    'codigo_indec': 'codigo_indec',
+}
+CAMPOS_INDICADORES = {
+    'poblacion': 'poblacion_censo_2022',
+    'pea_miles': 'pea_miles_censo_2022',
+}
+
+# Contexto de todas las provincias, por provincia_id. Provincia solo cambia al recargar
+# los datos, así que se lee una vez por proceso y se descarta al terminar cada carga.
+# La señal solo llega al proceso que hizo la carga: en los demás (por ejemplo, los
+# workers de gunicorn) el contexto vence a los TTL_CONTEXTO segundos.
+TTL_CONTEXTO = 600
+
+_contextos = None
+_contextos_cargados = 0.0
+_contextos_lock = threading.Lock()
+
+
+def _cargar_contextos() -> dict:
+    indicadores = {
+        fila['id']: fila
+        for fila in IndicadoresContexto.objects.values('id', *CAMPOS_INDICADORES.values())
+    }
+    contextos = {}
+    for provincia in Provincia.objects.all():
+        fila = indicadores.get(provincia.provincia_id, {})
+        contextos[provincia.provincia_id] = {
+            **{parametro: getattr(provincia, campo) for parametro, campo in CAMPOS_PROVINCIA.items()},
+            **{parametro: fila.get(campo) for parametro, campo in CAMPOS_INDICADORES.items()},
+        }
+    logger.info(f"Contexto provincial cargado para {len(contextos)} provincias.")
+    return contextos
+
+
+def contexto_provincia(provincia_id: int) -> dict:
+    """
+    Devuelve los parámetros derivados de una provincia (nombre, regiones y su clave,
+    código INDEC, población y PEA) para agregarlos a los parámetros de un informe.
+
+    Args:
+        provincia_id: El ID de la provincia.
+
+    Returns:
+        Un diccionario nuevo con los parámetros de CAMPOS_PROVINCIA y CAMPOS_INDICADORES.
+
+    Raises:
+        Provincia.DoesNotExist: Si la provincia no existe.
+    """
+    global _contextos, _contextos_cargados
+    contextos = _contextos
+    if contextos is None or time.monotonic() - _contextos_cargados > TTL_CONTEXTO:
+        with _contextos_lock:
+            if _contextos is None or time.monotonic() - _contextos_cargados > TTL_CONTEXTO:
+                _contextos = _cargar_contextos()
+                _contextos_cargados = time.monotonic()
+            contextos = _contextos
+    try:
+        return dict(contextos[provincia_id])
+    except KeyError:
+        raise Provincia.DoesNotExist(f"La provincia con ID {provincia_id} no existe.")
+
+
+def invalidar_contextos(**kwargs):
+    """ Descarta el contexto cargado. Se conecta a la señal de fin de carga de datos. """
+    global _contextos
+    with _contextos_lock:
+        _contextos = None
@@ -1,55 +1,916 @@
+import asyncio
+import json
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Iterator
+
 import pandas as pd
-from jinja2 import Template
-from sqlalchemy import create_engine, text
+import psycopg2.extensions
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
 from django.conf import settings
 import logging
 
+from .compilador_sql import compilar_plantilla
+from .contexto import contexto_provincia
+from .metricas import ESPERA_POOL, contar_error
+
 # Configuración de un logger para este módulo
 logger = logging.getLogger(__name__)
 
-def ejecutar_consulta_parametrizada(plantilla_sql: str, params: dict) -> pd.DataFrame:
+# Valores por defecto del pool, sobrescribibles desde settings.DATABASES['default']['POOL']
+# Con psycopg (3) las consultas que se repiten se preparan en el servidor y el modo
+# 'lote' usa pipeline; con 'psycopg2' se pierden las dos cosas.
+POOL_POR_DEFECTO = {
+    'DRIVER': 'psycopg',
+    'SIZE': 5,
+    'MAX_OVERFLOW': 10,
+    'TIMEOUT': 30,
+    'PRE_PING': True,
+    'RECYCLE': 1800,
+    'NUMERIC_A_FLOAT': True,
+}
+
+# Parámetros que dependen de la provincia y la expresión que los reemplaza cuando una
+# consulta se ejecuta para todas las provincias a la vez (ver ejecutar_consulta_por_provincia).
+# Incluye los del contexto provincial (datos_fuente.contexto).
+PARAMETROS_PROVINCIALES = {
+    'provincia_id': '__barrido.provincia_id',
+    'provincia_nombre': '__barrido.provincia',
+    'region_cofecyt': '__barrido.region_cofecyt',
+    'region_id': '__barrido.region_id',
+    'region_mincyt': '__barrido.region_mincyt',
+    'codigo_indec': '__barrido.codigo_indec',
+    'poblacion': '__contexto.poblacion_censo_2022',
+    'pea_miles': '__contexto.pea_miles_censo_2022',
+}
+
+# Base de solo lectura para las consultas de los informes: el alias de DATABASES, cada
+# cuántos segundos se verifica que responda y tenga la última carga (ver alias_lectura)
+# y el tiempo máximo para conectarse a ella. Sobrescribibles desde settings.INFORMES_REPLICA.
+REPLICA_POR_DEFECTO = {
+    'ALIAS': 'reportes',
+    'VERIFICAR_CADA': 10,
+    'TIMEOUT_CONEXION': 3,
+}
+
+# Motores de SQLAlchemy compartidos por todo el proceso, uno por alias de DATABASES.
+# Se construyen de forma perezosa en la primera consulta para no abrir conexiones al
+# importar el módulo.
+_engines = {}
+_engine_lock = threading.Lock()
+
+# Motores asíncronos (asyncpg), uno por event loop y alias: las conexiones de asyncpg
+# quedan atadas al loop que las creó y no pueden compartirse entre loops. Viven mientras
+# haya algún bloque `engines_async` abierto en el loop.
+_engines_async = weakref.WeakKeyDictionary()
+
+# Conexión reservada por cada hilo (ver conexion_reservada)
+_reserva = threading.local()
+
+# Alias elegido para las lecturas y el momento (time.monotonic) de la última verificación
+_replica_lock = threading.Lock()
+_replica = {'alias': 'default', 'verificada': None}
+
+_estadisticas_lock = threading.Lock()
+_estadisticas = {
+    'conexiones_creadas': 0,
+    'checkouts': 0,
+    'checkins': 0,
+    'espera_total_seg': 0.0,
+    'espera_max_seg': 0.0,
+}
+
+
+def _sumar_estadistica(clave: str, valor=1):
+    with _estadisticas_lock:
+        _estadisticas[clave] += valor
+
+
+def _registrar_espera(segundos: float):
+    ESPERA_POOL.observe(segundos)
+    with _estadisticas_lock:
+        _estadisticas['espera_total_seg'] += segundos
+        _estadisticas['espera_max_seg'] = max(_estadisticas['espera_max_seg'], segundos)
+
+
+def _config_pool(alias: str = 'default') -> dict:
+    # Los alias sin POOL propio usan el de 'default'
+    return {
+        **POOL_POR_DEFECTO,
+        **settings.DATABASES['default'].get('POOL', {}),
+        **settings.DATABASES[alias].get('POOL', {}),
+    }
+
+
+def _config_replica() -> dict:
+    return {**REPLICA_POR_DEFECTO, **getattr(settings, 'INFORMES_REPLICA', {})}
+
+
+def _argumentos_conexion(alias: str, driver: str) -> dict:
+    """ Acota el tiempo de conexión a la réplica, para no demorar la vuelta a 'default'. """
+    if alias == 'default':
+        return {}
+    timeout = _config_replica()['TIMEOUT_CONEXION']
+    return {'timeout': timeout} if driver == 'asyncpg' else {'connect_timeout': timeout}
+
+
+def _url_engine(driver: str, alias: str = 'default') -> str:
+    db_settings = settings.DATABASES[alias]
+    return (
+        f"postgresql+{driver}://{db_settings['USER']}:{db_settings['PASSWORD']}"
+        f"@{db_settings['HOST']}:{db_settings['PORT']}/{db_settings['NAME']}"
+    )
+
+
+def _registrar_eventos(engine):
+    event.listen(engine, 'connect', lambda *args: _sumar_estadistica('conexiones_creadas'))
+    event.listen(engine, 'checkout', lambda *args: _sumar_estadistica('checkouts'))
+    event.listen(engine, 'checkin', lambda *args: _sumar_estadistica('checkins'))
+
+
+def _numeric_a_float(valor, cursor=None):
+    return float(valor) if valor is not None else None
+
+
+# Conversor de psycopg2 para las columnas NUMERIC (los DecimalField de los modelos)
+_NUMERIC_A_FLOAT_PSYCOPG2 = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'NUMERIC_A_FLOAT', _numeric_a_float
+)
+
+
+def _registrar_adaptadores(dbapi_connection, driver: str):
+    """
+    Hace que el driver lea las columnas NUMERIC directamente como float. Sin esto, cada
+    valor se construye como un Decimal de Python y pandas lo vuelve a convertir a
+    float64 al armar el DataFrame.
+    """
+    if driver == 'psycopg2':
+        psycopg2.extensions.register_type(_NUMERIC_A_FLOAT_PSYCOPG2, dbapi_connection)
+    elif driver == 'psycopg':
+        from psycopg.types.numeric import FloatLoader
+        dbapi_connection.adapters.register_loader('numeric', FloatLoader)
+    elif driver == 'asyncpg':
+        dbapi_connection.run_async(
+            lambda conexion: conexion.set_type_codec(
+                'numeric', encoder=str, decoder=_numeric_a_float, schema='pg_catalog', format='text'
+            )
+        )
+
+
+def _registrar_tipos(engine, driver: str):
+    event.listen(engine, 'connect', lambda dbapi_connection, *args: _registrar_adaptadores(dbapi_connection, driver))
+
+
+def _crear_engine(alias: str = 'default', **opciones):
+    """
+    Construye el motor de SQLAlchemy con el pool configurado en settings.
+    Se toman las credenciales desde el settings.py de Django para mantener una única fuente de verdad.
+
+    Args:
+        alias: El alias de settings.DATABASES al que se conecta.
+        opciones: Valores que reemplazan a los de la configuración del pool
+            (por ejemplo, NUMERIC_A_FLOAT=False para comparar en un benchmark).
+    """
+    pool_settings = {**_config_pool(alias), **opciones}
+    engine = create_engine(
+        _url_engine(pool_settings['DRIVER'], alias),
+        connect_args=_argumentos_conexion(alias, pool_settings['DRIVER']),
+        pool_size=pool_settings['SIZE'],
+        max_overflow=pool_settings['MAX_OVERFLOW'],
+        pool_timeout=pool_settings['TIMEOUT'],
+        pool_pre_ping=pool_settings['PRE_PING'],
+        pool_recycle=pool_settings['RECYCLE'],
+    )
+    _registrar_eventos(engine)
+    if pool_settings['NUMERIC_A_FLOAT']:
+        _registrar_tipos(engine, pool_settings['DRIVER'])
+
+    logger.info(
+        f"Pool de conexiones a '{alias}' creado (size={pool_settings['SIZE']}, "
+        f"max_overflow={pool_settings['MAX_OVERFLOW']}, recycle={pool_settings['RECYCLE']}s)"
+    )
+    return engine
+
+
+def obtener_engine(alias: str = 'default'):
+    """
+    Devuelve el motor de SQLAlchemy del alias indicado, compartido por el proceso y
+    creado la primera vez.
+    """
+    engine = _engines.get(alias)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(alias)
+            if engine is None:
+                engine = _engines[alias] = _crear_engine(alias)
+    return engine
+
+
+def reiniciar_engines():
+    """
+    Descarta los motores heredados del proceso padre sin cerrar sus conexiones, que
+    siguen siendo del padre. Se llama al iniciar un proceso hijo (por ejemplo, en un
+    ProcessPoolExecutor) para que cree su propio pool en la primera consulta.
+    """
+    with _engine_lock:
+        for engine in _engines.values():
+            engine.dispose(close=False)
+        _engines.clear()
+    _engines_async.clear()
+    invalidar_replica()
+
+
+def _generacion_carga(alias: str) -> int:
+    """ Devuelve el id de la última carga de datos (GeneracionCarga) que ve la base `alias`. """
+    with obtener_engine(alias).connect() as connection:
+        return connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM generacion_carga")).scalar()
+
+
+def alias_lectura() -> str:
+    """
+    Elige la base para las consultas de solo lectura de los informes: la réplica
+    (INFORMES_REPLICA['ALIAS']) si está definida en DATABASES, responde y ya tiene la
+    última carga de datos confirmada en 'default'; si no, 'default'. La elección se
+    verifica cada VERIFICAR_CADA segundos, así que justo después de una carga una
+    réplica atrasada puede seguir usándose durante ese intervalo.
+
+    Returns:
+        El alias de settings.DATABASES a usar.
+    """
+    config = _config_replica()
+    alias = config['ALIAS']
+    if alias not in settings.DATABASES:
+        return 'default'
+
+    with _replica_lock:
+        verificada = _replica['verificada']
+        if verificada is not None and time.monotonic() - verificada < config['VERIFICAR_CADA']:
+            return _replica['alias']
+        try:
+            al_dia = _generacion_carga(alias) >= _generacion_carga('default')
+            if not al_dia:
+                logger.warning(f"La réplica '{alias}' no tiene la última carga de datos, se lee de 'default'.")
+        except Exception as e:
+            al_dia = False
+            logger.warning(f"La réplica '{alias}' no está disponible, se lee de 'default': {e}")
+        _replica.update(alias=alias if al_dia else 'default', verificada=time.monotonic())
+        return _replica['alias']
+
+
+def _descartar_replica(error: Exception):
+    """ Deja de usar la réplica hasta la próxima verificación, tras un error al conectarse. """
+    with _replica_lock:
+        _replica.update(alias='default', verificada=time.monotonic())
+    logger.warning(f"No se pudo conectar a la réplica, se lee de 'default': {error}")
+
+
+def invalidar_replica(**kwargs):
+    """ Fuerza a verificar la réplica en la próxima consulta. Se conecta a la señal de fin de carga. """
+    with _replica_lock:
+        _replica.update(alias='default', verificada=None)
+
+
+@contextmanager
+def _conexion():
+    """
+    Toma una conexión del pool de la base de lectura (ver `alias_lectura`) registrando
+    cuánto tiempo se esperó para obtenerla. Si la réplica no acepta la conexión, se
+    usa 'default'. Dentro de `conexion_reservada` se reutiliza la conexión reservada.
+    """
+    reservada = getattr(_reserva, 'conexion', None)
+    if reservada is not None:
+        try:
+            yield reservada
+        finally:
+            # Termina la transacción: descarta el statement_timeout local y, si la
+            # consulta falló, deja la conexión lista para la siguiente
+            reservada.rollback()
+        return
+
+    alias = alias_lectura()
+    inicio = time.perf_counter()
+    try:
+        connection = obtener_engine(alias).connect()
+    except OperationalError as e:
+        if alias == 'default':
+            raise
+        _descartar_replica(e)
+        connection = obtener_engine().connect()
+    _registrar_espera(time.perf_counter() - inicio)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def conexion_reservada():
+    """
+    Reserva una conexión del pool para el hilo actual mientras dura el bloque. Las
+    consultas hechas dentro (por ejemplo, los componentes de un informe generados uno
+    tras otro) la reutilizan en lugar de tomar y devolver una conexión cada vez, con
+    su pre-ping. Los bloques anidados usan la misma reserva.
+    """
+    if getattr(_reserva, 'conexion', None) is not None:
+        yield
+        return
+    with _conexion() as connection:
+        _reserva.conexion = connection
+        try:
+            yield
+        finally:
+            _reserva.conexion = None
+
+
+@asynccontextmanager
+async def engines_async():
+    """
+    Mantiene los motores asíncronos del event loop actual mientras dura el bloque y
+    los cierra al salir del último bloque abierto en ese loop. Con WSGI, Django corre
+    cada vista asíncrona en un loop nuevo: sin cerrarlos, cada pedido dejaría un pool
+    con sus conexiones abiertas hasta agotar max_connections.
+    """
+    loop = asyncio.get_running_loop()
+    estado = _engines_async.setdefault(loop, {'abiertos': 0, 'engines': {}})
+    estado['abiertos'] += 1
+    try:
+        yield
+    finally:
+        estado['abiertos'] -= 1
+        if not estado['abiertos'] and _engines_async.get(loop) is estado:
+            del _engines_async[loop]
+            for engine in estado['engines'].values():
+                await engine.dispose()
+
+
+def obtener_engine_async(alias: str = 'default'):
+    """
+    Devuelve el motor asíncrono (asyncpg) del event loop actual para el alias indicado,
+    creándolo la primera vez. Usa los mismos parámetros de pool que el motor sincrónico.
+    Debe llamarse dentro de un bloque `engines_async`, que lo cierra al terminar.
+    """
+    loop = asyncio.get_running_loop()
+    engines = _engines_async.setdefault(loop, {'abiertos': 0, 'engines': {}})['engines']
+    engine = engines.get(alias)
+    if engine is None:
+        pool_settings = _config_pool(alias)
+        engine = create_async_engine(
+            _url_engine('asyncpg', alias),
+            connect_args=_argumentos_conexion(alias, 'asyncpg'),
+            pool_size=pool_settings['SIZE'],
+            max_overflow=pool_settings['MAX_OVERFLOW'],
+            pool_timeout=pool_settings['TIMEOUT'],
+            pool_pre_ping=pool_settings['PRE_PING'],
+            pool_recycle=pool_settings['RECYCLE'],
+        )
+        _registrar_eventos(engine.sync_engine)
+        if pool_settings['NUMERIC_A_FLOAT']:
+            _registrar_tipos(engine.sync_engine, 'asyncpg')
+        engines[alias] = engine
+        logger.info(f"Pool de conexiones asíncrono (asyncpg) a '{alias}' creado.")
+    return engine
+
+
+@asynccontextmanager
+async def _aconexion():
+    """ Versión asíncrona de `_conexion`. La verificación de la réplica corre en un hilo. """
+    alias = await asyncio.to_thread(alias_lectura)
+    inicio = time.perf_counter()
+    try:
+        connection = await obtener_engine_async(alias).connect()
+    except OperationalError as e:
+        if alias == 'default':
+            raise
+        _descartar_replica(e)
+        connection = await obtener_engine_async().connect()
+    _registrar_espera(time.perf_counter() - inicio)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+
+def obtener_estadisticas_pool() -> dict:
+    """
+    Devuelve un resumen del uso del pool de conexiones de este proceso, útil para
+    dimensionar SIZE y MAX_OVERFLOW según la cantidad de workers de gunicorn.
+
+    Returns:
+        Un diccionario con los contadores acumulados (checkouts, conexiones creadas,
+        tiempos de espera) y el estado actual de los pools, sumados entre los alias
+        (en uso, libres, overflow). Si todavía no se creó ninguno, solo se devuelven
+        los contadores.
+    """
+    with _estadisticas_lock:
+        resumen = dict(_estadisticas)
+    resumen['espera_promedio_seg'] = (
+        resumen['espera_total_seg'] / resumen['checkouts'] if resumen['checkouts'] else 0.0
+    )
+    pools = [engine.pool for engine in list(_engines.values())]
+    if pools:
+        resumen.update({
+            'tamanio': sum(pool.size() for pool in pools),
+            'en_uso': sum(pool.checkedout() for pool in pools),
+            'libres': sum(pool.checkedin() for pool in pools),
+            'overflow': sum(pool.overflow() for pool in pools),
+        })
+    return resumen
+
+
+class TiempoConsultaExcedido(Exception):
+    """ La consulta superó su statement_timeout y el servidor la canceló. """
+
+
+# SQLSTATE de query_canceled, el error que devuelve PostgreSQL al vencer statement_timeout
+_SQLSTATE_CANCELADA = '57014'
+
+
+def _es_cancelacion(error: Exception) -> bool:
+    original = getattr(error, 'orig', error)
+    return _SQLSTATE_CANCELADA in (getattr(original, 'pgcode', None), getattr(original, 'sqlstate', None))
+
+
+def _motivo_cancelacion(timeout: float = None) -> str:
+    """
+    El mensaje de una consulta cancelada. Sin timeout propio la canceló otra cosa: un
+    pg_cancel_backend o el statement_timeout del rol o de la base.
+    """
+    if timeout is None:
+        return "La consulta fue cancelada por el servidor."
+    return f"La consulta superó el tiempo límite de {timeout:.1f} s."
+
+
+def _valor_timeout(timeout: float) -> str:
+    # statement_timeout = 0 desactiva el límite, por eso el mínimo es 1 ms
+    return str(max(1, int(timeout * 1000)))
+
+
+def _aplicar_timeout(connection, timeout: float = None):
+    """
+    Fija statement_timeout para la transacción en curso de una conexión de SQLAlchemy
+    (equivale a SET LOCAL, así no queda aplicado cuando la conexión vuelve al pool).
+    Al vencer, el servidor cancela la consulta.
+    """
+    if timeout is not None:
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :valor, true)"), {'valor': _valor_timeout(timeout)}
+        )
+
+
+def convertir_categorias(df: pd.DataFrame, proporcion_maxima: float = 0.5) -> pd.DataFrame:
     """
-    Toma una plantilla SQL y un diccionario de parámetros, la renderiza
-    y ejecuta la consulta contra la base de datos, devolviendo un DataFrame de Pandas.
+    Convierte a `category` las columnas de texto con pocos valores distintos (provincias,
+    sectores, países), que así se guardan como códigos enteros en lugar de un objeto
+    str por fila. Al agrupar por estas columnas hay que usar observed=True.
+
+    Args:
+        df: El DataFrame a convertir (se modifica en el lugar).
+        proporcion_maxima: Se convierten las columnas cuya cantidad de valores distintos
+            no supera esta proporción de la cantidad de filas.
+
+    Returns:
+        El mismo DataFrame.
+    """
+    for columna in df.select_dtypes(include='object').columns:
+        valores = df[columna]
+        if pd.api.types.infer_dtype(valores, skipna=True) != 'string':
+            continue
+        if valores.nunique() <= len(valores) * proporcion_maxima:
+            df[columna] = valores.astype('category')
+    return df
+
+
+def _dataframe_fallido(error) -> pd.DataFrame:
+    """
+    El DataFrame vacío que se devuelve cuando una consulta falla. Lleva el error en
+    `attrs` para distinguirlo de una consulta exitosa sin filas (ver `consulta_fallida`).
+    """
+    df = pd.DataFrame()
+    df.attrs['error'] = str(error)
+    return df
+
+
+def consulta_fallida(df) -> bool:
+    """ Indica si el DataFrame es el de una consulta que falló y no un resultado vacío. """
+    return isinstance(df, pd.DataFrame) and 'error' in df.attrs
+
+
+def _leer_dataframe(connection, sql_compilado: str, valores: dict, metricas: dict = None) -> pd.DataFrame:
+    """
+    Ejecuta la consulta y arma el DataFrame como lo hace pd.read_sql_query, pero midiendo
+    por separado la ejecución en el servidor y la lectura de las filas.
+    """
+    inicio = time.perf_counter()
+    resultado = connection.execute(text(sql_compilado), valores)
+    ejecutada = time.perf_counter()
+    df = pd.DataFrame.from_records(resultado.fetchall(), columns=list(resultado.keys()), coerce_float=True)
+    if metricas is not None:
+        metricas['sql_ms'] = (ejecutada - inicio) * 1000
+        metricas['fetch_ms'] = (time.perf_counter() - ejecutada) * 1000
+        metricas['filas'] = len(df)
+    return df
+
+
+def ejecutar_consulta_parametrizada(plantilla_sql: str, params: dict, categorias: bool = False,
+                                    timeout: float = None, metricas: dict = None) -> pd.DataFrame:
+    """
+    Toma una plantilla SQL y un diccionario de parámetros, la compila a una consulta
+    con parámetros ligados y la ejecuta contra la base de datos, devolviendo un DataFrame de Pandas.
 
     Args:
         plantilla_sql: Un string con la consulta SQL que contiene placeholders de Jinja2.
         params: Un diccionario con los valores para reemplazar los placeholders.
+        categorias: Si es True, las columnas de texto con pocos valores distintos se
+            devuelven como `category` (ver `convertir_categorias`).
+        timeout: Tiempo máximo de la consulta en segundos. Al vencer, el servidor la cancela.
+        metricas: Un diccionario opcional donde se registran los tiempos de cada etapa
+            (plantilla_ms, sql_ms, fetch_ms) y la cantidad de filas.
 
     Returns:
         Un DataFrame de Pandas con el resultado de la consulta.
-        Retorna un DataFrame vacío si ocurre un error.
+        Retorna un DataFrame vacío si ocurre un error; `consulta_fallida` lo distingue
+        de un resultado sin filas.
+
+    Raises:
+        TiempoConsultaExcedido: Si el servidor canceló la consulta, por superar `timeout` u otra causa.
     """
     logger.info("Iniciando ejecución de consulta parametrizada...")
-    
-    # 1. Conexión a la base de datos usando SQLAlchemy
-    # Se toman las credenciales desde el settings.py de Django para mantener una única fuente de verdad.
-    try:
-        db_settings = settings.DATABASES['default']
-        engine_url = (
-            f"postgresql+psycopg2://{db_settings['USER']}:{db_settings['PASSWORD']}"
-            f"@{db_settings['HOST']}:{db_settings['PORT']}/{db_settings['NAME']}"
-        )
-        engine = create_engine(engine_url)
+
+    # 1. Obtención del motor compartido (el pool se crea en la primera llamada)
+    try:
+        obtener_engine()
     except Exception as e:
         logger.error(f"Error al configurar el motor de SQLAlchemy: {e}")
-        return pd.DataFrame()
+        return _dataframe_fallido(e)
 
-    # 2. Renderizado de la plantilla SQL con Jinja2 para inyectar los parámetros de forma segura
+    # 2. Compilación de la plantilla: los placeholders pasan a ser parámetros ligados,
+    # así el texto de la consulta no cambia entre provincias y años
     try:
-        template = Template(plantilla_sql)
-        sql_renderizado = template.render(params)
-        logger.info(f"SQL Renderizado: \n{sql_renderizado}")
+        inicio = time.perf_counter()
+        sql_compilado, valores = compilar_plantilla(plantilla_sql).preparar(params)
+        if metricas is not None:
+            metricas['plantilla_ms'] = (time.perf_counter() - inicio) * 1000
+        logger.info(f"SQL Compilado: \n{sql_compilado}\nParámetros: {valores}")
     except Exception as e:
-        logger.error(f"Error al renderizar la plantilla SQL con Jinja2: {e}")
-        return pd.DataFrame()
+        logger.error(f"Error al compilar la plantilla SQL: {e}")
+        return _dataframe_fallido(e)
 
-    # 3. Ejecución de la consulta usando Pandas y el motor de SQLAlchemy
+    # 3. Ejecución de la consulta usando una conexión tomada del pool
     try:
-        with engine.connect() as connection:
-            df = pd.read_sql_query(sql=text(sql_renderizado), con=connection)
+        with _conexion() as connection:
+            _aplicar_timeout(connection, timeout)
+            df = _leer_dataframe(connection, sql_compilado, valores, metricas)
+        if categorias:
+            convertir_categorias(df)
         logger.info(f"Consulta exitosa. Se obtuvieron {len(df)} filas y {len(df.columns)} columnas.")
         return df
     except Exception as e:
+        if _es_cancelacion(e):
+            logger.warning(f"Consulta cancelada. {_motivo_cancelacion(timeout)}")
+            raise TiempoConsultaExcedido(_motivo_cancelacion(timeout)) from e
+        contar_error(e)
         logger.error(f"Error al ejecutar la consulta SQL con Pandas: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return _dataframe_fallido(e)
+
+
+def iterar_consulta_parametrizada(plantilla_sql: str, params: dict, chunksize: int = 5000,
+                                  categorias: bool = False, timeout: float = None,
+                                  metricas: dict = None) -> Iterator[pd.DataFrame]:
+    """
+    Versión en streaming de `ejecutar_consulta_parametrizada`: la consulta se lee con un
+    cursor del lado del servidor (stream_results) y se devuelve de a bloques de
+    `chunksize` filas, así la memoria usada queda acotada por el tamaño del bloque y no
+    por el del resultado completo. La conexión queda tomada del pool hasta que se
+    consumen todos los bloques o se cierra el iterador.
+
+    Args:
+        plantilla_sql: Un string con la consulta SQL que contiene placeholders de Jinja2.
+        params: Un diccionario con los valores para reemplazar los placeholders.
+        chunksize: La cantidad de filas de cada bloque.
+        categorias: Si es True, cada bloque pasa por `convertir_categorias`.
+        timeout: Tiempo máximo en segundos de cada sentencia (la consulta y cada lectura
+            de un bloque). Al vencer, el servidor la cancela.
+        metricas: Un diccionario opcional como en `ejecutar_consulta_parametrizada`. La
+            espera hasta el primer bloque cuenta como sql_ms y la lectura del resto como
+            fetch_ms; el tiempo que el consumidor usa entre bloques no se cuenta.
+
+    Yields:
+        DataFrames de Pandas con hasta `chunksize` filas cada uno. Si ocurre un error,
+        se registra, se anota en metricas['error'] y la iteración termina.
+
+    Raises:
+        TiempoConsultaExcedido: Si el servidor canceló la consulta, por superar `timeout` u otra causa.
+    """
+    metricas = metricas if metricas is not None else {}
+    try:
+        inicio = time.perf_counter()
+        sql_compilado, valores = compilar_plantilla(plantilla_sql).preparar(params)
+        metricas['plantilla_ms'] = (time.perf_counter() - inicio) * 1000
+        logger.info(f"SQL Compilado (streaming de a {chunksize} filas): \n{sql_compilado}\nParámetros: {valores}")
+    except Exception as e:
+        logger.error(f"Error al compilar la plantilla SQL: {e}")
+        metricas['error'] = str(e)
+        return
+
+    metricas.update({'sql_ms': 0.0, 'fetch_ms': 0.0, 'filas': 0})
+    try:
+        with _conexion() as connection:
+            _aplicar_timeout(connection, timeout)
+            # Las opciones van en la sentencia y no en la conexión, que puede estar reservada
+            # y reutilizarse después para otras consultas (ver conexion_reservada)
+            sentencia = text(sql_compilado).execution_options(stream_results=True, max_row_buffer=chunksize)
+            inicio = time.perf_counter()
+            bloques = pd.read_sql_query(sql=sentencia, con=connection, params=valores, chunksize=chunksize)
+            etapa = 'sql_ms'
+            for bloque in bloques:
+                metricas[etapa] += (time.perf_counter() - inicio) * 1000
+                etapa = 'fetch_ms'
+                metricas['filas'] += len(bloque)
+                yield convertir_categorias(bloque) if categorias else bloque
+                inicio = time.perf_counter()
+        logger.info(f"Consulta en streaming exitosa. Se obtuvieron {metricas['filas']} filas.")
+    except Exception as e:
+        if _es_cancelacion(e):
+            logger.warning(f"Consulta en streaming cancelada. {_motivo_cancelacion(timeout)}")
+            raise TiempoConsultaExcedido(_motivo_cancelacion(timeout)) from e
+        contar_error(e)
+        logger.error(f"Error al ejecutar la consulta SQL en streaming: {e}")
+        metricas['error'] = str(e)
+
+
+def explicar_consulta(plantilla_sql: str, params: dict) -> dict:
+    """
+    Ejecuta una plantilla con EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) y devuelve el plan.
+    Como ANALYZE ejecuta la consulta, se corre dentro de una transacción que se descarta.
+
+    Args:
+        plantilla_sql: Un string con la consulta SQL que contiene placeholders de Jinja2.
+        params: Un diccionario con los valores para reemplazar los placeholders.
+
+    Returns:
+        El plan de PostgreSQL: un diccionario con 'Plan', 'Planning Time' y 'Execution Time'.
+
+    Raises:
+        Las excepciones de compilación o de ejecución, para que quien perfila vea el error.
+    """
+    sql_compilado, valores = compilar_plantilla(plantilla_sql).preparar(params)
+    sql_explain = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)\n{sql_compilado.strip().rstrip(';')}"
+    with _conexion() as connection:
+        try:
+            plan = connection.execute(text(sql_explain), valores).scalar()
+        finally:
+            connection.rollback()
+    # psycopg2 ya decodifica el json; otros drivers pueden devolver el texto
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def ejecutar_consulta_por_provincia(plantilla_sql: str, params: dict, provincias: list) -> dict:
+    """
+    Ejecuta una plantilla SQL para varias provincias con una única consulta. La plantilla
+    se envuelve en un CROSS JOIN LATERAL sobre ref_provincia, reemplazando los parámetros
+    provinciales (PARAMETROS_PROVINCIALES) por las columnas de cada fila, y el resultado
+    agrupado se separa en un DataFrame por provincia. Como la subconsulta se evalúa por
+    provincia, ORDER BY y LIMIT siguen aplicándose dentro de cada una.
+
+    Las plantillas que no dependen de la provincia se ejecutan una sola vez y su
+    resultado se comparte. Las que no pueden compilarse a parámetros ligados se
+    ejecutan provincia por provincia.
+
+    Args:
+        plantilla_sql: Un string con la consulta SQL que contiene placeholders de Jinja2.
+        params: Los parámetros comunes (por ejemplo, anio).
+        provincias: Las instancias de Provincia a resolver.
+
+    Returns:
+        Un diccionario {provincia_id: DataFrame}. Si la consulta agrupada falla, se
+        repite provincia por provincia para que el error afecte solo a las que fallan.
+    """
+    consulta = compilar_plantilla(plantilla_sql)
+    provinciales = set(consulta.parametros) & set(PARAMETROS_PROVINCIALES)
+
+    if consulta.jinja:
+        return {
+            provincia.provincia_id: ejecutar_consulta_parametrizada(
+                plantilla_sql, {**params, 'provincia_id': provincia.provincia_id, **contexto_provincia(provincia.provincia_id)}
+            )
+            for provincia in provincias
+        }
+
+    if not provinciales:
+        df = ejecutar_consulta_parametrizada(plantilla_sql, params)
+        return {provincia.provincia_id: df for provincia in provincias}
+
+    ids = [provincia.provincia_id for provincia in provincias]
+    try:
+        sql_compilado, valores = consulta.sustituir(PARAMETROS_PROVINCIALES).preparar(params)
+        # __orden numera las filas de cada provincia en el orden de la consulta (row_number
+        # sin ORDER BY propio recibe las filas ya ordenadas), así el ORDER BY de la plantilla
+        # se respeta igual que al ejecutarla provincia por provincia
+        sql_barrido = (
+            "SELECT __barrido.provincia_id AS __provincia_id, __consulta.*\n"
+            "FROM ref_provincia AS __barrido\n"
+            "LEFT JOIN indicadores_contexto_y_sicytar AS __contexto ON __contexto.id = __barrido.provincia_id\n"
+            "CROSS JOIN LATERAL (\n"
+            "SELECT __filas.*, row_number() OVER () AS __orden FROM (\n"
+            f"{sql_compilado.strip().rstrip(';')}\n"
+            ") AS __filas\n"
+            ") AS __consulta\n"
+            "WHERE __barrido.provincia_id IN :provincias_barrido\n"
+            "ORDER BY __barrido.provincia_id, __consulta.__orden"
+        )
+        sentencia = text(sql_barrido).bindparams(bindparam('provincias_barrido', expanding=True))
+        with _conexion() as connection:
+            df = pd.read_sql_query(sql=sentencia, con=connection, params={**valores, 'provincias_barrido': ids})
+        logger.info(f"Consulta por provincia exitosa. Se obtuvieron {len(df)} filas para {len(ids)} provincias.")
+    except Exception as e:
+        # Si la consulta agrupada falla (por ejemplo, una división por cero en una sola
+        # provincia), se repite provincia por provincia para aislar el error
+        logger.warning(f"Falló la consulta por provincia, se ejecuta provincia por provincia: {e}")
+        return {
+            provincia.provincia_id: ejecutar_consulta_parametrizada(
+                plantilla_sql, {**params, 'provincia_id': provincia.provincia_id, **contexto_provincia(provincia.provincia_id)}
+            )
+            for provincia in provincias
+        }
+
+    columnas = [columna for columna in df.columns if columna not in ('__provincia_id', '__orden')]
+    por_provincia = {provincia_id: grupo[columnas].reset_index(drop=True)
+                     for provincia_id, grupo in df.groupby('__provincia_id', sort=False)}
+    return {provincia_id: por_provincia.get(provincia_id, pd.DataFrame(columns=columnas)) for provincia_id in ids}
+
+
+def _dataframe_desde_cursor(cursor) -> pd.DataFrame:
+    """ Arma un DataFrame con las filas pendientes de un cursor DB-API, como lo haría pandas. """
+    columnas = [columna[0] for columna in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columnas, coerce_float=True)
+
+
+def _compilar_para_driver(engine, sql: str, valores: dict) -> tuple:
+    """
+    Traduce una consulta con parámetros :nombre al estilo de parámetros del driver
+    (por ejemplo %(nombre)s), para ejecutarla directamente sobre un cursor DB-API.
+    """
+    compilado = text(sql).compile(dialect=engine.dialect)
+    return compilado.string, compilado.construct_params(valores)
+
+
+def ejecutar_consultas_en_lote(consultas: list, timeout: float = None, metricas: dict = None) -> list:
+    """
+    Ejecuta varias plantillas SQL usando una sola conexión del pool. Con el driver
+    psycopg (3) las consultas se envían juntas en modo pipeline, así el lote completo
+    cuesta aproximadamente un único viaje de ida y vuelta a la base de datos. Con
+    psycopg2, que no soporta pipeline, se ejecutan una tras otra sobre la misma conexión.
+
+    Si alguna consulta del pipeline falla, el lote se reintenta consulta por consulta
+    para que el error quede aislado en ese componente.
+
+    Args:
+        consultas: Una lista de tuplas (plantilla_sql, params).
+        timeout: Tiempo máximo en segundos de cada consulta del lote.
+        metricas: Un diccionario opcional donde se registra el tiempo de compilar las
+            plantillas (plantilla_ms) y el de enviar y leer el lote completo (sql_ms).
+
+    Returns:
+        Una lista de DataFrames, en el mismo orden que las consultas recibidas.
+        Las consultas que fallan devuelven un DataFrame vacío (ver `consulta_fallida`) y las que el servidor
+        canceló por superar `timeout`, una instancia de TiempoConsultaExcedido.
+    """
+    inicio = time.perf_counter()
+    resultados = [_dataframe_fallido("La consulta no se ejecutó.") for _ in consultas]
+    try:
+        engine = obtener_engine()
+    except Exception as e:
+        logger.error(f"Error al configurar el motor de SQLAlchemy: {e}")
+        return [_dataframe_fallido(e) for _ in consultas]
+
+    # 1. Compilamos todas las plantillas al formato de parámetros del driver
+    metricas = metricas if metricas is not None else {}
+    inicio_etapa = time.perf_counter()
+    preparadas = []
+    for indice, (plantilla_sql, params) in enumerate(consultas):
+        try:
+            sql_compilado, valores = compilar_plantilla(plantilla_sql).preparar(params)
+            preparadas.append((indice, *_compilar_para_driver(engine, sql_compilado, valores)))
+        except Exception as e:
+            logger.error(f"Error al compilar la plantilla SQL: {e}")
+            resultados[indice] = _dataframe_fallido(e)
+
+    # 2. Enviamos el lote por una única conexión
+    metricas['plantilla_ms'] = (time.perf_counter() - inicio_etapa) * 1000
+    inicio_etapa = time.perf_counter()
+    try:
+        with _conexion() as connection:
+            conexion_driver = connection.connection.driver_connection
+            if hasattr(conexion_driver, 'pipeline'):
+                try:
+                    cursores = []
+                    with conexion_driver.pipeline():
+                        _aplicar_timeout_driver(conexion_driver, timeout)
+                        for indice, sql, valores in preparadas:
+                            cursor = conexion_driver.cursor()
+                            cursor.execute(sql, valores)
+                            cursores.append((indice, cursor))
+                    for indice, cursor in cursores:
+                        resultados[indice] = _dataframe_desde_cursor(cursor)
+                    modo = 'pipeline'
+                except Exception as e:
+                    logger.warning(f"Falló el pipeline, se reintenta consulta por consulta: {e}")
+                    conexion_driver.rollback()
+                    _ejecutar_de_a_una(conexion_driver, preparadas, resultados, timeout)
+                    modo = 'secuencial'
+            else:
+                _ejecutar_de_a_una(conexion_driver, preparadas, resultados, timeout)
+                modo = 'secuencial'
+    except Exception as e:
+        contar_error(e)
+        logger.error(f"Error al ejecutar el lote de consultas: {e}")
+        return [_dataframe_fallido(e) for _ in consultas]
+
+    metricas['sql_ms'] = (time.perf_counter() - inicio_etapa) * 1000
+    logger.info(
+        f"Lote de {len(consultas)} consultas ejecutado en modo {modo} "
+        f"en {(time.perf_counter() - inicio) * 1000:.1f} ms."
+    )
+    return resultados
+
+
+def _aplicar_timeout_driver(conexion_driver, timeout: float = None):
+    """ Igual que `_aplicar_timeout`, sobre la conexión DB-API (psycopg2 o psycopg). """
+    if timeout is not None:
+        with conexion_driver.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", (_valor_timeout(timeout),))
+
+
+def _ejecutar_de_a_una(conexion_driver, preparadas: list, resultados: list, timeout: float = None):
+    """ Ejecuta las consultas en orden sobre la misma conexión, aislando los errores. """
+    _aplicar_timeout_driver(conexion_driver, timeout)
+    for indice, sql, valores in preparadas:
+        try:
+            with conexion_driver.cursor() as cursor:
+                cursor.execute(sql, valores)
+                resultados[indice] = _dataframe_desde_cursor(cursor)
+        except Exception as e:
+            if _es_cancelacion(e):
+                logger.warning(f"Consulta del lote cancelada. {_motivo_cancelacion(timeout)}")
+                resultados[indice] = TiempoConsultaExcedido(_motivo_cancelacion(timeout))
+            else:
+                contar_error(e)
+                logger.error(f"Error al ejecutar una consulta del lote: {e}")
+                resultados[indice] = _dataframe_fallido(e)
+            # El rollback descarta también el statement_timeout de la transacción
+            conexion_driver.rollback()
+            _aplicar_timeout_driver(conexion_driver, timeout)
+
+
+async def aejecutar_consulta_parametrizada(plantilla_sql: str, params: dict, timeout: float = None,
+                                           metricas: dict = None) -> pd.DataFrame:
+    """
+    Versión asíncrona de `ejecutar_consulta_parametrizada`, sobre asyncpg. Mientras
+    espera a la base de datos libera el event loop, así varias consultas pueden
+    estar en curso a la vez dentro del mismo proceso.
+
+    Args:
+        plantilla_sql: Un string con la consulta SQL que contiene placeholders de Jinja2.
+        params: Un diccionario con los valores para reemplazar los placeholders.
+        timeout: Tiempo máximo de la consulta en segundos. Al vencer, el servidor la cancela.
+        metricas: Un diccionario opcional como en `ejecutar_consulta_parametrizada`.
+
+    Returns:
+        Un DataFrame de Pandas con el resultado de la consulta.
+        Retorna un DataFrame vacío si ocurre un error; `consulta_fallida` lo distingue
+        de un resultado sin filas.
+
+    Raises:
+        TiempoConsultaExcedido: Si el servidor canceló la consulta, por superar `timeout` u otra causa.
+    """
+    try:
+        inicio = time.perf_counter()
+        sql_compilado, valores = compilar_plantilla(plantilla_sql).preparar(params)
+        if metricas is not None:
+            metricas['plantilla_ms'] = (time.perf_counter() - inicio) * 1000
+        logger.info(f"SQL Compilado: \n{sql_compilado}\nParámetros: {valores}")
+    except Exception as e:
+        logger.error(f"Error al compilar la plantilla SQL: {e}")
+        return _dataframe_fallido(e)
+
+    try:
+        async with _aconexion() as connection:
+            # pandas no es asíncrono: lo corremos sobre la conexión con run_sync,
+            # que sigue esperando la red de forma asíncrona por debajo
+            await connection.run_sync(lambda conn: _aplicar_timeout(conn, timeout))
+            df = await connection.run_sync(lambda conn: _leer_dataframe(conn, sql_compilado, valores, metricas))
+        logger.info(f"Consulta exitosa. Se obtuvieron {len(df)} filas y {len(df.columns)} columnas.")
+        return df
+    except Exception as e:
+        if _es_cancelacion(e):
+            logger.warning(f"Consulta cancelada. {_motivo_cancelacion(timeout)}")
+            raise TiempoConsultaExcedido(_motivo_cancelacion(timeout)) from e
+        contar_error(e)
+        logger.error(f"Error al ejecutar la consulta SQL asíncrona: {e}")
+        return _dataframe_fallido(e)
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from datos_fuente.data_handler import _conexion, _config_pool, _url_engine, conexion_reservada, obtener_engine
+
+
+class Command(BaseCommand):
+    help = 'Mide el costo de conexión por request: ORM con y sin conexión persistente, y consultas de informes con y sin pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=200, help='Requests simulados por escenario')
+        parser.add_argument('--consultas', type=int, default=10, help='Consultas de informe por request')
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        consultas = options['consultas']
+        self.stdout.write(f"{repeticiones} requests por escenario, {consultas} consultas de informe por request")
+        self.stdout.write(f"{'Escenario':<48} {'mediana':>10} {'p95':>10}")
+
+        conexion_orm = connections['default']
+        configuracion_original = {
+            clave: conexion_orm.settings_dict[clave] for clave in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')
+        }
+        try:
+            self._medir('ORM, una conexión por request', repeticiones,
+                        lambda: self._request_orm(conexion_orm, max_age=0, health_checks=False))
+            self._medir('ORM, conexión persistente con health checks', repeticiones,
+                        lambda: self._request_orm(conexion_orm, max_age=600, health_checks=True))
+        finally:
+            conexion_orm.close()
+            conexion_orm.settings_dict.update(configuracion_original)
+
+        sin_pool = create_engine(_url_engine(_config_pool()['DRIVER']), poolclass=NullPool)
+        try:
+            self._medir('Informe, sin pool (una conexión por consulta)', repeticiones,
+                        lambda: self._request_sin_pool(sin_pool, consultas))
+        finally:
+            sin_pool.dispose()
+        obtener_engine()
+        self._medir('Informe, pool (checkout por consulta)', repeticiones,
+                    lambda: self._request_pool(consultas))
+        self._medir('Informe, pool (conexión reservada por request)', repeticiones,
+                    lambda: self._request_reservado(consultas))
+
+    def _medir(self, nombre: str, repeticiones: int, request):
+        # Un request de calentamiento para no medir la primera conexión del pool
+        request()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            request()
+            tiempos.append(time.perf_counter() - inicio)
+        p95 = statistics.quantiles(tiempos, n=20)[-1] if len(tiempos) > 1 else tiempos[0]
+        self.stdout.write(f"{nombre:<48} {statistics.median(tiempos) * 1000:>8.2f}ms {p95 * 1000:>8.2f}ms")
+
+    def _request_orm(self, conexion, max_age: int, health_checks: bool):
+        """ Simula un request de Django: las señales son las que cierran o verifican la conexión. """
+        if conexion.settings_dict['CONN_MAX_AGE'] != max_age:
+            conexion.close()
+            conexion.settings_dict.update({'CONN_MAX_AGE': max_age, 'CONN_HEALTH_CHECKS': health_checks})
+        request_started.send(sender=self.__class__)
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        request_finished.send(sender=self.__class__)
+
+    def _request_sin_pool(self, engine, consultas: int):
+        for _ in range(consultas):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+    def _request_pool(self, consultas: int):
+        for _ in range(consultas):
+            with _conexion() as connection:
+                connection.execute(text("SELECT 1"))
+
+    def _request_reservado(self, consultas: int):
+        with conexion_reservada():
+            for _ in range(consultas):
+                with _conexion() as connection:
+                    connection.execute(text("SELECT 1"))
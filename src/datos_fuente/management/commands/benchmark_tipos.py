@@ -0,0 +1,66 @@
+import statistics
+import time
+import tracemalloc
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from sqlalchemy import text
+
+from datos_fuente.data_handler import _crear_engine, convertir_categorias
+
+# Consultas sobre las tablas de hechos más grandes, con columnas NUMERIC y textos repetitivos
+CONSULTAS_POR_DEFECTO = [
+    'SELECT * FROM expo_tecno_destino',
+    'SELECT * FROM patentes_desagregadas_ipc_provincia_region_pais',
+    'SELECT * FROM inversion_id_ract_esid_provincia_region_pais',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compara tiempo y memoria de leer columnas NUMERIC como Decimal o como float, y de usar categorías'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sql', nargs='+', default=CONSULTAS_POR_DEFECTO, help='Consultas a medir')
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        motores = {
+            'Decimal': _crear_engine(NUMERIC_A_FLOAT=False),
+            'float': _crear_engine(NUMERIC_A_FLOAT=True),
+        }
+        try:
+            for sql in options['sql']:
+                self.stdout.write(self.style.MIGRATE_HEADING(sql))
+                self.stdout.write(f"{'Lectura':<22} {'mediana':>10} {'pico':>10} {'DataFrame':>10}")
+                for nombre, engine in motores.items():
+                    self._medir(nombre, engine, sql, options['repeticiones'], categorias=False)
+                self._medir('float + categorías', motores['float'], sql, options['repeticiones'], categorias=True)
+                self.stdout.write("")
+        finally:
+            for engine in motores.values():
+                engine.dispose()
+
+    def _medir(self, nombre: str, engine, sql: str, repeticiones: int, categorias: bool):
+        with engine.connect() as connection:
+            # Calentamiento: abre la conexión y deja el plan en cache
+            pd.read_sql_query(sql=text(sql), con=connection)
+
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                df = pd.read_sql_query(sql=text(sql), con=connection)
+                if categorias:
+                    convertir_categorias(df)
+                tiempos.append(time.perf_counter() - inicio)
+
+            tracemalloc.start()
+            df = pd.read_sql_query(sql=text(sql), con=connection)
+            if categorias:
+                convertir_categorias(df)
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        memoria_df = df.memory_usage(deep=True).sum()
+        self.stdout.write(
+            f"{nombre:<22} {statistics.median(tiempos) * 1000:>8.1f}ms {pico / 1e6:>8.1f}MB {memoria_df / 1e6:>8.1f}MB"
+        )
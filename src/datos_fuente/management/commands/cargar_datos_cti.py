@@ -1,15 +1,23 @@
 import os
 import pandas as pd
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from datos_fuente.models import (
-    Provincia, InversionID, IndicadoresContexto, RRHHsicytar, RRHHract,
+    GeneracionCarga, Provincia, Region, InversionID, IndicadoresContexto, RRHHsicytar, RRHHract,
     InversionEmpresariaSector, Patente, Proyecto, ProductoCientifico,
     ExportacionNivelTecnologico, ExportacionTop5, ExportacionTecnologicaDestino,
     PercepcionSocial, UnidadID, EquipamientoSSNN,
     InversionArticulosPorInvestigador, ProyectoPFI
 )
+from datos_fuente.particiones import PARTICIONES, crear_tabla_de_carga, insertar_en_carga, intercambiar_particiones
+from datos_fuente.patentes import separar_patentes
+from datos_fuente.signals import carga_finalizada
+from datos_fuente.territorios import (
+    asignar_claves_territoriales, completar_claves_territoriales, crear_regiones, indice_territorial
+)
+from datos_fuente.vistas_materializadas import refrescar_vistas_materializadas
 
 # Mapeo de nombres de archivo a modelos de Django
 ARCHIVOS_A_CARGAR = {
@@ -36,13 +44,23 @@ ARCHIVOS_A_CARGAR = {
 class Command(BaseCommand):
     help = 'Carga los datos de los archivos CSV de CTI en la base de datos'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pregenerar', action='store_true',
+            help='Al terminar la carga, pre-genera los informes con generar_informes (ver INFORMES_PREGENERACION)'
+        )
+        parser.add_argument('--workers', type=int, help='Cantidad de procesos para la pre-generación')
+
     @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Iniciando la carga de datos de CTI...'))
         data_dir = os.path.join(settings.BASE_DIR, '..', 'data')
+        # {tabla particionada: años cargados en sus tablas de carga}, para intercambiarlas al final
+        self._tablas_de_carga = {}
 
         # Carga especial para Provincia, ya que es una dependencia para otros
         self._cargar_provincias(data_dir)
+        self._cargar_regiones()
         self._cargar_indicadores_contexto(data_dir)
         self._cargar_unidadesID(data_dir)
         self._cargar_proyectosPFI(data_dir)
@@ -63,6 +81,11 @@ class Command(BaseCommand):
                 df = pd.read_csv(os.path.join(data_dir, filename), sep=';')
                 df = df.where(pd.notna(df), None)  # Reemplazar NaN por None
 
+                # Las tablas particionadas se cargan en tablas aparte y se intercambian al final
+                if model._meta.db_table in PARTICIONES:
+                    self._cargar_particionada(model, df)
+                    continue
+
                 # Borramos los datos existentes para evitar duplicados
                 model.objects.all().delete()
 
@@ -76,6 +99,9 @@ class Command(BaseCommand):
                 
                 # Inserción en bloque para máxima eficiencia
                 model.objects.bulk_create(objetos_a_crear, batch_size=1000)
+                self._asignar_claves_territoriales(model)
+                if model == Patente:
+                    self._separar_patentes()
                 self.stdout.write(self.style.SUCCESS(f'Se cargaron {len(objetos_a_crear)} registros para {model.__name__}.'))
 
             except FileNotFoundError:
@@ -83,6 +109,25 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Ocurrió un error al cargar {model.__name__}: {e}'))
 
+        # Dentro de la transacción: los informes pasan a ver las tablas y los agregados
+        # nuevos juntos. Si el refresco falla, la carga entera se deshace.
+        self.stdout.write('Refrescando vistas materializadas...')
+        tiempos = refrescar_vistas_materializadas(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Se refrescaron {len(tiempos)} vistas materializadas en {sum(tiempos.values()):.0f} ms.'
+        ))
+
+        # Lo último antes de confirmar: desde acá las consultas a esas tablas esperan
+        self._intercambiar_particiones()
+
+        # Marca la carga para que las réplicas atrasadas se dejen de usar hasta tenerla
+        GeneracionCarga.objects.create()
+
+        # Avisamos a los caches de informes recién cuando la carga quedó confirmada
+        transaction.on_commit(lambda: carga_finalizada.send(sender=self.__class__))
+        if options['pregenerar']:
+            # Se registra después de la señal, así el cache ya está vacío al regenerar
+            transaction.on_commit(lambda: call_command('generar_informes', workers=options['workers'], stdout=self.stdout))
         self.stdout.write(self.style.SUCCESS('Proceso de carga de datos finalizado.'))
 
     def _cargar_provincias(self, data_dir):
@@ -108,6 +153,74 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Ocurrió un error al cargar Provincias: {e}'))
 
+    def _cargar_regiones(self):
+        """ Crea las regiones de las provincias y arma el índice para resolver los territorios. """
+        asignadas = crear_regiones(Provincia, Region)
+        self._indice_territorial = indice_territorial(Provincia, Region)
+        self.stdout.write(self.style.SUCCESS(
+            f'Se asignaron regiones a {asignadas} provincias ({Region.objects.count()} regiones).'
+        ))
+
+    def _cargar_particionada(self, model, df):
+        """
+        Carga una tabla particionada por año en una tabla de carga por año, sin bloquear la
+        tabla (ver datos_fuente.particiones). Las claves territoriales se completan antes de
+        insertar, porque las filas no están en la tabla del modelo.
+        """
+        tabla = model._meta.db_table
+        campos = [field for field in model._meta.fields if not field.primary_key]
+        filas = [{field.name: row.get(field.db_column or field.name) for field in campos} for _, row in df.iterrows()]
+        sin_resolver = completar_claves_territoriales(model, self._indice_territorial, filas)
+        if sin_resolver:
+            self.stdout.write(self.style.WARNING(
+                f'{model.__name__}: territorios sin provincia ni región: {", ".join(sin_resolver)}'
+            ))
+
+        columna = PARTICIONES[tabla]
+        por_anio = {}
+        for fila in filas:
+            por_anio.setdefault(int(fila[columna]), []).append(
+                {field.column: field.get_db_prep_save(fila[field.name], connection) for field in campos}
+            )
+        for anio, filas_del_anio in sorted(por_anio.items()):
+            carga = crear_tabla_de_carga(connection, tabla, anio)
+            insertar_en_carga(connection, tabla, carga, filas_del_anio)
+        self._tablas_de_carga[tabla] = sorted(por_anio)
+        self.stdout.write(self.style.SUCCESS(
+            f'Se cargaron {len(filas)} registros para {model.__name__} en {len(por_anio)} tablas de carga.'
+        ))
+
+    def _intercambiar_particiones(self):
+        """ Adjunta las tablas de carga en lugar de las particiones viejas. """
+        for tabla, anios in self._tablas_de_carga.items():
+            cambios = intercambiar_particiones(connection, tabla, anios)
+            self.stdout.write(
+                f"{tabla}: {len(cambios['reemplazados'])} particiones reemplazadas, "
+                f"{len(cambios['creados'])} creadas y {len(cambios['eliminados'])} eliminadas."
+            )
+            # El autovacuum analiza las particiones pero nunca la tabla padre. Se hace después
+            # de confirmar, para no prolongar el bloqueo del intercambio.
+            transaction.on_commit(lambda tabla=tabla: self._analizar(tabla))
+
+    def _analizar(self, tabla):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {tabla}')
+
+    def _separar_patentes(self):
+        """ Arma la dimensión de patentes y su tabla puente con las patentes recién cargadas. """
+        patentes, filas = separar_patentes(connection)
+        self.stdout.write(self.style.SUCCESS(
+            f'Se separaron {patentes} patentes y {filas} filas de instituciones e IPC.'
+        ))
+
+    def _asignar_claves_territoriales(self, model):
+        """ Completa provincia_id y region_id de la tabla recién cargada, si los tiene. """
+        sin_resolver = asignar_claves_territoriales(model, self._indice_territorial)
+        if sin_resolver:
+            self.stdout.write(self.style.WARNING(
+                f'{model.__name__}: territorios sin provincia ni región: {", ".join(sin_resolver)}'
+            ))
+
     def _cargar_indicadores_contexto(self, data_dir):
         self.stdout.write('--- Procesando: indicadores_contexto_y_sicytar.csv (Carga Especial) ---')
         try:
@@ -158,6 +271,7 @@ class Command(BaseCommand):
                         'provincia': row.get('provincia'),
                     }
                 )
+            self._asignar_claves_territoriales(UnidadID)
             self.stdout.write(self.style.SUCCESS(f'Se procesaron {len(df)} registros para Unidades ID.'))
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR('Error: No se encontró el archivo listado_unidades_de_id.csv'))
@@ -185,6 +299,7 @@ class Command(BaseCommand):
                         'vertical_tecnologia': row.get('vertical_tecnologia'),
                     }
                 )
+            self._asignar_claves_territoriales(ProyectoPFI)
             self.stdout.write(self.style.SUCCESS(f'Se procesaron {len(df)} registros para Proyectos PFI.'))
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR('Error: No se encontró el archivo proyectos_pfi.csv'))
@@ -0,0 +1,33 @@
+"""
+Métricas de Prometheus de la capa de datos (pool de conexiones, caches y errores).
+
+Con gunicorn cada worker es un proceso distinto: si la variable de entorno
+PROMETHEUS_MULTIPROC_DIR está definida antes de importar prometheus_client, cada
+proceso escribe sus valores en archivos de ese directorio y el endpoint /metrics
+los suma (ver gunicorn.conf.py).
+"""
+from prometheus_client import Counter, Histogram
+
+ESPERA_POOL = Histogram(
+    'informes_pool_espera_segundos',
+    'Tiempo de espera para obtener una conexión del pool de SQLAlchemy',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+
+# 'cache' es 'resultados' o 'plantillas'; 'resultado' es 'acierto' o 'fallo'
+ACCESOS_CACHE = Counter(
+    'informes_cache_accesos_total',
+    'Búsquedas en los caches de resultados y de plantillas',
+    ['cache', 'resultado'],
+)
+
+ERRORES = Counter(
+    'informes_errores_total',
+    'Errores al consultar o generar componentes, por tipo de excepción',
+    ['tipo'],
+)
+
+
+def contar_error(error: Exception):
+    """ Cuenta un error por su tipo; de las excepciones de SQLAlchemy se usa la del driver. """
+    ERRORES.labels(tipo=type(getattr(error, 'orig', None) or error).__name__).inc()
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0016_alter_inversionid_tipo_institucion_ract'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneracionCarga',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finalizada', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Generación de carga',
+                'verbose_name_plural': 'Generaciones de carga',
+                'db_table': 'generacion_carga',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:02
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0017_generacioncarga'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exportacionniveltecnologico',
+            index=models.Index(fields=['unidad_territorial', 'anio'], name='expo_nivel_ut_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exportaciontecnologicadestino',
+            index=models.Index(django.db.models.functions.text.Lower('provincia'), models.F('anio'), name='expo_tecno_provincia_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patente',
+            index=models.Index(fields=['provincia', 'anio'], name='patentes_provincia_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productocientifico',
+            index=models.Index(fields=['unidad_territorial', 'anio_publica'], name='productos_ut_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rrhhsicytar',
+            index=models.Index(fields=['unidad_territorial', 'anio'], name='rrhh_sicytar_ut_anio_idx'),
+        ),
+        # Sin estadísticas de la expresión lower(cod_prov) el planificador estima su
+        # selectividad a ciegas hasta el próximo autovacuum
+        migrations.RunSQL('ANALYZE expo_tecno_destino', migrations.RunSQL.noop),
+    ]
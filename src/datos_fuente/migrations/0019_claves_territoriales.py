@@ -0,0 +1,219 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from datos_fuente.territorios import asignar_claves_territoriales, crear_regiones, indice_territorial
+
+
+def completar_claves_territoriales(apps, schema_editor):
+    """ Resuelve las claves de los datos ya cargados; las próximas cargas las completan solas. """
+    Provincia = apps.get_model('datos_fuente', 'Provincia')
+    Region = apps.get_model('datos_fuente', 'Region')
+    crear_regiones(Provincia, Region)
+    indice = indice_territorial(Provincia, Region)
+    for modelo in apps.get_app_config('datos_fuente').get_models():
+        asignar_claves_territoriales(modelo, indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0018_indices_predicados_informes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('region_id', models.AutoField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(help_text='Región según COFECYT', max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Región',
+                'verbose_name_plural': 'Regiones',
+                'db_table': 'ref_region',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='exportacionniveltecnologico',
+            name='expo_nivel_ut_anio_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exportaciontecnologicadestino',
+            name='expo_tecno_provincia_anio_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='patente',
+            name='patentes_provincia_anio_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='productocientifico',
+            name='productos_ut_anio_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='rrhhsicytar',
+            name='rrhh_sicytar_ut_anio_idx',
+        ),
+        migrations.AddField(
+            model_name='equipamientossnn',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipamientossnn',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportacionniveltecnologico',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportacionniveltecnologico',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportaciontecnologicadestino',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportaciontecnologicadestino',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportaciontop5',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportaciontop5',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionarticulosporinvestigador',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionarticulosporinvestigador',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionempresariasector',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionempresariasector',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionid',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inversionid',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patente',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patente',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='percepcionsocial',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='percepcionsocial',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productocientifico',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productocientifico',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proyectopfi',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proyectopfi',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rrhhsicytar',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rrhhsicytar',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='unidadid',
+            name='provincia_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='unidadid',
+            name='region_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exportaciontecnologicadestino',
+            index=models.Index(fields=['provincia_id', 'anio'], name='expo_tecno_prov_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patente',
+            index=models.Index(fields=['provincia_id', 'anio'], name='patentes_prov_anio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rrhhsicytar',
+            index=models.Index(fields=['provincia_id', 'anio'], name='rrhh_sicytar_prov_anio_idx'),
+        ),
+        migrations.AddField(
+            model_name='provincia',
+            name='region',
+            field=models.ForeignKey(
+                blank=True, help_text='Región de region_cofecyt, como clave', null=True,
+                on_delete=django.db.models.deletion.SET_NULL, related_name='provincias', to='datos_fuente.region'
+            ),
+        ),
+        migrations.RunPython(completar_claves_territoriales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# Las vistas tal como se definieron en esta migración. No se importan de
+# datos_fuente.vistas_materializadas, que refleja la definición actual y puede leer tablas
+# creadas en migraciones posteriores.
+CREAR_VISTAS = [
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_anio AS
+    SELECT anio,
+           COUNT(DISTINCT lens_id)::integer AS cantidad,
+           (COUNT(DISTINCT lens_id) FILTER (WHERE provincia != 'NA'))::integer AS cantidad_con_provincia
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    GROUP BY anio
+    """,
+    "CREATE UNIQUE INDEX mv_patentes_anio_unico ON mv_patentes_anio (anio)",
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_provincia_anio AS
+    SELECT provincia_id, anio, es_institucion_nacional,
+           COUNT(DISTINCT lens_id)::integer AS cantidad
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    WHERE provincia_id IS NOT NULL
+    GROUP BY provincia_id, anio, es_institucion_nacional
+    """,
+    """
+    CREATE UNIQUE INDEX mv_patentes_provincia_anio_unico
+    ON mv_patentes_provincia_anio (provincia_id, anio, es_institucion_nacional)
+    """,
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_provincia_institucion AS
+    SELECT provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion,
+           COUNT(DISTINCT lens_id)::integer AS cantidad
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    WHERE provincia_id IS NOT NULL
+    GROUP BY provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion
+    """,
+    """
+    CREATE UNIQUE INDEX mv_patentes_provincia_institucion_unico
+    ON mv_patentes_provincia_institucion (provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion)
+    """,
+    """
+    CREATE MATERIALIZED VIEW mv_rrhh_sicytar AS
+    SELECT nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+           tipo_personal_sicytar, gran_area_experticia,
+           SUM(cant_personas)::integer AS cant_personas
+    FROM rrhh_sicytar_agregado_provincia_region_pais
+    GROUP BY nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+             tipo_personal_sicytar, gran_area_experticia
+    """,
+    """
+    CREATE UNIQUE INDEX mv_rrhh_sicytar_unico
+    ON mv_rrhh_sicytar (nivel_agregacion, unidad_territorial, anio, tipo_personal_sicytar, gran_area_experticia)
+    """,
+    "CREATE INDEX mv_rrhh_sicytar_provincia_id_anio_idx ON mv_rrhh_sicytar (provincia_id, anio)",
+    "CREATE INDEX mv_rrhh_sicytar_region_id_anio_idx ON mv_rrhh_sicytar (region_id, anio)",
+]
+
+ELIMINAR_VISTAS = [
+    f"DROP MATERIALIZED VIEW IF EXISTS {nombre}"
+    for nombre in ['mv_patentes_anio', 'mv_patentes_provincia_anio', 'mv_patentes_provincia_institucion', 'mv_rrhh_sicytar']
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0019_claves_territoriales'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREAR_VISTAS, ELIMINAR_VISTAS),
+    ]
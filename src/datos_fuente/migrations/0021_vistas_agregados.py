@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Las vistas tal como se definieron en esta migración (ver 0020_vistas_materializadas)
+CREAR_VISTAS = [
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_lens AS
+    SELECT DISTINCT lens_id, anio, provincia, provincia_id, region_id, region_cofecyt,
+           es_institucion_nacional, institucion, renaorg_id
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    """,
+    """
+    CREATE UNIQUE INDEX mv_patentes_lens_unico ON mv_patentes_lens (
+        lens_id, anio, provincia, provincia_id, region_id, region_cofecyt,
+        es_institucion_nacional, institucion, renaorg_id
+    )
+    """,
+    "CREATE INDEX mv_patentes_lens_provincia_id_anio_idx ON mv_patentes_lens (provincia_id, anio)",
+    """
+    CREATE MATERIALIZED VIEW mv_rrhh_sicytar_tipo AS
+    SELECT nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+           tipo_personal_sicytar,
+           SUM(cant_personas)::integer AS cant_personas
+    FROM rrhh_sicytar_agregado_provincia_region_pais
+    GROUP BY nivel_agregacion, unidad_territorial, provincia_id, region_id, anio, tipo_personal_sicytar
+    """,
+    """
+    CREATE UNIQUE INDEX mv_rrhh_sicytar_tipo_unico
+    ON mv_rrhh_sicytar_tipo (nivel_agregacion, unidad_territorial, anio, tipo_personal_sicytar)
+    """,
+    "CREATE INDEX mv_rrhh_sicytar_tipo_provincia_id_anio_idx ON mv_rrhh_sicytar_tipo (provincia_id, anio)",
+    "CREATE INDEX mv_rrhh_sicytar_tipo_region_id_anio_idx ON mv_rrhh_sicytar_tipo (region_id, anio)",
+]
+
+ELIMINAR_VISTAS = [
+    f"DROP MATERIALIZED VIEW IF EXISTS {nombre}" for nombre in ['mv_patentes_lens', 'mv_rrhh_sicytar_tipo']
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0020_vistas_materializadas'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREAR_VISTAS, ELIMINAR_VISTAS),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from datos_fuente.particiones import desparticionar_tablas, particionar_tablas
+
+TABLAS = ['expo_tecno_destino']
+
+
+def particionar(apps, schema_editor):
+    particionar_tablas(schema_editor.connection, TABLAS)
+
+
+def desparticionar(apps, schema_editor):
+    desparticionar_tablas(schema_editor.connection, TABLAS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0021_vistas_agregados'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
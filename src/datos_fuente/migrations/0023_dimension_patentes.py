@@ -0,0 +1,118 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from datos_fuente.patentes import separar_patentes
+
+# Las vistas de patentes provinciales se reemplazan por la dimensión y el puente, y
+# mv_patentes_anio pasa a contar filas de la dimensión. El SQL queda fijo en la migración;
+# la reversión vuelve a las vistas de 0020_vistas_materializadas.
+USAR_DIMENSION = [
+    "DROP MATERIALIZED VIEW IF EXISTS mv_patentes_provincia_anio",
+    "DROP MATERIALIZED VIEW IF EXISTS mv_patentes_provincia_institucion",
+    "DROP MATERIALIZED VIEW IF EXISTS mv_patentes_anio",
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_anio AS
+    SELECT p.anio,
+           COUNT(*)::integer AS cantidad,
+           (COUNT(*) FILTER (WHERE EXISTS (
+               SELECT 1 FROM puente_patente_institucion_ipc b
+               WHERE b.patente_id = p.id AND b.provincia != 'NA'
+           )))::integer AS cantidad_con_provincia
+    FROM dim_patente p
+    GROUP BY p.anio
+    """,
+    "CREATE UNIQUE INDEX mv_patentes_anio_unico ON mv_patentes_anio (anio)",
+]
+
+USAR_TABLA_DE_HECHOS = [
+    "DROP MATERIALIZED VIEW IF EXISTS mv_patentes_anio",
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_anio AS
+    SELECT anio,
+           COUNT(DISTINCT lens_id)::integer AS cantidad,
+           (COUNT(DISTINCT lens_id) FILTER (WHERE provincia != 'NA'))::integer AS cantidad_con_provincia
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    GROUP BY anio
+    """,
+    "CREATE UNIQUE INDEX mv_patentes_anio_unico ON mv_patentes_anio (anio)",
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_provincia_anio AS
+    SELECT provincia_id, anio, es_institucion_nacional,
+           COUNT(DISTINCT lens_id)::integer AS cantidad
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    WHERE provincia_id IS NOT NULL
+    GROUP BY provincia_id, anio, es_institucion_nacional
+    """,
+    """
+    CREATE UNIQUE INDEX mv_patentes_provincia_anio_unico
+    ON mv_patentes_provincia_anio (provincia_id, anio, es_institucion_nacional)
+    """,
+    """
+    CREATE MATERIALIZED VIEW mv_patentes_provincia_institucion AS
+    SELECT provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion,
+           COUNT(DISTINCT lens_id)::integer AS cantidad
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    WHERE provincia_id IS NOT NULL
+    GROUP BY provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion
+    """,
+    """
+    CREATE UNIQUE INDEX mv_patentes_provincia_institucion_unico
+    ON mv_patentes_provincia_institucion (provincia_id, anio, es_institucion_nacional, institucion, letra_ipc_descripcion)
+    """,
+]
+
+
+def poblar_patentes(apps, schema_editor):
+    separar_patentes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datos_fuente', '0022_particiones_expo_tecno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DimensionPatente',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('lens_id', models.CharField(help_text='Identificador único de la patente en Lens', max_length=255, unique=True)),
+                ('application_number', models.CharField(blank=True, max_length=255, null=True)),
+                ('anio', models.IntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Patente',
+                'verbose_name_plural': 'Patentes',
+                'db_table': 'dim_patente',
+            },
+        ),
+        migrations.CreateModel(
+            name='PatenteInstitucionIPC',
+            fields=[
+                ('provincia_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('region_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('provincia', models.CharField(blank=True, max_length=100, null=True)),
+                ('region_cofecyt', models.CharField(blank=True, max_length=100, null=True)),
+                ('renaorg_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('institucion', models.CharField(blank=True, max_length=255, null=True)),
+                ('es_institucion_nacional', models.BooleanField(default=False)),
+                ('letra_ipc_descripcion', models.CharField(blank=True, max_length=255, null=True)),
+                ('patente', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='instituciones',
+                    to='datos_fuente.dimensionpatente'
+                )),
+            ],
+            options={
+                'verbose_name': 'Institución e IPC de una Patente',
+                'verbose_name_plural': 'Instituciones e IPC de las Patentes',
+                'db_table': 'puente_patente_institucion_ipc',
+                'indexes': [models.Index(fields=['provincia_id', 'patente'], name='puente_patente_prov_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_patentes, migrations.RunPython.noop),
+        migrations.RunSQL(USAR_DIMENSION, USAR_TABLA_DE_HECHOS),
+    ]
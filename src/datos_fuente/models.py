@@ -1,6 +1,19 @@
 from django.db import models
 
 
+class Region(models.Model):
+    region_id = models.AutoField(primary_key=True)
+    nombre = models.CharField(max_length=100, unique=True, help_text="Región según COFECYT")
+
+    class Meta:
+        db_table = 'ref_region'
+        verbose_name = "Región"
+        verbose_name_plural = "Regiones"
+
+    def __str__(self):
+        return self.nombre
+
+
 class Provincia(models.Model):
     provincia_id = models.IntegerField(primary_key=True, help_text="Identificador numérico único")
     nombre = models.CharField(max_length=100, db_column='provincia', help_text="Nombre oficial completo de la provincia")
@@ -8,6 +21,10 @@ class Provincia(models.Model):
     region_mincyt = models.CharField(max_length=100, blank=True, null=True, help_text="Región según MINCyT")
     region_iso = models.CharField(max_length=20, blank=True, null=True, help_text="Código de provincia según ISO 3166-2:AR")
     region_cofecyt = models.CharField(max_length=100, blank=True, null=True, help_text="Región según COFECYT")
+    region = models.ForeignKey(
+        Region, on_delete=models.SET_NULL, blank=True, null=True, related_name='provincias',
+        help_text="Región de region_cofecyt, como clave"
+    )
 
     class Meta:
         db_table = 'ref_provincia'
@@ -18,7 +35,37 @@ class Provincia(models.Model):
         return self.nombre
 
 
-class InversionID(models.Model):
+class GeneracionCarga(models.Model):
+    """
+    Una fila por cada carga de datos confirmada (ver cargar_datos_cti). Una réplica está
+    al día cuando ya tiene la última fila de 'default'.
+    """
+    finalizada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'generacion_carga'
+        verbose_name = "Generación de carga"
+        verbose_name_plural = "Generaciones de carga"
+
+    def __str__(self):
+        return f"Carga {self.id} ({self.finalizada:%Y-%m-%d %H:%M})"
+
+
+class ClavesTerritoriales(models.Model):
+    """
+    Claves enteras del territorio de cada fila de una tabla de hechos, resueltas al cargar
+    los datos a partir de unidad_territorial o provincia (ver datos_fuente.territorios).
+    Las filas de una provincia tienen también la región a la que pertenece; las de una
+    región, solo region_id; las del total del país, ninguna.
+    """
+    provincia_id = models.IntegerField(null=True, blank=True, db_index=True)
+    region_id = models.IntegerField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+
+class InversionID(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField(help_text="Año al que corresponde el dato de inversión")
     nivel_agregacion = models.CharField(max_length=50, help_text="Nivel geográfico (País, Región, Provincia)")
@@ -67,7 +114,7 @@ class IndicadoresContexto(models.Model):
         return self.provincia.nombre
 
 
-class RRHHsicytar(models.Model):
+class RRHHsicytar(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     nivel_agregacion = models.CharField(max_length=50)
@@ -80,6 +127,9 @@ class RRHHsicytar(models.Model):
 
     class Meta:
         db_table = 'rrhh_sicytar_agregado_provincia_region_pais'
+        indexes = [
+            models.Index(fields=['provincia_id', 'anio'], name='rrhh_sicytar_prov_anio_idx'),
+        ]
         verbose_name = "RRHH SICYTAR Agregado"
         verbose_name_plural = "RRHH SICYTAR Agregados"
 
@@ -99,7 +149,7 @@ class RRHHract(models.Model):
         verbose_name_plural = "RRHH RACT/ESID"
 
 
-class InversionEmpresariaSector(models.Model):
+class InversionEmpresariaSector(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     nivel_agregacion = models.CharField(max_length=50)
@@ -114,7 +164,7 @@ class InversionEmpresariaSector(models.Model):
         verbose_name_plural = "Inversiones Empresarias por Sector"
 
 
-class Patente(models.Model):
+class Patente(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     lens_id = models.CharField(max_length=255, help_text="Identificador único de la patente en Lens")
     application_number = models.CharField(max_length=255, null=True, blank=True)
@@ -128,11 +178,56 @@ class Patente(models.Model):
 
     class Meta:
         db_table = 'patentes_desagregadas_ipc_provincia_region_pais'
+        indexes = [
+            models.Index(fields=['provincia_id', 'anio'], name='patentes_prov_anio_idx'),
+        ]
         verbose_name = "Patente Desagregada"
         verbose_name_plural = "Patentes Desagregadas"
 
 
-class Proyecto(models.Model):
+class DimensionPatente(models.Model):
+    """
+    Una fila por patente, armada al cargar a partir de Patente (ver datos_fuente.patentes).
+    Contar patentes es contar filas, sin COUNT(DISTINCT lens_id).
+    """
+    id = models.AutoField(primary_key=True)
+    lens_id = models.CharField(max_length=255, unique=True, help_text="Identificador único de la patente en Lens")
+    application_number = models.CharField(max_length=255, null=True, blank=True)
+    anio = models.IntegerField(db_index=True)
+
+    class Meta:
+        db_table = 'dim_patente'
+        verbose_name = "Patente"
+        verbose_name_plural = "Patentes"
+
+    def __str__(self):
+        return self.lens_id
+
+
+class PatenteInstitucionIPC(ClavesTerritoriales):
+    """
+    Tabla puente entre cada patente y sus instituciones y secciones IPC: una fila por
+    patente, institución, letra IPC, territorio y condición de institución nacional.
+    """
+    id = models.AutoField(primary_key=True)
+    patente = models.ForeignKey(DimensionPatente, on_delete=models.CASCADE, related_name='instituciones')
+    provincia = models.CharField(max_length=100, null=True, blank=True)
+    region_cofecyt = models.CharField(max_length=100, null=True, blank=True)
+    renaorg_id = models.CharField(max_length=50, null=True, blank=True)
+    institucion = models.CharField(max_length=255, null=True, blank=True)
+    es_institucion_nacional = models.BooleanField(default=False)
+    letra_ipc_descripcion = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        db_table = 'puente_patente_institucion_ipc'
+        indexes = [
+            models.Index(fields=['provincia_id', 'patente'], name='puente_patente_prov_idx'),
+        ]
+        verbose_name = "Institución e IPC de una Patente"
+        verbose_name_plural = "Instituciones e IPC de las Patentes"
+
+
+class Proyecto(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     proyecto_id = models.IntegerField()
     nivel_agregacion = models.CharField(max_length=50)
@@ -154,7 +249,7 @@ class Proyecto(models.Model):
         verbose_name_plural = "Proyectos"
 
 
-class ProductoCientifico(models.Model):
+class ProductoCientifico(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     producto_id = models.IntegerField()
     anio_publica = models.IntegerField(null=True, blank=True)
@@ -170,7 +265,7 @@ class ProductoCientifico(models.Model):
         verbose_name_plural = "Productos Científicos"
 
 
-class ExportacionNivelTecnologico(models.Model):
+class ExportacionNivelTecnologico(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     nivel_agregacion = models.CharField(max_length=50)
@@ -184,7 +279,7 @@ class ExportacionNivelTecnologico(models.Model):
         verbose_name_plural = "Exportaciones por Nivel Tecnológico"
 
 
-class ExportacionTop5(models.Model):
+class ExportacionTop5(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     region_cofecyt = models.CharField(max_length=100)
     provincia = models.CharField(max_length=100)
@@ -200,7 +295,8 @@ class ExportacionTop5(models.Model):
         verbose_name_plural = "Top 5 Productos Exportados por Provincia"
 
 
-class ExportacionTecnologicaDestino(models.Model):
+# La tabla está particionada por anio (ver datos_fuente.particiones)
+class ExportacionTecnologicaDestino(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     provincia = models.CharField(max_length=100, db_column="cod_prov", null=True, blank=True)
@@ -210,11 +306,14 @@ class ExportacionTecnologicaDestino(models.Model):
 
     class Meta:
         db_table = 'expo_tecno_destino'
+        indexes = [
+            models.Index(fields=['provincia_id', 'anio'], name='expo_tecno_prov_anio_idx'),
+        ]
         verbose_name = "Exportación Tecnológica por Destino"
         verbose_name_plural = "Exportaciones Tecnológicas por Destino"
 
 
-class PercepcionSocial(models.Model):
+class PercepcionSocial(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     indicador = models.CharField(max_length=255)
@@ -229,7 +328,7 @@ class PercepcionSocial(models.Model):
         verbose_name_plural = "Encuestas de Percepción Social"
 
 
-class UnidadID(models.Model):
+class UnidadID(ClavesTerritoriales):
     organizacion_id = models.IntegerField(primary_key=True)
     organizacion = models.CharField(max_length=255)
     nivel_1 = models.CharField(max_length=255, help_text="Institución principal de la cual depende")
@@ -241,7 +340,7 @@ class UnidadID(models.Model):
         verbose_name_plural = "Unidades de I+D"
 
 
-class EquipamientoSSNN(models.Model):
+class EquipamientoSSNN(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     unidad_territorial = models.CharField(max_length=100)
     sistema_nacional = models.CharField(max_length=255)
@@ -254,7 +353,7 @@ class EquipamientoSSNN(models.Model):
         verbose_name_plural = "Equipamientos SSNN"
 
 
-class InversionArticulosPorInvestigador(models.Model):
+class InversionArticulosPorInvestigador(ClavesTerritoriales):
     id = models.AutoField(primary_key=True)
     anio = models.IntegerField()
     nivel_agregacion = models.CharField(max_length=50)
@@ -271,7 +370,7 @@ class InversionArticulosPorInvestigador(models.Model):
         verbose_name_plural = "Ratios Inversión-Artículo por Investigador"
 
 
-class ProyectoPFI(models.Model):
+class ProyectoPFI(ClavesTerritoriales):
     id_pfi = models.CharField(max_length=100, primary_key=True)
     anio = models.IntegerField()
     cupo = models.CharField(max_length=50)
@@ -0,0 +1,292 @@
+"""
+Navegador de agregados: reescribe la consulta de un componente para que lea la vista de
+agregados más chica que la responde, en lugar de la tabla de hechos.
+
+Los agregados son las vistas de VISTAS_MATERIALIZADAS con la clave 'agregado'. La
+consulta se separa en bloques: la consulta exterior y cada subconsulta entre paréntesis
+(incluidas las de WITH), cada uno sin las subconsultas que contiene. Una vista responde
+la consulta si la consulta solo usa columnas de la tabla que la vista conserva (más sus
+medidas) y cada bloque que lee la tabla:
+
+- agrega a su propio nivel (GROUP BY, SELECT DISTINCT o una función de agregación): un
+  bloque que lista filas devolvería menos filas desde la vista, aunque una subconsulta
+  suya agregue;
+- solo usa las agregaciones que dan lo mismo sobre la vista: SUM de una medida, y
+  COUNT(DISTINCT ...), MIN o MAX de una columna que no es medida, siempre sobre la
+  columna sola. Cualquier otra función de agregación (COUNT(*), AVG, SUM(1),
+  SUM(CASE ...), string_agg, ...), las funciones de ventana y las medidas fuera de SUM
+  descartan la vista;
+- no combina la tabla con otras (JOIN, UNION, ...).
+
+El análisis es textual y conservador: ante la duda, la consulta sigue leyendo la tabla.
+Un componente también puede declarar el agregado a usar, o 'ninguno' para no usar
+ninguno, en Componente.agregado.
+"""
+import re
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from django.apps import apps
+from django.db import connection
+
+from .compilador_sql import _SEGMENTOS
+from .vistas_materializadas import VISTAS_MATERIALIZADAS
+
+logger = logging.getLogger(__name__)
+
+SIN_AGREGADO = 'ninguno'
+
+_JINJA = re.compile(r"\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}", re.DOTALL)
+_IDENTIFICADOR = re.compile(r"[A-Za-z_]\w*")
+_SUBCONSULTA = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+_TODAS_LAS_COLUMNAS = re.compile(r"\bSELECT\s+(?:ALL\s+|DISTINCT\s+)?\*|\.\*", re.IGNORECASE)
+_AGRUPA = re.compile(r"\bGROUP\s+BY\b|\bSELECT\s+DISTINCT\b", re.IGNORECASE)
+_COMBINA = re.compile(r"\bJOIN\b|\bUNION\b|\bINTERSECT\b|\bEXCEPT\b|\bOVER\b|\bWITHIN\s+GROUP\b", re.IGNORECASE)
+_FUNCION = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+_COLUMNA = r"\s*(?:\w+\.)?(\w+)\s*\)"
+_SUMA = re.compile(r"\bSUM\s*\(" + _COLUMNA, re.IGNORECASE)
+_CUENTA_DISTINTA = re.compile(r"\bCOUNT\s*\(\s*DISTINCT\b" + _COLUMNA, re.IGNORECASE)
+_EXTREMO = re.compile(r"\b(?:MIN|MAX)\s*\(" + _COLUMNA, re.IGNORECASE)
+
+# Funciones de agregación de PostgreSQL: fuera de las formas permitidas, descartan la vista
+FUNCIONES_DE_AGREGACION = frozenset({
+    'any_value', 'array_agg', 'avg', 'bit_and', 'bit_or', 'bit_xor', 'bool_and', 'bool_or',
+    'corr', 'count', 'covar_pop', 'covar_samp', 'every', 'json_agg', 'json_object_agg',
+    'jsonb_agg', 'jsonb_object_agg', 'max', 'min', 'mode', 'percentile_cont', 'percentile_disc',
+    'range_agg', 'range_intersect_agg', 'regr_avgx', 'regr_avgy', 'regr_count', 'regr_intercept',
+    'regr_r2', 'regr_slope', 'regr_sxx', 'regr_sxy', 'regr_syy', 'stddev', 'stddev_pop',
+    'stddev_samp', 'string_agg', 'sum', 'var_pop', 'var_samp', 'variance', 'xmlagg',
+})
+
+# Cada cuántos segundos se verifica si hubo una carga de datos (GeneracionCarga) desde que
+# se midieron las vistas. La señal carga_finalizada solo llega al proceso que hizo la
+# carga; los workers que atienden los informes se enteran por esta verificación.
+VERIFICAR_CARGA_CADA = 30
+
+_filas = None
+_filas_carga = None
+_filas_verificadas = 0.0
+_filas_lock = threading.Lock()
+
+
+def _agregados() -> dict:
+    """ {tabla de hechos: [(vista, definición del agregado)]} """
+    por_tabla = {}
+    for nombre, vista in VISTAS_MATERIALIZADAS.items():
+        if 'agregado' in vista:
+            por_tabla.setdefault(vista['agregado']['tabla'], []).append((nombre, vista['agregado']))
+    return por_tabla
+
+
+def _ultima_carga() -> int:
+    """ El id de la última carga de datos (GeneracionCarga). """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM generacion_carga")
+        return cursor.fetchone()[0]
+
+
+def _filas_de_vistas() -> dict:
+    """
+    Filas estimadas de cada vista según pg_class. Las vistas que no existen en la base
+    (por ejemplo, con migraciones pendientes) no figuran y no se usan. Los tamaños solo
+    se guardan cuando están todas las vistas y analizadas: si no, se vuelven a consultar
+    en la próxima navegación. Los tamaños guardados se descartan cuando aparece una
+    carga nueva, que refresca las vistas (se verifica cada VERIFICAR_CARGA_CADA segundos).
+    """
+    global _filas, _filas_carga, _filas_verificadas
+    if _filas is not None and time.monotonic() - _filas_verificadas > VERIFICAR_CARGA_CADA:
+        with _filas_lock:
+            if _filas is not None and time.monotonic() - _filas_verificadas > VERIFICAR_CARGA_CADA:
+                if _ultima_carga() != _filas_carga:
+                    logger.info("Hubo una carga de datos nueva: se vuelven a medir las vistas de agregados.")
+                    _filas = None
+                    _navegar_con_filas_guardadas.cache_clear()
+                _filas_verificadas = time.monotonic()
+    if _filas is None:
+        with _filas_lock:
+            if _filas is None:
+                carga = _ultima_carga()
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT relname, reltuples FROM pg_class WHERE relkind = 'm' AND relname = ANY(%s)",
+                        [list(VISTAS_MATERIALIZADAS)]
+                    )
+                    filas = dict(cursor.fetchall())
+                # reltuples es -1 mientras la vista no se analizó
+                if len(filas) < len(VISTAS_MATERIALIZADAS) or any(n < 0 for n in filas.values()):
+                    return filas
+                _filas, _filas_carga, _filas_verificadas = filas, carga, time.monotonic()
+    return _filas
+
+
+@lru_cache(maxsize=None)
+def _columnas_de_tabla(tabla: str) -> frozenset:
+    """ Columnas de la tabla de hechos según su modelo, sin la clave primaria. """
+    for modelo in apps.get_app_config('datos_fuente').get_models():
+        if modelo._meta.db_table == tabla:
+            return frozenset(f.column for f in modelo._meta.concrete_fields if not f.primary_key)
+    return frozenset()
+
+
+def _segmentos(plantilla_sql: str) -> tuple:
+    """ Separa el SQL en código (sin placeholders) e identificadores entre comillas dobles. """
+    codigo, comillas = [], []
+    for literal, identificador, comentario, resto in _SEGMENTOS.findall(plantilla_sql):
+        if identificador:
+            comillas.append(identificador[1:-1].replace('""', '"'))
+        elif resto:
+            codigo.append(_JINJA.sub(' ', resto))
+        else:
+            codigo.append(' ')
+    return ' '.join(codigo), comillas
+
+
+def _bloques(codigo: str) -> list:
+    """
+    El texto propio de cada bloque de la consulta: el de cada subconsulta entre paréntesis
+    y el de la consulta exterior (el último), con sus subconsultas reemplazadas por '( ? )'.
+    """
+    bloques = []
+    pila = [[]]
+    for caracter in codigo:
+        if caracter == '(':
+            pila.append([])
+        elif caracter == ')' and len(pila) > 1:
+            interior = ''.join(pila.pop())
+            if _SUBCONSULTA.match(interior):
+                bloques.append(interior)
+                pila[-1].append('( ? )')
+            else:
+                pila[-1].append(f'({interior})')
+        else:
+            pila[-1].append(caracter)
+    while len(pila) > 1:
+        interior = ''.join(pila.pop())
+        pila[-1].append(f'({interior}')
+    bloques.append(''.join(pila[0]))
+    return bloques
+
+
+def _lee_tabla(bloque: str, tabla: str) -> bool:
+    return re.search(rf"(?:\bFROM|\bJOIN|,)\s*{tabla}\b", bloque, re.IGNORECASE) is not None
+
+
+def _bloque_responde(bloque: str, tabla: str, agregado: dict) -> bool:
+    """ Si un bloque que lee la tabla da lo mismo leyendo la vista. """
+    if _TODAS_LAS_COLUMNAS.search(bloque) or _COMBINA.search(bloque):
+        return False
+    if re.search(rf"\bFROM\s*{tabla}\b(?:\s+(?:AS\s+)?\w+)?\s*,", bloque, re.IGNORECASE):
+        return False
+    medidas = set(agregado['medidas'])
+    dimensiones = set(agregado['columnas']) - medidas
+
+    # Se quitan las agregaciones permitidas; lo que queda no puede agregar ni usar medidas
+    permitidas = []
+
+    def quitar(m, columnas):
+        if m.group(1).lower() not in columnas:
+            return m.group(0)
+        permitidas.append(m.group(0))
+        return ' 0 '
+
+    for patron, columnas in ((_SUMA, medidas), (_CUENTA_DISTINTA, dimensiones), (_EXTREMO, dimensiones)):
+        bloque = patron.sub(lambda m: quitar(m, columnas), bloque)
+    if any(nombre.lower() in FUNCIONES_DE_AGREGACION for nombre in _FUNCION.findall(bloque)):
+        return False
+    if any(re.search(rf"\b{medida}\b", bloque, re.IGNORECASE) for medida in medidas):
+        return False
+    return bool(permitidas) or _AGRUPA.search(bloque) is not None
+
+
+def _responde(codigo: str, identificadores: set, tabla: str, agregado: dict) -> bool:
+    """
+    Si la vista del agregado responde la consulta sobre la tabla (ver el docstring del
+    módulo).
+
+    Args:
+        codigo: El SQL de la plantilla sin literales ni placeholders (ver _segmentos).
+        identificadores: Los identificadores de la consulta, en minúsculas.
+        tabla: La tabla de hechos.
+        agregado: La definición del agregado en VISTAS_MATERIALIZADAS.
+    """
+    # La clave primaria se ignora: en estas consultas 'id' suele ser de otra tabla
+    # (indicadores_contexto_y_sicytar), y una consulta que cuenta filas ya se descarta
+    usadas = identificadores & _columnas_de_tabla(tabla)
+    if not usadas <= set(agregado['columnas']) | set(agregado['medidas']):
+        return False
+    bloques = [bloque for bloque in _bloques(codigo) if _lee_tabla(bloque, tabla)]
+    return bool(bloques) and all(_bloque_responde(bloque, tabla, agregado) for bloque in bloques)
+
+
+def _reemplazar_tabla(plantilla_sql: str, tabla: str, vista: str) -> str:
+    """ Reemplaza la tabla por la vista en el código, fuera de literales, comillas dobles y comentarios. """
+    return ''.join(
+        literal or identificador or comentario or re.sub(rf"\b{tabla}\b", vista, resto, flags=re.IGNORECASE)
+        for literal, identificador, comentario, resto in _SEGMENTOS.findall(plantilla_sql)
+    )
+
+
+def navegar_agregados(plantilla_sql: str, agregado: str = '') -> str:
+    """
+    Devuelve la plantilla reescrita para leer, por cada tabla de hechos que use, el
+    agregado con menos filas que la responde. Si ninguno la responde, la devuelve igual.
+
+    Args:
+        plantilla_sql: El texto de Componente.plantilla_sql.
+        agregado: El agregado declarado por el componente (Componente.agregado): vacío
+            para elegirlo, SIN_AGREGADO para no usar ninguno o el nombre de una vista.
+
+    Returns:
+        El texto de la plantilla, con los placeholders intactos.
+    """
+    if not plantilla_sql or agregado == SIN_AGREGADO:
+        return plantilla_sql
+    filas = _filas_de_vistas()
+    if filas is not _filas:
+        # Con tamaños todavía no guardados, el resultado no se guarda tampoco
+        return _navegar(plantilla_sql, agregado, filas)
+    return _navegar_con_filas_guardadas(plantilla_sql, agregado)
+
+
+@lru_cache(maxsize=512)
+def _navegar_con_filas_guardadas(plantilla_sql: str, agregado: str) -> str:
+    return _navegar(plantilla_sql, agregado, _filas_de_vistas())
+
+
+def _navegar(plantilla_sql: str, agregado: str, filas: dict) -> str:
+    codigo, comillas = _segmentos(plantilla_sql)
+    # Sin comillas, PostgreSQL pasa los identificadores a minúsculas
+    identificadores = {i.lower() for i in _IDENTIFICADOR.findall(codigo)} | set(comillas)
+    resultado = plantilla_sql
+
+    for tabla, candidatos in _agregados().items():
+        if tabla not in identificadores:
+            continue
+        candidatos = [(nombre, definicion) for nombre, definicion in candidatos if nombre in filas]
+        declarados = [c for c in candidatos if c[0] == agregado]
+        if agregado and not declarados and agregado not in VISTAS_MATERIALIZADAS:
+            logger.warning(f"El agregado declarado '{agregado}' no existe; se elige automáticamente.")
+        if declarados:
+            vista = declarados[0][0]
+        else:
+            posibles = [
+                nombre for nombre, definicion in candidatos
+                if _responde(codigo, identificadores, tabla, definicion)
+            ]
+            if not posibles:
+                continue
+            # Las vistas sin analizar (-1) van después de las de tamaño conocido
+            vista = min(posibles, key=lambda nombre: (filas[nombre] < 0, filas[nombre]))
+        resultado = _reemplazar_tabla(resultado, tabla, vista)
+        logger.info(f"Consulta sobre {tabla} redirigida al agregado {vista}.")
+    return resultado
+
+
+def invalidar_navegador(**kwargs):
+    """ Descarta los tamaños de las vistas y las consultas ya navegadas. Se conecta al fin de carga. """
+    global _filas
+    with _filas_lock:
+        _filas = None
+    _navegar_con_filas_guardadas.cache_clear()
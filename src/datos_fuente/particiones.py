@@ -0,0 +1,264 @@
+"""
+Tablas de hechos particionadas por rango de año.
+
+Las tablas de PARTICIONES se guardan en PostgreSQL como tablas particionadas
+(PARTITION BY RANGE) con una partición por año, {tabla}_p{anio}, y una partición por
+defecto para los años sin partición propia. Las consultas filtran por un año o por una
+ventana reciente, así que el planificador descarta las particiones que no corresponden.
+
+Los modelos de Django no cambian: leen y escriben la tabla padre. La clave primaria de
+la tabla pasa a ser (id, columna de partición), porque PostgreSQL exige que incluya la
+columna de partición; id sigue siendo único porque sale de una sola secuencia.
+
+Al cargar, cargar_datos_cti no toca la tabla mientras inserta: carga cada año del
+archivo en una tabla aparte, {tabla}_p{anio}_carga, con los índices de la tabla y un
+CHECK con el rango del año (crear_tabla_de_carga, insertar_en_carga). Recién al final
+de la carga, intercambiar_particiones separa y elimina las particiones viejas y adjunta
+las tablas de carga en su lugar. Separar y adjuntar bloquean la tabla padre (ACCESS
+EXCLUSIVE) hasta que la transacción se confirma, así que el intercambio es lo último que
+se hace antes de confirmarla. Con el CHECK y los índices ya creados, adjuntar no recorre
+las filas ni construye índices.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# {tabla: columna entera por la que se particiona}
+PARTICIONES = {
+    'expo_tecno_destino': 'anio',
+}
+
+
+def _particion(tabla: str, anio: int) -> str:
+    return f"{tabla}_p{anio}"
+
+
+def _particion_por_defecto(tabla: str) -> str:
+    return f"{tabla}_default"
+
+
+def _tabla_de_carga(tabla: str, anio: int) -> str:
+    return f"{_particion(tabla, anio)}_carga"
+
+
+def _rango(anio: int) -> str:
+    return f"FOR VALUES FROM ({anio}) TO ({anio + 1})"
+
+
+def _indices(cursor, tabla: str) -> list:
+    """ Nombre y definición de los índices de la tabla, salvo el de la clave primaria. """
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+        ORDER BY i.relname
+        """,
+        [tabla]
+    )
+    return cursor.fetchall()
+
+
+def _copiar_tabla(connection, tabla: str, particionar: str = None):
+    """
+    Reemplaza la tabla por una copia con las mismas columnas, índices y filas; particionada
+    por la columna indicada, o sin particionar si no se indica ninguna.
+    """
+    anterior = f"{tabla}_anterior"
+    with connection.cursor() as cursor:
+        indices = _indices(cursor, tabla)
+        for nombre, _ in indices:
+            cursor.execute(f"DROP INDEX {nombre}")
+        cursor.execute(f"ALTER TABLE {tabla} RENAME TO {anterior}")
+        cursor.execute(f"ALTER TABLE {anterior} RENAME CONSTRAINT {tabla}_pkey TO {anterior}_pkey")
+
+        particion = f" PARTITION BY RANGE ({particionar})" if particionar else ""
+        cursor.execute(
+            f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING IDENTITY){particion}"
+        )
+        clave = f"id, {particionar}" if particionar else "id"
+        cursor.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_pkey PRIMARY KEY ({clave})")
+        if particionar:
+            cursor.execute(f"SELECT DISTINCT {particionar} FROM {anterior}")
+            anios = [anio for anio, in cursor.fetchall()]
+    if particionar:
+        crear_particiones(connection, tabla, anios)
+
+    with connection.cursor() as cursor:
+        # Las definiciones nombran la tabla original, que ahora es la nueva
+        for _, definicion in indices:
+            cursor.execute(definicion)
+        cursor.execute(f"INSERT INTO {tabla} SELECT * FROM {anterior}")
+        cursor.execute(f"DROP TABLE {anterior}")
+        # La secuencia nueva se llamó distinto mientras existía la anterior
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [tabla])
+        secuencia, = cursor.fetchone()
+        cursor.execute(f"SELECT setval('{secuencia}', COALESCE(MAX(id), 0) + 1, false) FROM {tabla}")
+        if secuencia != f"public.{tabla}_id_seq":
+            cursor.execute(f"ALTER SEQUENCE {secuencia} RENAME TO {tabla}_id_seq")
+        cursor.execute(f"ANALYZE {tabla}")
+
+
+def particionar_tablas(connection, tablas=None):
+    """
+    Convierte las tablas en tablas particionadas por año, con sus filas e índices.
+
+    Args:
+        connection: La conexión de Django (por ejemplo, schema_editor.connection).
+        tablas: Las tablas a convertir; por defecto, todas las de PARTICIONES.
+    """
+    for tabla in tablas or PARTICIONES:
+        _copiar_tabla(connection, tabla, PARTICIONES[tabla])
+
+
+def desparticionar_tablas(connection, tablas=None):
+    """ Vuelve las tablas a tablas comunes, con sus filas e índices. """
+    for tabla in tablas or PARTICIONES:
+        _copiar_tabla(connection, tabla)
+
+
+def particiones_existentes(connection, tabla: str) -> dict:
+    """
+    Las particiones por año de la tabla, sin contar la partición por defecto.
+
+    Returns:
+        Un diccionario {año: nombre de la partición}.
+    """
+    prefijo = _particion(tabla, '')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits h
+            JOIN pg_class c ON c.oid = h.inhrelid
+            WHERE h.inhparent = %s::regclass
+            """,
+            [tabla]
+        )
+        nombres = [nombre for nombre, in cursor.fetchall()]
+    return {
+        int(nombre[len(prefijo):]): nombre
+        for nombre in nombres if nombre.startswith(prefijo) and nombre[len(prefijo):].isdigit()
+    }
+
+
+def crear_particiones(connection, tabla: str, anios) -> list:
+    """
+    Crea las particiones que falten para los años indicados, y la partición por defecto.
+
+    Args:
+        connection: La conexión de Django.
+        tabla: Una tabla de PARTICIONES, ya particionada.
+        anios: Los años que tienen que tener partición propia.
+
+    Returns:
+        Los años cuyas particiones se crearon.
+    """
+    existentes = particiones_existentes(connection, tabla)
+    nuevos = sorted(set(anios) - set(existentes))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {_particion_por_defecto(tabla)} PARTITION OF {tabla} DEFAULT"
+        )
+        for anio in nuevos:
+            cursor.execute(
+                f"CREATE TABLE {_particion(tabla, anio)} PARTITION OF {tabla} {_rango(anio)}"
+            )
+            logger.info(f"Partición {_particion(tabla, anio)} creada.")
+    return nuevos
+
+
+def crear_tabla_de_carga(connection, tabla: str, anio: int) -> str:
+    """
+    Crea (vacía) la tabla donde se cargan las filas de un año antes de adjuntarla. No
+    bloquea la tabla padre para las lecturas.
+
+    Args:
+        connection: La conexión de Django.
+        tabla: Una tabla de PARTICIONES, ya particionada.
+        anio: El año que va a tener la tabla.
+
+    Returns:
+        El nombre de la tabla de carga.
+    """
+    carga = _tabla_de_carga(tabla, anio)
+    columna = PARTICIONES[tabla]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {carga}")
+        cursor.execute(
+            f"CREATE TABLE {carga} (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING INDEXES)"
+        )
+        # Con este CHECK, ATTACH PARTITION no necesita recorrer la tabla para validar el rango
+        cursor.execute(
+            f"ALTER TABLE {carga} ADD CONSTRAINT {carga}_rango "
+            f"CHECK ({columna} >= {anio} AND {columna} < {anio + 1})"
+        )
+    return carga
+
+
+def insertar_en_carga(connection, tabla: str, carga: str, filas: list):
+    """
+    Inserta filas en una tabla de carga. Los id salen de la secuencia de la tabla padre,
+    como si se insertaran en ella.
+
+    Args:
+        connection: La conexión de Django.
+        tabla: La tabla particionada.
+        carga: La tabla de carga, de crear_tabla_de_carga.
+        filas: Diccionarios {columna: valor}, todos con las mismas columnas y sin id.
+    """
+    if not filas:
+        return
+    columnas = list(filas[0])
+    marcadores = ', '.join(['%s'] * len(columnas))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {carga} (id, {', '.join(columnas)}) "
+            f"VALUES (nextval(pg_get_serial_sequence('{tabla}', 'id')), {marcadores})",
+            [[fila[columna] for columna in columnas] for fila in filas]
+        )
+        cursor.execute(f"ANALYZE {carga}")
+
+
+def intercambiar_particiones(connection, tabla: str, anios) -> dict:
+    """
+    Reemplaza las particiones de la tabla por las tablas de carga de los años indicados:
+    la partición vieja de cada año se separa y se elimina y la tabla de carga se renombra
+    y se adjunta en su lugar. Las particiones de los años que ya no vienen se eliminan.
+    Hay que llamarla al final de la transacción de la carga: desde acá hasta que se
+    confirme, las consultas a la tabla esperan.
+
+    Args:
+        connection: La conexión de Django, dentro de la transacción de la carga.
+        tabla: Una tabla de PARTICIONES, ya particionada.
+        anios: Los años que trae la carga, cada uno con su tabla de carga.
+
+    Returns:
+        Un diccionario con los años 'reemplazados', 'eliminados' y 'creados'.
+    """
+    anios = {int(anio) for anio in anios}
+    existentes = particiones_existentes(connection, tabla)
+    with connection.cursor() as cursor:
+        for anio in sorted(set(existentes) | anios):
+            if anio in existentes:
+                cursor.execute(f"ALTER TABLE {tabla} DETACH PARTITION {existentes[anio]}")
+                cursor.execute(f"DROP TABLE {existentes[anio]}")
+            if anio not in anios:
+                continue
+            carga, particion = _tabla_de_carga(tabla, anio), _particion(tabla, anio)
+            cursor.execute(f"ALTER TABLE {carga} RENAME TO {particion}")
+            # Los índices y restricciones se llaman como la tabla de carga
+            for nombre, _ in _indices(cursor, particion):
+                cursor.execute(f"ALTER INDEX {nombre} RENAME TO {nombre.replace(carga, particion, 1)}")
+            cursor.execute(f"ALTER TABLE {particion} RENAME CONSTRAINT {carga}_pkey TO {particion}_pkey")
+            cursor.execute(f"ALTER TABLE {particion} RENAME CONSTRAINT {carga}_rango TO {particion}_rango")
+            cursor.execute(f"ALTER TABLE {tabla} ATTACH PARTITION {particion} {_rango(anio)}")
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {_particion_por_defecto(tabla)} PARTITION OF {tabla} DEFAULT"
+        )
+    return {
+        'reemplazados': sorted(anios & set(existentes)),
+        'eliminados': sorted(set(existentes) - anios),
+        'creados': sorted(anios - set(existentes)),
+    }
@@ -0,0 +1,61 @@
+"""
+Separación de las patentes desagregadas en una dimensión y una tabla puente.
+
+El archivo de patentes repite cada lens_id una vez por sección IPC e institución (y
+hasta filas idénticas), así que contar patentes sobre Patente exige COUNT(DISTINCT
+lens_id). Después de cargarlo, cargar_datos_cti arma con SQL:
+
+- DimensionPatente (dim_patente): una fila por lens_id, con su año. Cada lens_id tiene
+  un único año y un único application_number.
+- PatenteInstitucionIPC (puente_patente_institucion_ipc): una fila por patente,
+  institución, letra IPC, territorio y condición de institución nacional. La provincia y
+  la condición de nacional no son de la patente: una patente puede tener instituciones
+  de varias provincias, nacionales y no nacionales.
+
+Con esto, una consulta por territorio cuenta filas de dim_patente con EXISTS sobre el
+puente, y una por institución y sección IPC cuenta filas del puente.
+"""
+
+_DIMENSION = """
+    INSERT INTO dim_patente (lens_id, application_number, anio)
+    SELECT lens_id, MAX(application_number), MIN(anio)
+    FROM patentes_desagregadas_ipc_provincia_region_pais
+    GROUP BY lens_id
+"""
+
+# renaorg_id es lo único que varía dentro de una fila del puente, y solo en las filas
+# sin institución ('0.0' o 'nan')
+_PUENTE = """
+    INSERT INTO puente_patente_institucion_ipc (
+        patente_id, provincia, region_cofecyt, renaorg_id, institucion, es_institucion_nacional,
+        letra_ipc_descripcion, provincia_id, region_id
+    )
+    SELECT d.id, MAX(p.provincia), MAX(p.region_cofecyt), MAX(p.renaorg_id), p.institucion,
+           p.es_institucion_nacional, p.letra_ipc_descripcion, p.provincia_id, p.region_id
+    FROM patentes_desagregadas_ipc_provincia_region_pais p
+    JOIN dim_patente d ON d.lens_id = p.lens_id
+    GROUP BY d.id, p.institucion, p.es_institucion_nacional, p.letra_ipc_descripcion,
+             p.provincia_id, p.region_id
+"""
+
+
+def separar_patentes(connection) -> tuple:
+    """
+    Vuelve a armar la dimensión de patentes y la tabla puente a partir de Patente, que ya
+    tiene que tener sus claves territoriales.
+
+    Args:
+        connection: La conexión de Django, dentro de la transacción de la carga.
+
+    Returns:
+        Una tupla (patentes, filas del puente).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("TRUNCATE dim_patente, puente_patente_institucion_ipc RESTART IDENTITY")
+        cursor.execute(_DIMENSION)
+        patentes = cursor.rowcount
+        cursor.execute(_PUENTE)
+        filas = cursor.rowcount
+        cursor.execute("ANALYZE dim_patente")
+        cursor.execute("ANALYZE puente_patente_institucion_ipc")
+    return patentes, filas
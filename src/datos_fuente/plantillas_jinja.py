@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, TemplateNotFound, meta
+
+from .metricas import ACCESOS_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto, sobrescribibles desde settings.PLANTILLAS_JINJA
+CONFIG_POR_DEFECTO = {
+    'CACHE_SIZE': 1024,
+    'BYTECODE_DIR': None,  # None usa el directorio temporal por defecto de Jinja
+}
+
+
+class _CargadorPorHash(BaseLoader):
+    """
+    Loader de Jinja que resuelve una plantilla a partir del hash de su texto.
+    Pasar por un loader (en lugar de `from_string`) permite que Jinja use el
+    bytecode cache en disco. La fuente se entrega en el mismo hilo que pide la
+    plantilla, así no depende del LRU, que otro hilo puede desalojar mientras tanto.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def cargar(self, environment, clave: str, fuente: str):
+        self._local.fuente = (clave, fuente)
+        try:
+            return environment.get_template(clave)
+        finally:
+            self._local.fuente = None
+
+    def get_source(self, environment, template):
+        clave, fuente = getattr(self._local, 'fuente', None) or (None, None)
+        if clave != template:
+            raise TemplateNotFound(template)
+        return fuente, None, lambda: True
+
+
+class _BytecodeCacheContado(FileSystemBytecodeCache):
+    """ Bytecode cache en disco que además cuenta aciertos y fallos. """
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        _sumar_estadistica('bytecode_hits' if bucket.code is not None else 'bytecode_misses')
+
+
+_estadisticas_lock = threading.Lock()
+_estadisticas = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'bytecode_hits': 0,
+    'bytecode_misses': 0,
+}
+
+_lock = threading.Lock()
+_env = None
+_cargador = None
+_plantillas = OrderedDict()
+_cache_size = CONFIG_POR_DEFECTO['CACHE_SIZE']
+
+
+def _sumar_estadistica(clave: str):
+    with _estadisticas_lock:
+        _estadisticas[clave] += 1
+
+
+def obtener_entorno() -> Environment:
+    """
+    Devuelve el Environment de Jinja compartido por el proceso, creándolo la primera vez.
+    """
+    global _env, _cargador, _cache_size
+    if _env is None:
+        with _lock:
+            if _env is None:
+                config = {**CONFIG_POR_DEFECTO, **getattr(settings, 'PLANTILLAS_JINJA', {})}
+                bytecode_dir = config['BYTECODE_DIR']
+                if bytecode_dir:
+                    os.makedirs(bytecode_dir, exist_ok=True)
+                    bytecode_dir = str(bytecode_dir)
+                _cargador = _CargadorPorHash()
+                _cache_size = config['CACHE_SIZE']
+                # cache_size=0: el LRU lo manejamos nosotros para poder contar aciertos
+                _env = Environment(
+                    loader=_cargador,
+                    bytecode_cache=_BytecodeCacheContado(bytecode_dir),
+                    cache_size=0,
+                )
+    return _env
+
+
+def obtener_plantilla(fuente: str):
+    """
+    Devuelve la plantilla compilada para un texto, usando un LRU acotado por proceso
+    indexado por el hash del texto. En un fallo, Jinja intenta primero el bytecode
+    cache en disco antes de compilar.
+
+    Args:
+        fuente: El texto de la plantilla.
+
+    Returns:
+        Un jinja2.Template listo para renderizar.
+    """
+    env = obtener_entorno()
+    clave = hashlib.sha1(fuente.encode('utf-8')).hexdigest()
+
+    with _lock:
+        template = _plantillas.get(clave)
+        if template is not None:
+            _plantillas.move_to_end(clave)
+    if template is not None:
+        _sumar_estadistica('hits')
+        ACCESOS_CACHE.labels(cache='plantillas', resultado='acierto').inc()
+        return template
+
+    _sumar_estadistica('misses')
+    ACCESOS_CACHE.labels(cache='plantillas', resultado='fallo').inc()
+    template = _cargador.cargar(env, clave, fuente)
+
+    with _lock:
+        _plantillas[clave] = template
+        _plantillas.move_to_end(clave)
+        while len(_plantillas) > _cache_size:
+            _plantillas.popitem(last=False)
+            _sumar_estadistica('evictions')
+    return template
+
+
+def renderizar_plantilla(fuente: str, params: dict) -> str:
+    """ Renderiza un texto con Jinja usando la plantilla compilada cacheada. """
+    return obtener_plantilla(fuente).render(params)
+
+
+@lru_cache(maxsize=1024)
+def variables_de_plantilla(fuente: str) -> frozenset:
+    """ Devuelve los nombres de variables que usa una plantilla (cacheado por texto). """
+    return frozenset(meta.find_undeclared_variables(obtener_entorno().parse(fuente)))
+
+
+def obtener_estadisticas_plantillas() -> dict:
+    """
+    Devuelve los contadores del cache de plantillas de este proceso: aciertos y
+    fallos del LRU en memoria, desalojos y aciertos del bytecode cache en disco.
+    """
+    with _estadisticas_lock:
+        resumen = dict(_estadisticas)
+    with _lock:
+        resumen['en_cache'] = len(_plantillas)
+    consultas = resumen['hits'] + resumen['misses']
+    resumen['hit_ratio'] = resumen['hits'] / consultas if consultas else 0.0
+    return resumen
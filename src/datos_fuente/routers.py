@@ -0,0 +1,32 @@
+from django.db import connections
+
+from .data_handler import _config_replica, alias_lectura
+
+
+class RouterReportes:
+    """
+    Envía las lecturas de los modelos de datos_fuente a la réplica de los informes
+    cuando está disponible y al día (ver data_handler.alias_lectura). Las escrituras
+    van siempre a 'default', igual que las lecturas hechas dentro de una transacción
+    (por ejemplo, durante cargar_datos_cti), para que vean lo que se acaba de escribir.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'datos_fuente' or connections['default'].in_atomic_block:
+            return None
+        return alias_lectura()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que 'default'
+        if {obj1._state.db, obj2._state.db} <= {'default', _config_replica()['ALIAS']}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación, nunca se migra directamente
+        if db == _config_replica()['ALIAS']:
+            return False
+        return None
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Se envía cuando `cargar_datos_cti` termina y su transacción se confirma.
+# Permite que otras apps (por ejemplo, los caches de informes) se invaliden sin
+# que datos_fuente dependa de ellas.
+carga_finalizada = Signal()
@@ -0,0 +1,177 @@
+"""
+Resolución de los nombres de provincia y región de las tablas de hechos a claves enteras.
+
+Cada fuente escribe los territorios a su manera ("Córdoba", "CORDOBA", "C.A.B.A.",
+"CIUDAD DE BS.AS.", "Tierra del Fuego. Antártida e Islas del Atlántico Sur"). Al cargar
+los datos, cada fila se resuelve contra ref_provincia y ref_region y se guardan
+provincia_id y region_id junto al texto original, para que las plantillas filtren por
+igualdad de enteros en lugar de comparar nombres.
+
+Las funciones reciben los modelos como argumento para poder usarse también desde las
+migraciones, con los modelos históricos.
+"""
+import re
+import unicodedata
+
+# Nombres que no coinciden con ref_provincia ni siquiera normalizados, ya normalizados
+ALIAS_PROVINCIAS = {
+    'CABA': 1,
+    'CAPITAL FEDERAL': 1,
+    'CIUDAD AUTONOMA DE BUENOS AIRES': 1,
+    'CIUDAD DE BS AS': 1,
+    'TIERRA DEL FUEGO': 25,
+}
+
+# Columna de texto con la que cada tabla identifica su territorio, en orden de preferencia,
+# y columna con la región para las filas cuya provincia no se reconoce
+CAMPOS_TERRITORIO = ('unidad_territorial', 'provincia')
+CAMPO_REGION = 'region_cofecyt'
+
+
+def normalizar_territorio(nombre) -> str:
+    """
+    Normaliza un nombre de territorio para compararlo: sin tildes, en mayúsculas y con
+    la puntuación reducida a espacios simples.
+
+    Args:
+        nombre: El nombre tal como viene en la fuente, o None.
+
+    Returns:
+        El nombre normalizado, o un string vacío si no hay nombre.
+    """
+    if not nombre:
+        return ''
+    sin_tildes = ''.join(
+        c for c in unicodedata.normalize('NFKD', str(nombre)) if not unicodedata.combining(c)
+    )
+    return ' '.join(re.sub(r'[^0-9A-Z]+', ' ', sin_tildes.upper()).split())
+
+
+def crear_regiones(modelo_provincia, modelo_region) -> int:
+    """
+    Crea las regiones que falten a partir de Provincia.region_cofecyt y asigna la región
+    de cada provincia. Las regiones existentes conservan su region_id entre cargas.
+
+    Returns:
+        La cantidad de provincias con región asignada.
+    """
+    asignadas = 0
+    for provincia in modelo_provincia.objects.exclude(region_cofecyt=None):
+        region, _ = modelo_region.objects.get_or_create(nombre=provincia.region_cofecyt)
+        if provincia.region_id != region.region_id:
+            provincia.region_id = region.region_id
+            provincia.save(update_fields=['region'])
+        asignadas += 1
+    return asignadas
+
+
+def indice_territorial(modelo_provincia, modelo_region) -> tuple:
+    """
+    Arma los diccionarios de resolución por nombre normalizado.
+
+    Returns:
+        Una tupla (provincias, regiones): provincias mapea cada nombre a
+        (provincia_id, region_id) y regiones mapea cada nombre a region_id.
+    """
+    provincias = {}
+    por_id = {}
+    for provincia_id, nombre, region_id in modelo_provincia.objects.values_list('provincia_id', 'nombre', 'region'):
+        provincias[normalizar_territorio(nombre)] = por_id[provincia_id] = (provincia_id, region_id)
+    for alias, provincia_id in ALIAS_PROVINCIAS.items():
+        if provincia_id in por_id:
+            provincias.setdefault(alias, por_id[provincia_id])
+    regiones = {
+        normalizar_territorio(nombre): region_id
+        for region_id, nombre in modelo_region.objects.values_list('region_id', 'nombre')
+    }
+    return provincias, regiones
+
+
+def resolver_territorio(indice: tuple, nombre, region=None) -> dict:
+    """
+    Resuelve un nombre de territorio a sus claves. Se prueba primero como provincia y
+    después como región; si la fila trae además su región (region_cofecyt), esta se usa
+    cuando la provincia no se reconoce.
+
+    Args:
+        indice: El resultado de indice_territorial.
+        nombre: El nombre de la provincia o región.
+        region: El nombre de la región de la fila, si la tabla lo tiene.
+
+    Returns:
+        Un diccionario con provincia_id y region_id; cualquiera de los dos puede ser None.
+    """
+    provincias, regiones = indice
+    normalizado = normalizar_territorio(nombre)
+    if normalizado in provincias:
+        provincia_id, region_id = provincias[normalizado]
+        return {'provincia_id': provincia_id, 'region_id': region_id}
+    region_id = regiones.get(normalizado) or regiones.get(normalizar_territorio(region))
+    return {'provincia_id': None, 'region_id': region_id}
+
+
+def _campos(modelo) -> tuple:
+    nombres = {field.name for field in modelo._meta.get_fields()}
+    if not {'provincia_id', 'region_id'} <= nombres:
+        return None, None
+    campo = next((c for c in CAMPOS_TERRITORIO if c in nombres), None)
+    return campo, CAMPO_REGION if CAMPO_REGION in nombres else None
+
+
+def _sin_resolver(nombre, claves: dict) -> bool:
+    normalizado = normalizar_territorio(nombre)
+    return claves['region_id'] is None and bool(normalizado) and not normalizado.startswith('TOTAL PAIS')
+
+
+def asignar_claves_territoriales(modelo, indice: tuple) -> list:
+    """
+    Completa provincia_id y region_id de todas las filas de una tabla de hechos. Se
+    resuelve cada combinación distinta de nombres una sola vez y se actualizan sus
+    filas con un UPDATE.
+
+    Args:
+        modelo: Un modelo con provincia_id, region_id y una columna de CAMPOS_TERRITORIO.
+        indice: El resultado de indice_territorial.
+
+    Returns:
+        Los nombres que no se pudieron resolver ni como provincia ni como región, sin
+        contar los vacíos ni los totales del país.
+    """
+    campo, campo_region = _campos(modelo)
+    if campo is None:
+        return []
+    campos = [c for c in (campo, campo_region) if c]
+    sin_resolver = set()
+    for valores in modelo.objects.values(*campos).distinct():
+        claves = resolver_territorio(indice, valores[campo], valores.get(campo_region))
+        modelo.objects.filter(**valores).update(**claves)
+        if _sin_resolver(valores[campo], claves):
+            sin_resolver.add(valores[campo])
+    return sorted(map(str, sin_resolver))
+
+
+def completar_claves_territoriales(modelo, indice: tuple, filas: list) -> list:
+    """
+    Como asignar_claves_territoriales, pero sobre filas que todavía no están en la base.
+
+    Args:
+        modelo: El modelo de las filas.
+        indice: El resultado de indice_territorial.
+        filas: Diccionarios {nombre de campo: valor}; se les agregan provincia_id y region_id.
+
+    Returns:
+        Los nombres que no se pudieron resolver, como en asignar_claves_territoriales.
+    """
+    campo, campo_region = _campos(modelo)
+    if campo is None:
+        return []
+    resueltos = {}
+    sin_resolver = set()
+    for fila in filas:
+        clave = (fila.get(campo), fila.get(campo_region) if campo_region else None)
+        if clave not in resueltos:
+            resueltos[clave] = resolver_territorio(indice, *clave)
+            if _sin_resolver(clave[0], resueltos[clave]):
+                sin_resolver.add(clave[0])
+        fila.update(resueltos[clave])
+    return sorted(map(str, sin_resolver))
@@ -1,3 +1,288 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from . import data_handler, navegador_agregados, plantillas_jinja
+from .compilador_sql import compilar_plantilla
+from .models import ExportacionTop5, RRHHsicytar
+from .navegador_agregados import _responde, _segmentos, navegar_agregados
+from .particiones import _particion, _particion_por_defecto, _rango, _tabla_de_carga
+from .territorios import completar_claves_territoriales, normalizar_territorio, resolver_territorio
+from .vistas_materializadas import VISTAS_MATERIALIZADAS
+
+
+class CompiladorSqlTests(SimpleTestCase):
+
+    def test_placeholders_pasan_a_parametros_ligados(self):
+        consulta = compilar_plantilla(
+            "SELECT * FROM t WHERE provincia_id = {{ provincia_id }} AND anio = {{anio}} AND x = {{ anio }}"
+        )
+        self.assertEqual(consulta.sql, "SELECT * FROM t WHERE provincia_id = :provincia_id AND anio = :anio AND x = :anio")
+        self.assertEqual(consulta.parametros, ('provincia_id', 'anio'))
+        self.assertFalse(consulta.jinja)
+
+    def test_literal_que_es_solo_el_placeholder(self):
+        consulta = compilar_plantilla("SELECT * FROM t WHERE provincia = '{{ provincia_nombre }}'")
+        sql = "SELECT * FROM t WHERE provincia = CAST(:provincia_nombre AS text)"
+        self.assertEqual(consulta.sql, sql)
+        self.assertEqual(consulta.preparar({'provincia_nombre': "Río Negro", 'anio': 2023}),
+                         (sql, {'provincia_nombre': "Río Negro"}))
+
+    def test_literal_con_placeholder_conserva_el_tipo_texto(self):
+        consulta = compilar_plantilla("SELECT * FROM t WHERE fecha >= ('{{ anio }}' || '-01-01')::date")
+        self.assertEqual(consulta.sql, "SELECT * FROM t WHERE fecha >= (CAST(:anio AS text) || '-01-01')::date")
+        # El valor se liga como el texto que habría quedado en el literal
+        self.assertEqual(consulta.preparar({'anio': 2023})[1], {'anio': '2023'})
+
+    def test_parametro_dentro_y_fuera_de_un_literal_se_renderiza_con_jinja(self):
+        consulta = compilar_plantilla("SELECT * FROM t WHERE anio = {{ anio }} AND etiqueta = '{{ anio }}'")
+        self.assertTrue(consulta.jinja)
+
+    def test_comillas_en_comentarios_no_cambian_los_segmentos(self):
+        consulta = compilar_plantilla(
+            "SELECT * FROM t -- la provincia's id\n"
+            "WHERE provincia_id = {{ provincia_id }} /* it's {{ anio }} */ AND x = '{{ provincia_nombre }}'"
+        )
+        self.assertFalse(consulta.jinja)
+        self.assertEqual(consulta.parametros, ('provincia_id', 'provincia_nombre'))
+        self.assertEqual(
+            consulta.sql,
+            "SELECT * FROM t  \nWHERE provincia_id = :provincia_id   AND x = CAST(:provincia_nombre AS text)"
+        )
+
+    def test_literales_sin_placeholder_no_cambian(self):
+        consulta = compilar_plantilla("SELECT 'a:b' AS x, \"col\" FROM t WHERE y = {{ anio }}")
+        self.assertEqual(consulta.sql, "SELECT 'a:b' AS x, \"col\" FROM t WHERE y = :anio")
+
+    def test_placeholder_dentro_de_un_literal_se_renderiza_con_jinja(self):
+        plantilla = "SELECT * FROM t WHERE provincia LIKE '%{{ provincia_nombre }}%'"
+        consulta = compilar_plantilla(plantilla)
+        self.assertTrue(consulta.jinja)
+        sql, valores = consulta.preparar({'provincia_nombre': 'Chaco'})
+        self.assertEqual(sql, "SELECT * FROM t WHERE provincia LIKE '%Chaco%'")
+        self.assertEqual(valores, {})
+
+    def test_bloques_de_jinja_se_renderizan_con_jinja(self):
+        self.assertTrue(compilar_plantilla("SELECT 1 {% if anio %}WHERE anio = {{ anio }}{% endif %}").jinja)
+
+    def test_identificador_permitido(self):
+        consulta = compilar_plantilla('SELECT "{{ anio }}" FROM t WHERE provincia_id = {{ provincia_id }}')
+        self.assertEqual(consulta.identificadores, ('anio',))
+        self.assertEqual(consulta.parametros, ('provincia_id',))
+        self.assertEqual(consulta.preparar({'anio': 2023, 'provincia_id': 6}),
+                         ('SELECT "2023" FROM t WHERE provincia_id = :provincia_id', {'provincia_id': 6}))
+
+    def test_identificador_con_valor_no_permitido(self):
+        consulta = compilar_plantilla('SELECT "{{ anio }}" FROM t')
+        with self.assertRaises(ValueError):
+            consulta.preparar({'anio': '2023"; DROP TABLE t; --'})
+
+    def test_parametro_no_permitido_como_identificador(self):
+        with self.assertRaises(ValueError):
+            compilar_plantilla('SELECT "{{ provincia_nombre }}" FROM t')
+
+    def test_falta_un_parametro(self):
+        with self.assertRaises(KeyError):
+            compilar_plantilla("SELECT * FROM t WHERE anio = {{ anio }}").preparar({})
+
+    def test_sustituir_reemplaza_solo_el_parametro_exacto(self):
+        consulta = compilar_plantilla(
+            "SELECT x::numeric FROM t WHERE provincia_id = {{ provincia_id }} "
+            "AND anio BETWEEN {{ anio }} AND {{ anio_fin }}"
+        ).sustituir({'provincia_id': '__barrido.provincia_id', 'anio': '2020'})
+        self.assertEqual(
+            consulta.sql,
+            "SELECT x::numeric FROM t WHERE provincia_id = __barrido.provincia_id AND anio BETWEEN 2020 AND :anio_fin"
+        )
+        self.assertEqual(consulta.parametros, ('anio_fin',))
+
+
+class NavegadorAgregadosTests(SimpleTestCase):
+    TABLA = 'rrhh_sicytar_agregado_provincia_region_pais'
+
+    def responde(self, sql, vista='mv_rrhh_sicytar'):
+        codigo, comillas = _segmentos(sql)
+        identificadores = {i.lower() for i in navegador_agregados._IDENTIFICADOR.findall(codigo)} | set(comillas)
+        return _responde(codigo, identificadores, self.TABLA, VISTAS_MATERIALIZADAS[vista]['agregado'])
+
+    def test_acepta_sumas_agrupadas(self):
+        self.assertTrue(self.responde(
+            f"SELECT anio, SUM(cant_personas) AS total FROM {self.TABLA} "
+            "WHERE provincia_id = {{ provincia_id }} GROUP BY anio ORDER BY anio"
+        ))
+
+    def test_acepta_count_distinct_y_extremos_de_dimensiones(self):
+        self.assertTrue(self.responde(f"SELECT COUNT(DISTINCT tipo_personal_sicytar), MAX(anio) FROM {self.TABLA}"))
+
+    def test_acepta_select_distinct(self):
+        self.assertTrue(self.responde(f"SELECT DISTINCT anio FROM {self.TABLA}"))
+
+    def test_acepta_subconsulta_que_agrega(self):
+        self.assertTrue(self.responde(
+            f"SELECT t.anio, t.total FROM (SELECT anio, SUM(cant_personas) AS total FROM {self.TABLA} "
+            "GROUP BY anio) t ORDER BY t.total DESC LIMIT 5"
+        ))
+
+    def test_rechaza_filas_sin_agregar(self):
+        self.assertFalse(self.responde(f"SELECT anio, cant_personas FROM {self.TABLA} WHERE anio = {{{{ anio }}}}"))
+
+    def test_rechaza_columnas_que_la_vista_no_conserva(self):
+        self.assertFalse(self.responde(f"SELECT sexo_descripcion, SUM(cant_personas) FROM {self.TABLA} GROUP BY 1"))
+        self.assertFalse(self.responde(f"SELECT SUM(cant_personas) FROM {self.TABLA} GROUP BY gran_area_experticia",
+                                       vista='mv_rrhh_sicytar_tipo'))
+
+    def test_rechaza_agregaciones_que_cambian_sobre_la_vista(self):
+        for expresion in ('COUNT(*)', 'AVG(cant_personas)', 'SUM(1)', 'COUNT(anio)',
+                          'SUM(CASE WHEN anio > 2020 THEN cant_personas END)',
+                          "string_agg(tipo_personal_sicytar, ',')", 'MAX(cant_personas)'):
+            with self.subTest(expresion=expresion):
+                self.assertFalse(self.responde(f"SELECT anio, {expresion} FROM {self.TABLA} GROUP BY anio"))
+
+    def test_rechaza_agregacion_en_una_subconsulta_escalar(self):
+        self.assertFalse(self.responde(
+            f"SELECT anio, cant_personas FROM {self.TABLA} WHERE anio = (SELECT MAX(anio) FROM {self.TABLA})"
+        ))
+
+    def test_rechaza_funciones_de_ventana(self):
+        self.assertFalse(self.responde(
+            f"SELECT anio, SUM(cant_personas) OVER (PARTITION BY anio) FROM {self.TABLA}"
+        ))
+
+    def test_rechaza_combinaciones_con_otras_tablas(self):
+        self.assertFalse(self.responde(
+            f"SELECT r.anio, SUM(r.cant_personas) FROM {self.TABLA} r JOIN ref_provincia p "
+            "ON p.provincia_id = r.provincia_id GROUP BY r.anio"
+        ))
+        self.assertFalse(self.responde(f"SELECT * FROM {self.TABLA}"))
+
+    def test_navegar_elige_la_vista_mas_chica(self):
+        filas = {nombre: 100.0 for nombre in VISTAS_MATERIALIZADAS}
+        filas['mv_rrhh_sicytar_tipo'] = 10.0
+        sql = f"SELECT anio, SUM(cant_personas) FROM {self.TABLA} GROUP BY anio"
+        with mock.patch.object(navegador_agregados, '_filas_de_vistas', return_value=filas):
+            self.assertEqual(navegar_agregados(sql), "SELECT anio, SUM(cant_personas) FROM mv_rrhh_sicytar_tipo GROUP BY anio")
+
+    def test_navegar_respeta_el_agregado_declarado(self):
+        filas = {nombre: 100.0 for nombre in VISTAS_MATERIALIZADAS}
+        sql = f"SELECT anio, SUM(cant_personas) FROM {self.TABLA} GROUP BY anio"
+        self.assertEqual(navegador_agregados._navegar(sql, 'mv_rrhh_sicytar', filas),
+                         "SELECT anio, SUM(cant_personas) FROM mv_rrhh_sicytar GROUP BY anio")
+        self.assertEqual(navegar_agregados(sql, navegador_agregados.SIN_AGREGADO), sql)
+
+    def test_sin_vistas_no_se_navega_ni_se_guarda(self):
+        sql = f"SELECT anio, SUM(cant_personas) FROM {self.TABLA} GROUP BY anio"
+        navegador_agregados._navegar_con_filas_guardadas.cache_clear()
+        with mock.patch.object(navegador_agregados, '_filas_de_vistas', return_value={}):
+            self.assertEqual(navegar_agregados(sql), sql)
+        self.assertEqual(navegador_agregados._navegar_con_filas_guardadas.cache_info().currsize, 0)
+
+    def test_una_carga_nueva_descarta_los_tamanios_guardados(self):
+        viejas = {nombre: 100.0 for nombre in VISTAS_MATERIALIZADAS}
+        nuevas = {nombre: 10.0 for nombre in VISTAS_MATERIALIZADAS}
+        conexion = mock.MagicMock()
+        conexion.cursor.return_value.__enter__.return_value.fetchall.return_value = list(nuevas.items())
+        with mock.patch.multiple(navegador_agregados, _filas=viejas, _filas_carga=1, _filas_verificadas=0.0,
+                                 connection=conexion), \
+                mock.patch.object(navegador_agregados, '_ultima_carga', return_value=1):
+            self.assertIs(navegador_agregados._filas_de_vistas(), viejas)
+            # Dentro del intervalo no se vuelve a verificar
+            with mock.patch.object(navegador_agregados, '_ultima_carga', return_value=2):
+                self.assertIs(navegador_agregados._filas_de_vistas(), viejas)
+                navegador_agregados._filas_verificadas = 0.0
+                self.assertEqual(navegador_agregados._filas_de_vistas(), nuevas)
+                self.assertEqual(navegador_agregados._filas_carga, 2)
+
+
+class ParticionesTests(SimpleTestCase):
+
+    def test_nombres(self):
+        self.assertEqual(_particion('expo_tecno_destino', 2023), 'expo_tecno_destino_p2023')
+        self.assertEqual(_tabla_de_carga('expo_tecno_destino', 2023), 'expo_tecno_destino_p2023_carga')
+        self.assertEqual(_particion_por_defecto('expo_tecno_destino'), 'expo_tecno_destino_default')
+
+    def test_rango_de_un_anio(self):
+        self.assertEqual(_rango(2023), 'FOR VALUES FROM (2023) TO (2024)')
+
+
+class TerritoriosTests(SimpleTestCase):
+    # (provincias, regiones) como los arma indice_territorial
+    INDICE = (
+        {'CIUDAD AUTONOMA DE BUENOS AIRES': (1, 1), 'CABA': (1, 1), 'CORDOBA': (14, 2), 'CHACO': (22, 3)},
+        {'CENTRO': 2, 'NEA': 3},
+    )
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar_territorio('Córdoba'), 'CORDOBA')
+        self.assertEqual(normalizar_territorio('C.A.B.A.'), 'C A B A')
+        self.assertEqual(normalizar_territorio('Tierra del Fuego. Antártida  e Islas'), 'TIERRA DEL FUEGO ANTARTIDA E ISLAS')
+        self.assertEqual(normalizar_territorio(None), '')
+
+    def test_resolver_provincia(self):
+        self.assertEqual(resolver_territorio(self.INDICE, 'CORDOBA'), {'provincia_id': 14, 'region_id': 2})
+        self.assertEqual(resolver_territorio(self.INDICE, 'caba'), {'provincia_id': 1, 'region_id': 1})
+
+    def test_resolver_region(self):
+        self.assertEqual(resolver_territorio(self.INDICE, 'Centro'), {'provincia_id': None, 'region_id': 2})
+        # Una provincia que no se reconoce toma la región de la fila
+        self.assertEqual(resolver_territorio(self.INDICE, 'Sin especificar', 'NEA'), {'provincia_id': None, 'region_id': 3})
+        self.assertEqual(resolver_territorio(self.INDICE, 'Otro'), {'provincia_id': None, 'region_id': None})
+
+    def test_completar_claves(self):
+        filas = [
+            {'provincia': 'Chaco', 'region_cofecyt': 'NEA'},
+            {'provincia': 'Desconocida', 'region_cofecyt': 'NEA'},
+            {'provincia': 'Desconocida', 'region_cofecyt': 'Otra'},
+            {'provincia': 'TOTAL PAIS', 'region_cofecyt': None},
+        ]
+        sin_resolver = completar_claves_territoriales(ExportacionTop5, self.INDICE, filas)
+        self.assertEqual([(f['provincia_id'], f['region_id']) for f in filas], [(22, 3), (None, 3), (None, None), (None, None)])
+        self.assertEqual(sin_resolver, ['Desconocida'])
+
+    def test_completar_claves_por_unidad_territorial(self):
+        filas = [{'unidad_territorial': 'Córdoba'}, {'unidad_territorial': 'Centro'}]
+        self.assertEqual(completar_claves_territoriales(RRHHsicytar, self.INDICE, filas), [])
+        self.assertEqual([(f['provincia_id'], f['region_id']) for f in filas], [(14, 2), (None, 2)])
+
+
+class CancelacionTests(SimpleTestCase):
+
+    def test_cancelacion_sin_timeout_propio(self):
+        # Por ejemplo, un pg_cancel_backend o el statement_timeout del rol
+        error = Exception("canceling statement due to user request")
+        error.pgcode = '57014'
+        with mock.patch.object(data_handler, 'obtener_engine'), \
+                mock.patch.object(data_handler, '_conexion', side_effect=error):
+            with self.assertRaisesMessage(data_handler.TiempoConsultaExcedido, "cancelada por el servidor"):
+                data_handler.ejecutar_consulta_parametrizada("SELECT 1", {}, timeout=None)
+
+
+class EnginesAsyncTests(SimpleTestCase):
+
+    def test_los_motores_se_cierran_con_su_loop(self):
+        async def generar():
+            async with data_handler.engines_async():
+                engine = data_handler.obtener_engine_async()
+                # Los bloques anidados (informes concurrentes en el mismo loop) comparten el motor
+                async with data_handler.engines_async():
+                    self.assertIs(data_handler.obtener_engine_async(), engine)
+                self.assertEqual(len(data_handler._engines_async), 1)
+            return engine
+
+        motores = [asyncio.run(generar()) for _ in range(2)]
+        self.assertIsNot(*motores)
+        self.assertEqual(len(data_handler._engines_async), 0)
+
+
+class PlantillasJinjaTests(SimpleTestCase):
+
+    def test_la_fuente_no_depende_del_lru(self):
+        plantillas_jinja.obtener_entorno()
+        with mock.patch.object(plantillas_jinja, '_cache_size', 1), \
+                mock.patch.object(plantillas_jinja, '_plantillas', plantillas_jinja.OrderedDict()):
+            for fuente in ("{{ a }}-uno", "{{ a }}-dos", "{{ a }}-uno"):
+                self.assertEqual(plantillas_jinja.renderizar_plantilla(fuente, {'a': 1}), fuente.replace('{{ a }}', '1'))
+            self.assertEqual(len(plantillas_jinja._plantillas), 1)
+        # Otro hilo (o una carga posterior) no ve la fuente de una carga que ya terminó
+        with self.assertRaises(plantillas_jinja.TemplateNotFound):
+            plantillas_jinja._cargador.get_source(plantillas_jinja._env, 'cualquiera')
@@ -0,0 +1,168 @@
+"""
+Vistas materializadas con agregados de las tablas de hechos más grandes.
+
+Cada vista agrega su tabla a la granularidad que usan los componentes (provincia, año y
+la dimensión del gráfico), de modo que una consulta lee decenas de filas en lugar de
+decenas de miles. Se crean en las migraciones y se refrescan al final de cada carga
+(ver cargar_datos_cti), dentro de la misma transacción: los informes ven las tablas y
+las vistas nuevas a la vez.
+
+El refresco es CONCURRENTLY, así que las vistas se pueden leer mientras se refrescan.
+Para eso cada vista necesita un índice único sobre todas sus filas (indice_unico).
+
+mv_patentes_anio cuenta filas de la dimensión de patentes (ver datos_fuente.patentes),
+que se arma antes del refresco; las consultas provinciales de patentes leen la
+dimensión y su tabla puente directamente.
+
+Las vistas con la clave 'agregado' son agregados de su tabla de hechos que el navegador
+(datos_fuente.navegador_agregados) puede usar en lugar de ella: 'columnas' son las
+columnas de la tabla que conservan y 'medidas' las que se suman (si no hay medidas, la
+vista es una proyección sin duplicados). Las demás responden a consultas puntuales y
+las plantillas las nombran directamente.
+
+Las migraciones no importan este registro: cada una lleva el SQL de las vistas tal como
+eran en ese punto, porque una definición posterior puede leer tablas que todavía no
+existen. Si se cambia una definición hace falta una migración con el CREATE MATERIALIZED
+VIEW nuevo, y actualizar acá la consulta con la que se refresca y navega.
+"""
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+VISTAS_MATERIALIZADAS = {
+    'mv_patentes_anio': {
+        'consulta': """
+            SELECT p.anio,
+                   COUNT(*)::integer AS cantidad,
+                   (COUNT(*) FILTER (WHERE EXISTS (
+                       SELECT 1 FROM puente_patente_institucion_ipc b
+                       WHERE b.patente_id = p.id AND b.provincia != 'NA'
+                   )))::integer AS cantidad_con_provincia
+            FROM dim_patente p
+            GROUP BY p.anio
+        """,
+        'indice_unico': ('anio',),
+        'indices': [],
+    },
+    # Patentes sin la desagregación por letra IPC: una fila por patente, año e institución
+    'mv_patentes_lens': {
+        'consulta': """
+            SELECT DISTINCT lens_id, anio, provincia, provincia_id, region_id, region_cofecyt,
+                   es_institucion_nacional, institucion, renaorg_id
+            FROM patentes_desagregadas_ipc_provincia_region_pais
+        """,
+        'indice_unico': (
+            'lens_id', 'anio', 'provincia', 'provincia_id', 'region_id', 'region_cofecyt',
+            'es_institucion_nacional', 'institucion', 'renaorg_id',
+        ),
+        'indices': [('provincia_id', 'anio')],
+        'agregado': {
+            'tabla': 'patentes_desagregadas_ipc_provincia_region_pais',
+            'columnas': (
+                'lens_id', 'anio', 'provincia', 'provincia_id', 'region_id', 'region_cofecyt',
+                'es_institucion_nacional', 'institucion', 'renaorg_id',
+            ),
+            'medidas': (),
+        },
+    },
+    # Mismas columnas que la tabla salvo es_conicet y sexo_descripcion, que se suman
+    'mv_rrhh_sicytar': {
+        'consulta': """
+            SELECT nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+                   tipo_personal_sicytar, gran_area_experticia,
+                   SUM(cant_personas)::integer AS cant_personas
+            FROM rrhh_sicytar_agregado_provincia_region_pais
+            GROUP BY nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+                     tipo_personal_sicytar, gran_area_experticia
+        """,
+        'indice_unico': ('nivel_agregacion', 'unidad_territorial', 'anio', 'tipo_personal_sicytar', 'gran_area_experticia'),
+        'indices': [('provincia_id', 'anio'), ('region_id', 'anio')],
+        'agregado': {
+            'tabla': 'rrhh_sicytar_agregado_provincia_region_pais',
+            'columnas': (
+                'nivel_agregacion', 'unidad_territorial', 'provincia_id', 'region_id', 'anio',
+                'tipo_personal_sicytar', 'gran_area_experticia',
+            ),
+            'medidas': ('cant_personas',),
+        },
+    },
+    # Además sin gran_area_experticia: alcanza para los totales por tipo de personal
+    'mv_rrhh_sicytar_tipo': {
+        'consulta': """
+            SELECT nivel_agregacion, unidad_territorial, provincia_id, region_id, anio,
+                   tipo_personal_sicytar,
+                   SUM(cant_personas)::integer AS cant_personas
+            FROM rrhh_sicytar_agregado_provincia_region_pais
+            GROUP BY nivel_agregacion, unidad_territorial, provincia_id, region_id, anio, tipo_personal_sicytar
+        """,
+        'indice_unico': ('nivel_agregacion', 'unidad_territorial', 'anio', 'tipo_personal_sicytar'),
+        'indices': [('provincia_id', 'anio'), ('region_id', 'anio')],
+        'agregado': {
+            'tabla': 'rrhh_sicytar_agregado_provincia_region_pais',
+            'columnas': (
+                'nivel_agregacion', 'unidad_territorial', 'provincia_id', 'region_id', 'anio',
+                'tipo_personal_sicytar',
+            ),
+            'medidas': ('cant_personas',),
+        },
+    },
+}
+
+
+def _nombres(nombres) -> list:
+    return list(VISTAS_MATERIALIZADAS) if nombres is None else list(nombres)
+
+
+def crear_vistas_materializadas(connection, nombres=None):
+    """
+    Crea (o vuelve a crear) las vistas materializadas con sus índices y las puebla.
+
+    Args:
+        connection: La conexión de Django donde crearlas (por ejemplo, schema_editor.connection).
+        nombres: Las vistas a crear; por defecto, todas.
+    """
+    with connection.cursor() as cursor:
+        for nombre in _nombres(nombres):
+            vista = VISTAS_MATERIALIZADAS[nombre]
+            cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {nombre}")
+            cursor.execute(f"CREATE MATERIALIZED VIEW {nombre} AS {vista['consulta']}")
+            cursor.execute(
+                f"CREATE UNIQUE INDEX {nombre}_unico ON {nombre} ({', '.join(vista['indice_unico'])})"
+            )
+            for columnas in vista['indices']:
+                cursor.execute(
+                    f"CREATE INDEX {nombre}_{'_'.join(columnas)}_idx ON {nombre} ({', '.join(columnas)})"
+                )
+
+
+def eliminar_vistas_materializadas(connection, nombres=None):
+    with connection.cursor() as cursor:
+        for nombre in _nombres(nombres):
+            cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {nombre}")
+
+
+def refrescar_vistas_materializadas(connection, nombres=None) -> dict:
+    """
+    Refresca las vistas materializadas sin bloquear su lectura y actualiza sus
+    estadísticas.
+
+    Args:
+        connection: La conexión de Django; si está dentro de una transacción, los informes
+            ven las vistas nuevas recién cuando esta se confirma.
+        nombres: Las vistas a refrescar; por defecto, todas.
+
+    Returns:
+        Un diccionario {vista: milisegundos que tardó el refresco}.
+    """
+    tiempos = {}
+    with connection.cursor() as cursor:
+        for nombre in _nombres(nombres):
+            inicio = time.perf_counter()
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {nombre}")
+            # El refresco no actualiza reltuples, que el navegador de agregados usa para
+            # elegir la vista más chica
+            cursor.execute(f"ANALYZE {nombre}")
+            tiempos[nombre] = (time.perf_counter() - inicio) * 1000
+            logger.info(f"Vista materializada {nombre} refrescada en {tiempos[nombre]:.1f} ms.")
+    return tiempos
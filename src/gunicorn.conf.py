@@ -0,0 +1,24 @@
+# Configuración de gunicorn: gunicorn -c gunicorn.conf.py (desde src/)
+import os
+import shutil
+from pathlib import Path
+
+wsgi_app = 'orquestador.wsgi:application'
+
+# Directorio donde cada worker escribe sus métricas de Prometheus; /metrics las suma.
+# Se define acá, en el proceso maestro, para que los workers lo hereden antes de
+# importar prometheus_client.
+DIR_METRICAS = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', str(Path(__file__).resolve().parent / 'cache' / 'prometheus')
+)
+
+
+def on_starting(server):
+    # Los archivos de una ejecución anterior se sumarían a los de esta
+    shutil.rmtree(DIR_METRICAS, ignore_errors=True)
+    os.makedirs(DIR_METRICAS, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
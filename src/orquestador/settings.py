@@ -82,7 +82,123 @@ DATABASES = {
         'PASSWORD': 'informes_pass',
         'HOST': 'localhost',  # o '127.0.0.1'
         'PORT': '5432',
-    }
+        # Conexión persistente del ORM: cada hilo reutiliza su conexión entre requests
+        # (en lugar de abrir una por request) y la verifica antes de reutilizarla
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Pool de SQLAlchemy usado por datos_fuente.data_handler para las consultas de los informes.
+        # Es por proceso: con gunicorn, el máximo de conexiones es workers * (SIZE + MAX_OVERFLOW).
+        'POOL': {
+            # 'psycopg' (psycopg 3) prepara en el servidor las consultas que se repiten y
+            # envía los lotes en pipeline. 'psycopg2' interpola los parámetros del lado del
+            # cliente y ejecuta los lotes de a una consulta.
+            'DRIVER': 'psycopg',
+            'SIZE': 5,
+            'MAX_OVERFLOW': 10,
+            'TIMEOUT': 30,
+            'PRE_PING': True,
+            'RECYCLE': 1800,
+            # Las columnas NUMERIC (DecimalField) se leen como float en el driver, sin pasar por Decimal
+            'NUMERIC_A_FLOAT': True,
+        },
+    },
+    # Réplica de solo lectura para las consultas de los informes y las lecturas de
+    # datos_fuente (ver INFORMES_REPLICA). Mientras no esté definida, todo va a 'default'.
+    # 'reportes': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'informes_db',
+    #     'USER': 'informes_user',
+    #     'PASSWORD': 'informes_pass',
+    #     'HOST': 'replica',
+    #     'PORT': '5432',
+    #     'CONN_MAX_AGE': 600,
+    #     'CONN_HEALTH_CHECKS': True,
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+DATABASE_ROUTERS = ['datos_fuente.routers.RouterReportes']
+
+# Uso de la réplica 'reportes'
+# Se usa solo si responde y ya tiene la última carga de datos (cargar_datos_cti);
+# si no, las lecturas vuelven a 'default'. Esto se verifica cada VERIFICAR_CADA
+# segundos y TIMEOUT_CONEXION acota la espera al conectarse a la réplica.
+
+INFORMES_REPLICA = {
+    'ALIAS': 'reportes',
+    'VERIFICAR_CADA': 10,
+    'TIMEOUT_CONEXION': 3,
+}
+
+
+# Plantillas de Jinja (SQL, configuración y nombres de componentes)
+# Las plantillas compiladas se guardan en un LRU por proceso y su bytecode en disco,
+# así los workers nuevos arrancan con las plantillas ya compiladas.
+
+PLANTILLAS_JINJA = {
+    'CACHE_SIZE': 1024,
+    'BYTECODE_DIR': BASE_DIR / 'cache' / 'jinja',
+}
+
+
+# Cache de resultados de componentes de informes
+# Se usa un cache en disco para que lo compartan los workers de gunicorn y los comandos
+# de pre-generación. MAX_ENTRIES acota el tamaño y TIMEOUT es el TTL de cada resultado.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'informes': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'informes',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+INFORMES_CACHE = {
+    'HABILITADO': True,
+    'ALIAS': 'informes',
+    # Los resultados vacíos (None o "N/A") se cachean por menos tiempo
+    'TTL_VACIO': 60 * 5,
+}
+
+
+# Ejecución de los componentes de un informe
+# 'secuencial' ejecuta un componente tras otro sobre una conexión reservada; 'paralelo'
+# los reparte en un pool de hilos compartido por el proceso, de WORKERS hilos, y cada
+# hilo reserva una conexión para su tanda (WORKERS no debería superar el SIZE del pool,
+# o las conexiones de más se abren y se cierran en cada informe); 'lote' envía todas las
+# consultas juntas por una sola conexión (en modo pipeline si DRIVER es 'psycopg').
+# Con la base en el mismo servidor, 'paralelo' no mejora a 'secuencial' (~180 ms contra
+# ~150 ms por informe): las consultas son cortas y el procesamiento en pandas compite
+# por el GIL. Conviene cuando la base está lejos y pesa la latencia de cada consulta.
+# CHUNK_SIZE es el tamaño de bloque de los componentes con "streaming": true en su
+# configuración, que se leen con un cursor del lado del servidor.
+# TIMEOUT_COMPONENTE (segundos) es el statement_timeout de cada consulta, sobrescribible
+# con "timeout" en la configuración del componente; PRESUPUESTO_INFORME acota el tiempo
+# total del informe. None desactiva cualquiera de los dos límites.
+
+INFORMES_EJECUCION = {
+    'ESTRATEGIA': 'secuencial',
+    'WORKERS': 8,
+    'CHUNK_SIZE': 5000,
+    'TIMEOUT_COMPONENTE': 10,
+    'PRESUPUESTO_INFORME': 30,
+}
+
+# Pre-generación de informes (comando generar_informes y cargar_datos_cti --pregenerar)
+# INFORMES: IDs o nombres de los informes a generar, None genera todos.
+# WORKERS: cantidad de procesos; cada uno abre su propio pool de conexiones.
+
+INFORMES_PREGENERACION = {
+    'INFORMES': None,
+    'ANIOS': '2019-2024',
+    'WORKERS': 4,
 }
 
 
@@ -17,9 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from ref.views import metricas_prometheus
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     # Cualquier URL que empiece con 'api/v1/' será redirigida a 'ref.urls'
     path('api/v1/', include('ref.urls')),
+
+    # Métricas en formato Prometheus
+    path('metrics', metricas_prometheus, name='metricas_prometheus'),
 ]
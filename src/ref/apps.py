@@ -12,3 +12,8 @@ class RefConfig(AppConfig):
 
         pio.templates['poncho'] = plotly_templates.poncho_template
         pio.templates.default = 'poncho'
+
+        # Invalidamos los resultados cacheados cada vez que se recargan los datos
+        from datos_fuente.signals import carga_finalizada
+        from .cache_resultados import invalidar_resultados
+        carga_finalizada.connect(invalidar_resultados, dispatch_uid='ref.invalidar_resultados')
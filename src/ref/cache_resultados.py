@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from datos_fuente.compilador_sql import compilar_plantilla
+from datos_fuente.metricas import ACCESOS_CACHE
+from datos_fuente.plantillas_jinja import variables_de_plantilla
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto, sobrescribibles desde settings.INFORMES_CACHE
+CONFIG_POR_DEFECTO = {
+    'HABILITADO': True,
+    'ALIAS': 'informes',
+    'TTL_VACIO': 300,
+}
+
+# Marca de "no está en cache", distinta de un resultado None cacheado
+NO_ENCONTRADO = object()
+
+
+def _config() -> dict:
+    return {**CONFIG_POR_DEFECTO, **getattr(settings, 'INFORMES_CACHE', {})}
+
+
+def _cache():
+    return caches[_config()['ALIAS']]
+
+
+def _variables_de_config(valor) -> set:
+    """ Recorre la configuración y junta las variables de Jinja de cada string. """
+    if isinstance(valor, dict):
+        return set().union(*(_variables_de_config(v) for v in valor.values()))
+    if isinstance(valor, list):
+        return set().union(*(_variables_de_config(v) for v in valor))
+    if isinstance(valor, str) and "{{" in valor:
+        return set(variables_de_plantilla(valor))
+    return set()
+
+
+def _variables_de_sql(plantilla_sql: str) -> set:
+    consulta = compilar_plantilla(plantilla_sql)
+    if consulta.jinja:
+        return set(variables_de_plantilla(plantilla_sql))
+    return set(consulta.parametros) | set(consulta.identificadores)
+
+
+def clave_resultado(item_composicion, config: dict, params: dict) -> str:
+    """
+    Arma la clave de cache de un componente dentro de un informe. Combina el id y la
+    versión del componente, el config_override de la composición y solo los parámetros
+    que usan la plantilla SQL y la configuración, así dos informes con el mismo
+    componente y distintos parámetros irrelevantes comparten el resultado.
+
+    Args:
+        item_composicion: La InformeComposicion que se está procesando.
+        config: La configuración de visualización ya combinada con el override.
+        params: Los parámetros de la generación.
+
+    Returns:
+        La clave a usar en el cache de resultados.
+    """
+    componente = item_composicion.componente
+    variables = _variables_de_sql(componente.plantilla_sql) | _variables_de_config(config)
+    relevantes = {k: v for k, v in params.items() if k in variables}
+    huella = json.dumps(
+        [item_composicion.config_override or {}, relevantes],
+        sort_keys=True, default=str
+    )
+    digest = hashlib.sha1(huella.encode('utf-8')).hexdigest()
+    return f"resultado:{componente.id}:v{componente.version}:{digest}"
+
+
+def obtener_resultado(clave: str):
+    """
+    Busca un resultado en el cache.
+
+    Returns:
+        El resultado cacheado (que puede ser None o "N/A" si se cacheó un resultado
+        vacío) o NO_ENCONTRADO si no está en cache o el cache está deshabilitado.
+    """
+    if not _config()['HABILITADO']:
+        return NO_ENCONTRADO
+    try:
+        envoltorio = _cache().get(clave)
+    except Exception as e:
+        logger.warning(f"No se pudo leer el cache de resultados: {e}")
+        return NO_ENCONTRADO
+    if envoltorio is None:
+        ACCESOS_CACHE.labels(cache='resultados', resultado='fallo').inc()
+        return NO_ENCONTRADO
+    ACCESOS_CACHE.labels(cache='resultados', resultado='acierto').inc()
+    # Se guarda envuelto en una tupla para distinguir un None cacheado de un fallo
+    return envoltorio[0]
+
+
+def guardar_resultado(clave: str, resultado, fallido: bool = False):
+    """
+    Guarda el resultado procesado de un componente. Los resultados vacíos (None o
+    "N/A") también se guardan, pero con el TTL más corto de TTL_VACIO, para no
+    repetir consultas que no devuelven datos sin dejarlos fijos por mucho tiempo.
+
+    Args:
+        clave: La clave de `clave_resultado`.
+        resultado: El resultado procesado.
+        fallido: True si la consulta falló (ver data_handler.consulta_fallida). Ese
+            resultado no se guarda: el próximo pedido vuelve a consultar.
+    """
+    config = _config()
+    if not config['HABILITADO'] or fallido:
+        return
+    vacio = resultado is None or resultado == "N/A"
+    try:
+        if vacio:
+            _cache().set(clave, (resultado,), timeout=config['TTL_VACIO'])
+        else:
+            _cache().set(clave, (resultado,))
+    except Exception as e:
+        logger.warning(f"No se pudo escribir en el cache de resultados: {e}")
+
+
+def invalidar_resultados(**kwargs):
+    """ Vacía el cache de resultados. Se conecta a la señal de fin de carga de datos. """
+    try:
+        _cache().clear()
+        logger.info("Cache de resultados de informes invalidado.")
+    except Exception as e:
+        logger.warning(f"No se pudo vaciar el cache de resultados: {e}")
@@ -1,15 +1,100 @@
+import asyncio
 import logging
 import json
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from jinja2 import Environment, meta
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from .models import Informe
-from datos_fuente.data_handler import ejecutar_consulta_parametrizada
+from datos_fuente.models import Provincia
+from datos_fuente.data_handler import (
+    aejecutar_consulta_parametrizada, conexion_reservada, consulta_fallida, convertir_categorias, engines_async,
+    ejecutar_consulta_parametrizada, ejecutar_consulta_por_provincia, ejecutar_consultas_en_lote,
+    iterar_consulta_parametrizada, TiempoConsultaExcedido
+)
+from datos_fuente.plantillas_jinja import obtener_plantilla, variables_de_plantilla
+from datos_fuente.contexto import contexto_provincia
+from datos_fuente.navegador_agregados import navegar_agregados
+from datos_fuente.metricas import contar_error
+from .cache_resultados import NO_ENCONTRADO, clave_resultado, guardar_resultado, obtener_resultado
+from .metricas import observar_componente, observar_informe
 
 
 logger = logging.getLogger(__name__)
 
+# Valores por defecto, sobrescribibles desde settings.INFORMES_EJECUCION
+EJECUCION_POR_DEFECTO = {
+    'ESTRATEGIA': 'secuencial',
+    'WORKERS': 8,
+    'CHUNK_SIZE': 5000,
+    'TIMEOUT_COMPONENTE': 10,
+    'PRESUPUESTO_INFORME': 30,
+}
+
+ESTRATEGIAS = ('secuencial', 'paralelo', 'lote')
+
+# Etapas que se miden en cada componente (ver GeneradorInforme.metricas_componentes)
+ETAPAS = ('plantilla_ms', 'sql_ms', 'fetch_ms', 'transformacion_ms', 'serializacion_ms')
+
+# Pool de hilos compartido por todo el proceso para ejecutar componentes en paralelo.
+# Al ser único, la cantidad de consultas simultáneas queda acotada aunque haya
+# varios informes generándose a la vez.
+_pool_hilos = None
+_pool_hilos_lock = threading.Lock()
+
+
+def _config_ejecucion() -> dict:
+    return {**EJECUCION_POR_DEFECTO, **getattr(settings, 'INFORMES_EJECUCION', {})}
+
+
+def _obtener_pool_hilos() -> ThreadPoolExecutor:
+    global _pool_hilos
+    if _pool_hilos is None:
+        with _pool_hilos_lock:
+            if _pool_hilos is None:
+                workers = _config_ejecucion()['WORKERS']
+                _pool_hilos = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='informe')
+                logger.info(f"Pool de hilos para componentes creado con {workers} workers.")
+    return _pool_hilos
+
+
+# KPI que leen una columna de una fila: "SELECT columna FROM tabla WHERE predicado". Los que
+# comparten tabla y predicado se resuelven con una sola consulta (ver _agrupar_kpis_por_fila)
+_KPI_DE_FILA = re.compile(
+    r"^\s*SELECT\s+(\w+)\s+FROM\s+(\w+)\s+WHERE\s+(.+?)\s*;?\s*$", re.IGNORECASE | re.DOTALL
+)
+_CLAUSULAS_NO_COMPARTIBLES = re.compile(r"\b(SELECT|GROUP|ORDER|LIMIT|OFFSET|HAVING|UNION)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _fila_de_kpi(plantilla_sql: str):
+    """ Devuelve (columna, tabla, predicado) si el KPI solo lee una columna de una fila, o None. """
+    coincidencia = _KPI_DE_FILA.match(plantilla_sql)
+    if not coincidencia or _CLAUSULAS_NO_COMPARTIBLES.search(coincidencia.group(3)):
+        return None
+    columna, tabla, predicado = coincidencia.groups()
+    # PostgreSQL pasa a minúsculas los identificadores sin comillas
+    return columna.lower(), tabla.lower(), predicado
+
+
+def _columna_de_fila(df_fila, columna: str):
+    """ Extrae la columna de un KPI de la fila compartida; deja pasar un TiempoConsultaExcedido o una falla. """
+    if isinstance(df_fila, TiempoConsultaExcedido) or consulta_fallida(df_fila):
+        return df_fila
+    return df_fila[[columna]] if columna in df_fila.columns else pd.DataFrame()
+
+
+def _unir_bloques(bloques) -> pd.DataFrame:
+    """ Reúne en un único DataFrame los bloques de una consulta en streaming. """
+    bloques = list(bloques)
+    return pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame()
+
 
 class NumpyEncoder(json.JSONEncoder):
     """
@@ -24,7 +109,23 @@ class NumpyEncoder(json.JSONEncoder):
 
 class GeneradorInforme:
     """ Gestiona la generación de una instancia de un informe específico. """
-    def __init__(self, informe_id: int):
+    def __init__(self, informe_id: int, leer_cache: bool = True):
+        # Con leer_cache=False los componentes se recalculan siempre (los resultados
+        # igual se guardan en el cache, lo que sirve para refrescarlo)
+        self.leer_cache = leer_cache
+        # Duración en segundos de cada componente en la última generación, por pk del
+        # Componente (los nombres son plantillas de Jinja y pueden repetirse)
+        self.tiempos_componentes = {}
+        # Tiempos por etapa, filas y bytes de cada componente (también por pk), y el resumen del informe
+        self.metricas_componentes = {}
+        self.metricas = {}
+        # KPI que comparten la consulta de su fila ({pk de InformeComposicion: (plantilla, columna)})
+        # y las filas ya pedidas en la generación actual, por plantilla
+        self._kpis_compartidos = {}
+        self._filas_compartidas = {}
+        self._filas_lock = threading.Lock()
+        # Consultas ya dirigidas a su agregado, por pk de Componente (ver `_plantilla`)
+        self._plantillas = {}
         try:
             self.informe = Informe.objects.get(pk=informe_id)
             logger.info(f"Generador inicializado para el informe: '{self.informe.nombre}'")
@@ -32,13 +133,48 @@ class GeneradorInforme:
             logger.error(f"Error: El informe con ID {informe_id} no existe.")
             raise ValueError(f"El informe con ID {informe_id} no existe.")
 
+    @classmethod
+    async def acrear(cls, informe_id: int, leer_cache: bool = True):
+        """ Crea el generador desde código asíncrono (la búsqueda del informe usa el ORM). """
+        return await sync_to_async(cls)(informe_id, leer_cache=leer_cache)
+
+    def _con_contexto(self, params: dict) -> dict:
+        """
+        Agrega a los parámetros el contexto de la provincia (provincia_nombre, region_cofecyt,
+        poblacion, etc.), leído una sola vez por proceso. Los parámetros recibidos tienen
+        prioridad sobre los del contexto.
+        """
+        if 'provincia_id' not in params:
+            return params
+        return {**contexto_provincia(params['provincia_id']), **params}
+
+    def _plantilla(self, componente) -> str:
+        """
+        La consulta del componente, dirigida al agregado más chico que la responde
+        (ver datos_fuente.navegador_agregados).
+        """
+        plantilla = self._plantillas.get((componente.pk, componente.version))
+        if plantilla is None:
+            plantilla = navegar_agregados(componente.plantilla_sql, componente.agregado)
+        return plantilla
+
+    def _navegar(self, items) -> dict:
+        """
+        Resuelve de antemano las consultas de los items; el navegador puede leer la base.
+        Las claves llevan la versión del componente, que cambia con su plantilla.
+        """
+        return {
+            (item.componente.pk, item.componente.version):
+                navegar_agregados(item.componente.plantilla_sql, item.componente.agregado)
+            for item in items
+        }
+
     def _renderizar_config_dinamica(self, config: dict, params: dict) -> dict:
-        env = Environment()
         rendered_config = {}
         for key, value in config.items():
             if isinstance(value, str) and "{{" in value:
-                template = env.from_string(value)
-                variables = meta.find_undeclared_variables(env.parse(value))
+                template = obtener_plantilla(value)
+                variables = variables_de_plantilla(value)
                 contexto = {k: v for k, v in params.items() if k in variables}
                 rendered_config[key] = template.render(contexto)
             elif isinstance(value, dict):
@@ -68,7 +204,7 @@ class GeneradorInforme:
                 pivot_config = config.get("pivot")
                 df_pivot = df.pivot_table(
                     index=pivot_config.get("index"), columns=pivot_config.get("columns"),
-                    values=pivot_config.get("values"), fill_value=""
+                    values=pivot_config.get("values"), fill_value="", observed=True
                 ).reset_index()
                 headers = list(df_pivot.columns)
                 cell_values = [df_pivot[col].to_list() for col in headers]
@@ -96,9 +232,16 @@ class GeneradorInforme:
                 "layout": layout_config
             }
 
-    def _procesar_grafico(self, df: pd.DataFrame, config: dict, params: dict, subtipo: str) -> dict:
-        if df.empty:
-            return None
+    def _procesar_grafico(self, df, config: dict, params: dict, subtipo: str) -> dict:
+        """
+        Arma las trazas de un gráfico. `df` puede ser un DataFrame o un iterable de
+        DataFrames (los bloques de una consulta en streaming); en ese caso las trazas se
+        acumulan bloque a bloque sin reunir el resultado completo, salvo para el
+        treemap, que necesita todas las filas.
+        """
+        bloques = [df] if isinstance(df, pd.DataFrame) else df
+        if subtipo == 'treemap':
+            bloques = [_unir_bloques(bloques)]
         mapping = self._renderizar_config_dinamica(config.get("plot_mapping", {}), params)
         layout_config = self._renderizar_config_dinamica(config.get("layout", {}), params)
 
@@ -116,11 +259,43 @@ class GeneradorInforme:
             return None
         """
 
+        traces = []
+        cantidad_bloques = 0
+        for bloque in bloques:
+            if bloque.empty:
+                continue
+            cantidad_bloques += 1
+            traces = self._acumular_trazas(traces, self._trazas_grafico(bloque, mapping, subtipo))
+        if not cantidad_bloques:
+            return None
+        if cantidad_bloques > 1 and 'color' in mapping:
+            # Los grupos que aparecen en bloques posteriores se agregaron al final
+            traces.sort(key=lambda traza: traza.get('name'))
+
+        return {"data": traces, "layout": layout_config}
+
+    @staticmethod
+    def _acumular_trazas(acumuladas: list, nuevas: list) -> list:
+        """ Agrega las trazas de un bloque a las ya acumuladas, uniendo las que tienen el mismo nombre. """
+        por_nombre = {traza.get('name'): traza for traza in acumuladas}
+        for traza in nuevas:
+            existente = por_nombre.get(traza.get('name'))
+            if existente is None:
+                acumuladas.append(traza)
+                por_nombre[traza.get('name')] = traza
+                continue
+            for campo in ('x', 'y', 'labels', 'values', 'parents'):
+                if campo in traza:
+                    existente[campo].extend(traza[campo])
+        return acumuladas
+
+    def _trazas_grafico(self, df: pd.DataFrame, mapping: dict, subtipo: str) -> list:
+        """ Arma las trazas de Plotly de un gráfico a partir de un DataFrame (o de un bloque). """
         traces = []
         if subtipo == 'line':
             if 'color' in mapping:
                 color_col = mapping.get('color')
-                for name, group in df.groupby(color_col):
+                for name, group in df.groupby(color_col, observed=True):
                     traces.append({
                         'x': group[mapping['x']].to_list(),
                         'y': group[mapping['y']].to_list(),
@@ -138,7 +313,7 @@ class GeneradorInforme:
         elif subtipo == 'bar':
             if 'color' in mapping:
                 color_col = mapping.get('color')
-                for name, group in df.groupby(color_col):
+                for name, group in df.groupby(color_col, observed=True):
                     traces.append({
                         'x': group[mapping['x']].to_list(),
                         'y': group[mapping['y']].to_list(),
@@ -154,7 +329,7 @@ class GeneradorInforme:
         elif subtipo == 'barh':
             if 'color' in mapping:
                 color_col = mapping.get('color')
-                for name, group in df.groupby(color_col):
+                for name, group in df.groupby(color_col, observed=True):
                     traces.append({
                         'x': group[mapping['y']].to_list(),
                         'y': group[mapping['x']].to_list(),
@@ -196,53 +371,567 @@ class GeneradorInforme:
                 }
                 traces.append(trace_dict)
 
-        return {"data": traces, "layout": layout_config}
+        return traces
+
+    def _config_componente(self, item_composicion) -> dict:
+        """ Combina la configuración del componente con el override de la composición. """
+        config = item_composicion.componente.config_visualizacion.copy()
+        if item_composicion.config_override:
+            config.update(item_composicion.config_override)
+        return config
+
+    def _agrupar_kpis_por_fila(self, items: list) -> dict:
+        """
+        Busca los KPI que leen una columna de la misma fila (misma tabla y mismo predicado,
+        por ejemplo los indicadores de contexto de una provincia) y arma para cada grupo
+        una consulta con todas sus columnas, así la fila se lee una sola vez.
+
+        Args:
+            items: Las InformeComposicion a generar.
+
+        Returns:
+            Un diccionario {pk de InformeComposicion: (plantilla_sql, columna)} con los KPI
+            de los grupos de dos o más componentes.
+        """
+        grupos = {}
+        for item_composicion in items:
+            componente = item_composicion.componente
+            if componente.tipo_componente != "KPI" or self._config_componente(item_composicion).get('streaming'):
+                continue
+            fila = _fila_de_kpi(self._plantilla(componente))
+            if fila:
+                columna, tabla, predicado = fila
+                grupos.setdefault((tabla, predicado), []).append((item_composicion.pk, columna))
+
+        compartidos = {}
+        for (tabla, predicado), miembros in grupos.items():
+            if len(miembros) < 2:
+                continue
+            columnas = list(dict.fromkeys(columna for _, columna in miembros))
+            plantilla_sql = f"SELECT {', '.join(columnas)} FROM {tabla} WHERE {predicado}"
+            compartidos.update({pk: (plantilla_sql, columna) for pk, columna in miembros})
+        if compartidos:
+            logger.info(f"{len(compartidos)} KPI comparten la lectura de {len(set(compartidos.values()))} filas.")
+        return compartidos
+
+    def _leer_fila_compartida(self, item_composicion, params: dict, timeout: float = None, metricas: dict = None):
+        """
+        Devuelve la columna de un KPI agrupado. El primer KPI del grupo ejecuta la consulta
+        de la fila; los demás (también desde otros hilos) esperan ese mismo resultado.
+        """
+        plantilla_sql, columna = self._kpis_compartidos[item_composicion.pk]
+        with self._filas_lock:
+            future = self._filas_compartidas.get(plantilla_sql)
+            propia = future is None
+            if propia:
+                future = self._filas_compartidas[plantilla_sql] = Future()
+        if propia:
+            try:
+                future.set_result(ejecutar_consulta_parametrizada(plantilla_sql, params, timeout=timeout, metricas=metricas))
+            except Exception as e:
+                future.set_exception(e)
+        return _columna_de_fila(future.result(), columna)
+
+    async def _aleer_fila_compartida(self, item_composicion, params: dict, timeout: float = None, metricas: dict = None):
+        """ Versión asíncrona de `_leer_fila_compartida`: los KPI del grupo esperan la misma tarea. """
+        plantilla_sql, columna = self._kpis_compartidos[item_composicion.pk]
+        tarea = self._filas_compartidas.get(plantilla_sql)
+        if tarea is None:
+            tarea = self._filas_compartidas[plantilla_sql] = asyncio.ensure_future(aejecutar_consulta_parametrizada(
+                plantilla_sql=plantilla_sql, params=params, timeout=timeout, metricas=metricas
+            ))
+        return _columna_de_fila(await tarea, columna)
+
+    def _obtener_datos(self, componente, config: dict, params: dict, timeout: float = None, metricas: dict = None):
+        """
+        Ejecuta la consulta de un componente. Si su configuración tiene "streaming"
+        (true o una cantidad de filas por bloque), devuelve un iterador de bloques leídos
+        con un cursor del lado del servidor en lugar de un DataFrame completo. Con
+        "categorias": true, las columnas de texto repetitivas se leen como `category`.
+        """
+        streaming = config.get('streaming')
+        categorias = bool(config.get('categorias'))
+        if not streaming:
+            return ejecutar_consulta_parametrizada(
+                plantilla_sql=self._plantilla(componente), params=params, categorias=categorias, timeout=timeout,
+                metricas=metricas
+            )
+        chunksize = _config_ejecucion()['CHUNK_SIZE'] if streaming is True else int(streaming)
+        return iterar_consulta_parametrizada(
+            self._plantilla(componente), params, chunksize=chunksize, categorias=categorias, timeout=timeout,
+            metricas=metricas
+        )
+
+    def _procesar_datos(self, df_datos, componente, config: dict, params: dict):
+        """
+        Transforma el resultado de un componente según su tipo. `df_datos` puede ser un
+        DataFrame o un iterador de bloques: los gráficos los consumen de a uno, el resto
+        de los tipos necesita el resultado completo.
+        """
+        tipo = componente.tipo_componente
+        if not isinstance(df_datos, pd.DataFrame) and tipo != "GRAFICO":
+            df_datos = _unir_bloques(df_datos)
+        if tipo == "KPI":
+            return self._procesar_kpi(df_datos, config)
+        if tipo == "TABLA":
+            return self._procesar_tabla(df_datos, config, params)
+        if tipo == "GRAFICO":
+            return self._procesar_grafico(df_datos, config, params, componente.tipo_grafico)
+        return None
+
+    def _procesar_medido(self, df_datos, componente, config: dict, params: dict, metricas: dict):
+        """
+        Igual que `_procesar_datos`, registrando el tiempo de transformación. Con datos en
+        streaming la lectura de los bloques ocurre durante el procesamiento, así que se
+        descuenta para no contarla dos veces.
+        """
+        lectura_previa = metricas.get('sql_ms', 0.0) + metricas.get('fetch_ms', 0.0)
+        inicio = time.perf_counter()
+        resultado_final = self._procesar_datos(df_datos, componente, config, params)
+        lectura = metricas.get('sql_ms', 0.0) + metricas.get('fetch_ms', 0.0) - lectura_previa
+        metricas['transformacion_ms'] = (time.perf_counter() - inicio) * 1000 - lectura
+        return resultado_final
+
+    def _registrar_metricas(self, componente, metricas: dict, resultado_final, inicio: float):
+        """
+        Completa las métricas de un componente con el tamaño de su resultado serializado
+        a JSON (lo que viaja en la respuesta) y las guarda en `metricas_componentes`.
+        """
+        inicio_serializacion = time.perf_counter()
+        metricas['bytes'] = len(json.dumps(resultado_final, cls=NumpyEncoder, default=str).encode('utf-8'))
+        metricas['serializacion_ms'] = (time.perf_counter() - inicio_serializacion) * 1000
+        total = time.perf_counter() - inicio
+        metricas['total_ms'] = total * 1000
+        self.metricas_componentes[componente.pk] = metricas
+        self.tiempos_componentes[componente.pk] = total
+        observar_componente(componente, metricas)
+
+    def _resumir_metricas(self, estrategia: str, inicio: float, resultados: list, metricas_lote: dict = None) -> dict:
+        """
+        Suma las métricas de los componentes en un resumen del informe. Las etapas son
+        sumas sobre los componentes: con la estrategia paralela pueden superar total_ms.
+        """
+        etapas = {etapa: 0.0 for etapa in ETAPAS}
+        for metricas in [*self.metricas_componentes.values(), metricas_lote or {}]:
+            for etapa in ETAPAS:
+                etapas[etapa] += metricas.get(etapa, 0.0)
+        return {
+            'informe_id': self.informe.id,
+            'informe': self.informe.nombre,
+            'estrategia': estrategia,
+            'total_ms': (time.perf_counter() - inicio) * 1000,
+            'etapas': etapas,
+            'componentes': len(resultados),
+            'cache_hits': sum(1 for metricas in self.metricas_componentes.values() if metricas.get('cache')),
+            'tiempo_excedido': sum(1 for resultado in resultados if resultado.get('tiempo_excedido')),
+            'filas': sum(metricas.get('filas', 0) for metricas in self.metricas_componentes.values()),
+            'bytes': sum(metricas.get('bytes', 0) for metricas in self.metricas_componentes.values()),
+        }
+
+    def _armar_resultado(self, item_composicion, params: dict, resultado_final) -> dict:
+        """ Arma el diccionario de salida de un componente, con su nombre renderizado. """
+        componente = item_composicion.componente
+        nombre_template = obtener_plantilla(componente.nombre)
+        return {
+            'nombre': nombre_template.render(params),
+            'orden': item_composicion.orden,
+            'tipo': componente.tipo_componente,
+            'subtipo': componente.tipo_grafico,
+            'resultado': resultado_final
+        }
+
+    def _resultado_fallido(self, item_composicion, params: dict, error: Exception) -> dict:
+        """ Resultado de un componente que falló: se informa sin datos para no frenar el informe. """
+        componente = item_composicion.componente
+        logger.error(f"Error al generar el componente '{componente.nombre}': {error}", exc_info=error)
+        contar_error(error)
+        try:
+            nombre = obtener_plantilla(componente.nombre).render(params)
+        except Exception:
+            # El error pudo ser justamente el del nombre
+            nombre = componente.nombre
+        return {
+            'nombre': nombre,
+            'orden': item_composicion.orden,
+            'tipo': componente.tipo_componente,
+            'subtipo': componente.tipo_grafico,
+            'resultado': None
+        }
+
+    def _resultado_tiempo_excedido(self, item_composicion, params: dict, error: Exception) -> dict:
+        """ Resultado de un componente cancelado por tiempo: se informa sin datos y marcado como tal. """
+        logger.warning(f"El componente '{item_composicion.componente.nombre}' no terminó a tiempo: {error}")
+        contar_error(error)
+        resultado = self._armar_resultado(item_composicion, params, None)
+        resultado['tiempo_excedido'] = True
+        return resultado
+
+    def _timeout_componente(self, config: dict, limite: float = None) -> float:
+        """
+        Calcula el tiempo máximo de la consulta de un componente: el "timeout" de su
+        configuración (o TIMEOUT_COMPONENTE), acotado por lo que queda del presupuesto
+        del informe.
+
+        Args:
+            config: La configuración del componente.
+            limite: El instante (time.perf_counter) en que vence el presupuesto del informe.
+
+        Returns:
+            El tiempo máximo en segundos, o None si no hay límite.
+
+        Raises:
+            TiempoConsultaExcedido: Si el presupuesto del informe ya se agotó.
+        """
+        timeout = config.get('timeout', _config_ejecucion()['TIMEOUT_COMPONENTE'])
+        if limite is None:
+            return timeout
+        restante = limite - time.perf_counter()
+        if restante <= 0:
+            raise TiempoConsultaExcedido("Se agotó el presupuesto de tiempo del informe.")
+        return restante if timeout is None else min(timeout, restante)
+
+    def _limite_informe(self, inicio: float):
+        presupuesto = _config_ejecucion()['PRESUPUESTO_INFORME']
+        return inicio + presupuesto if presupuesto is not None else None
+
+    def _generar_componente(self, item_composicion, params: dict, limite: float = None) -> dict:
+        """
+        Ejecuta la consulta de un componente, procesa su resultado y renderiza su nombre.
+        """
+        componente = item_composicion.componente
+        logger.info(f"Procesando componente (Orden {item_composicion.orden}): '{componente.nombre}'")
+        inicio = time.perf_counter()
+        config = self._config_componente(item_composicion)
+
+        # Si el resultado ya fue calculado para estos parámetros, evitamos la consulta
+        clave = clave_resultado(item_composicion, config, params)
+        resultado_final = obtener_resultado(clave) if self.leer_cache else NO_ENCONTRADO
+        metricas = {'cache': resultado_final is not NO_ENCONTRADO}
+        if resultado_final is NO_ENCONTRADO:
+            timeout = self._timeout_componente(config, limite)
+            if item_composicion.pk in self._kpis_compartidos:
+                df_datos = self._leer_fila_compartida(item_composicion, params, timeout, metricas)
+            else:
+                df_datos = self._obtener_datos(componente, config, params, timeout, metricas)
+            resultado_final = self._procesar_medido(df_datos, componente, config, params, metricas)
+            # En streaming, la falla se conoce recién al consumir los bloques
+            guardar_resultado(clave, resultado_final, consulta_fallida(df_datos) or 'error' in metricas)
+
+        inicio_nombre = time.perf_counter()
+        resultado = self._armar_resultado(item_composicion, params, resultado_final)
+        metricas['plantilla_ms'] = metricas.get('plantilla_ms', 0.0) + (time.perf_counter() - inicio_nombre) * 1000
+        self._registrar_metricas(componente, metricas, resultado_final, inicio)
+        return resultado
 
-    def generar(self, params: dict):
+    def _generar_componente_aislado(self, item_composicion, params: dict, limite: float = None) -> dict:
+        """
+        Igual que `_generar_componente`, pero si algo falla devuelve el componente con
+        resultado None en lugar de interrumpir la generación del informe completo, y si
+        no termina a tiempo lo devuelve marcado con 'tiempo_excedido'.
+        """
+        try:
+            return self._generar_componente(item_composicion, params, limite)
+        except TiempoConsultaExcedido as e:
+            return self._resultado_tiempo_excedido(item_composicion, params, e)
+        except Exception as e:
+            return self._resultado_fallido(item_composicion, params, e)
+
+    def _generar_tanda(self, items: list, params: dict, limite: float = None) -> dict:
+        """ Genera los componentes uno tras otro sobre una conexión reservada; devuelve {pk: resultado}. """
+        with conexion_reservada():
+            return {item.pk: self._generar_componente_aislado(item, params, limite) for item in items}
+
+    def _generar_en_lote(self, items: list, params: dict, limite: float = None, metricas_lote: dict = None) -> list:
+        """
+        Resuelve primero los componentes que están en cache y envía las consultas del
+        resto en un único lote (ver `ejecutar_consultas_en_lote`). Cada consulta del lote
+        usa el mayor timeout de los componentes pendientes, acotado por el presupuesto.
+        Los tiempos del lote completo se registran en `metricas_lote`, no por componente.
+        Los componentes con "streaming" no entran al lote, que lee todas las filas de una
+        vez: se generan después, uno por uno.
+        """
+        pendientes = []
+        en_streaming = []
+        resultados = {}
+        for item_composicion in items:
+            try:
+                config = self._config_componente(item_composicion)
+                clave = clave_resultado(item_composicion, config, params)
+                resultado_final = obtener_resultado(clave) if self.leer_cache else NO_ENCONTRADO
+                if resultado_final is NO_ENCONTRADO and config.get('streaming'):
+                    en_streaming.append(item_composicion)
+                elif resultado_final is NO_ENCONTRADO:
+                    pendientes.append((item_composicion, config, clave))
+                else:
+                    resultados[item_composicion.pk] = self._armar_resultado(item_composicion, params, resultado_final)
+            except Exception as e:
+                resultados[item_composicion.pk] = self._resultado_fallido(item_composicion, params, e)
+
+        try:
+            timeouts = [self._timeout_componente(config, limite) for _, config, _ in pendientes]
+        except TiempoConsultaExcedido as e:
+            for item_composicion, _, _ in pendientes:
+                resultados[item_composicion.pk] = self._resultado_tiempo_excedido(item_composicion, params, e)
+            pendientes = []
+            timeouts = []
+        timeout = None if None in timeouts or not timeouts else max(timeouts)
+
+        # Los KPI agrupados por fila envían una sola consulta por grupo
+        consultas = []
+        origenes = []
+        por_plantilla = {}
+        for item_composicion, _, _ in pendientes:
+            plantilla_sql, columna = self._kpis_compartidos.get(
+                item_composicion.pk, (self._plantilla(item_composicion.componente), None)
+            )
+            if columna is None or plantilla_sql not in por_plantilla:
+                por_plantilla[plantilla_sql] = len(consultas)
+                consultas.append((plantilla_sql, params))
+            origenes.append((por_plantilla[plantilla_sql], columna))
+        leidos = ejecutar_consultas_en_lote(consultas, timeout=timeout, metricas=metricas_lote) if consultas else []
+        dataframes = [leidos[indice] if columna is None else _columna_de_fila(leidos[indice], columna)
+                      for indice, columna in origenes]
+
+        # En este modo la consulta es compartida, así que el tiempo de cada componente
+        # solo incluye el procesamiento de su resultado
+        for (item_composicion, config, clave), df_datos in zip(pendientes, dataframes):
+            if isinstance(df_datos, TiempoConsultaExcedido):
+                resultados[item_composicion.pk] = self._resultado_tiempo_excedido(item_composicion, params, df_datos)
+                continue
+            try:
+                inicio = time.perf_counter()
+                metricas = {'cache': False, 'filas': len(df_datos)}
+                if config.get('categorias'):
+                    convertir_categorias(df_datos)
+                resultado_final = self._procesar_medido(df_datos, item_composicion.componente, config, params, metricas)
+                guardar_resultado(clave, resultado_final, consulta_fallida(df_datos))
+                resultados[item_composicion.pk] = self._armar_resultado(item_composicion, params, resultado_final)
+                self._registrar_metricas(item_composicion.componente, metricas, resultado_final, inicio)
+            except Exception as e:
+                resultados[item_composicion.pk] = self._resultado_fallido(item_composicion, params, e)
+
+        for item_composicion in en_streaming:
+            resultados[item_composicion.pk] = self._generar_componente_aislado(item_composicion, params, limite)
+        return [resultados[item_composicion.pk] for item_composicion in items]
+
+    async def _agenerar_componente_aislado(self, item_composicion, params: dict, limite: float = None) -> dict:
+        """
+        Versión asíncrona de `_generar_componente_aislado`. Solo la consulta es asíncrona:
+        el cache de archivos, el ORM y las transformaciones de pandas son bloqueantes, así
+        que corren en hilos y no frenan el event loop mientras otras consultas esperan.
+        """
+        componente = item_composicion.componente
+        try:
+            inicio = time.perf_counter()
+            config, clave, resultado_final = await sync_to_async(self._buscar_en_cache, thread_sensitive=False)(
+                item_composicion, params
+            )
+            metricas = {'cache': resultado_final is not NO_ENCONTRADO}
+            if resultado_final is NO_ENCONTRADO:
+                timeout = self._timeout_componente(config, limite)
+                if config.get('streaming'):
+                    # El cursor del lado del servidor es sincrónico: el iterador no lee nada
+                    # hasta que se consume, y eso ocurre al procesarlo en un hilo
+                    df_datos = self._obtener_datos(componente, config, params, timeout, metricas)
+                elif item_composicion.pk in self._kpis_compartidos:
+                    df_datos = await self._aleer_fila_compartida(item_composicion, params, timeout, metricas)
+                else:
+                    df_datos = await aejecutar_consulta_parametrizada(
+                        plantilla_sql=self._plantilla(componente), params=params, timeout=timeout, metricas=metricas
+                    )
+                    if config.get('categorias'):
+                        df_datos = await asyncio.to_thread(convertir_categorias, df_datos)
+                resultado_final = await asyncio.to_thread(
+                    self._procesar_y_guardar, df_datos, componente, config, params, metricas, clave
+                )
+            return await asyncio.to_thread(self._terminar_componente, item_composicion, params, resultado_final, metricas, inicio)
+        except TiempoConsultaExcedido as e:
+            return self._resultado_tiempo_excedido(item_composicion, params, e)
+        except Exception as e:
+            return self._resultado_fallido(item_composicion, params, e)
+
+    def _buscar_en_cache(self, item_composicion, params: dict) -> tuple:
+        """ La configuración de un componente, su clave de cache y el resultado cacheado (o NO_ENCONTRADO). """
+        config = self._config_componente(item_composicion)
+        clave = clave_resultado(item_composicion, config, params)
+        return config, clave, obtener_resultado(clave) if self.leer_cache else NO_ENCONTRADO
+
+    def _procesar_y_guardar(self, df_datos, componente, config: dict, params: dict, metricas: dict, clave: str):
+        resultado_final = self._procesar_medido(df_datos, componente, config, params, metricas)
+        # En streaming, la falla se conoce recién al consumir los bloques
+        guardar_resultado(clave, resultado_final, consulta_fallida(df_datos) or 'error' in metricas)
+        return resultado_final
+
+    def _terminar_componente(self, item_composicion, params: dict, resultado_final, metricas: dict, inicio: float) -> dict:
+        resultado = self._armar_resultado(item_composicion, params, resultado_final)
+        self._registrar_metricas(item_composicion.componente, metricas, resultado_final, inicio)
+        return resultado
+
+    def generar(self, params: dict, estrategia: str = None):
         """
         Ejecuta el flujo completo para generar el informe.
         Ahora también renderiza los nombres de los componentes.
+
+        Cada consulta tiene un tiempo máximo (ver `_timeout_componente`) y el informe
+        completo, el presupuesto de settings.INFORMES_EJECUCION['PRESUPUESTO_INFORME'].
+        Los componentes que no terminan a tiempo se cancelan en el servidor y se
+        devuelven sin resultado y con 'tiempo_excedido': True.
+
+        Args:
+            params: Los parámetros del informe (provincia_id, anio, etc.).
+            estrategia: 'secuencial', 'paralelo' o 'lote'. Si no se indica, se usa
+                settings.INFORMES_EJECUCION['ESTRATEGIA'].
+
+        Returns:
+            La lista de resultados de los componentes, ordenada por InformeComposicion.orden.
         """
+        estrategia = estrategia or _config_ejecucion()['ESTRATEGIA']
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia de ejecución desconocida: '{estrategia}'.")
+
+        params = self._con_contexto(params)
         logger.info(f"Iniciando generación de informe '{self.informe.nombre}' con parámetros: {params}")
-        resultados_componentes = []
-        composicion = self.informe.informecomposicion_set.order_by('orden')
+        inicio = time.perf_counter()
+        self.tiempos_componentes = {}
+        self.metricas_componentes = {}
+        metricas_lote = {}
+        limite = self._limite_informe(inicio)
+        composicion = self.informe.informecomposicion_set.select_related('componente').order_by('orden')
+        items = [item for item in composicion if item.componente.plantilla_sql]
+        self._plantillas = self._navegar(items)
+        self._kpis_compartidos = self._agrupar_kpis_por_fila(items)
+        self._filas_compartidas = {}
 
-        # Creamos un único entorno de Jinja para reutilizarlo
-        env = Environment()
+        if estrategia == 'paralelo':
+            # Los componentes son independientes entre sí. Se reparten en una tanda por
+            # hilo y cada tanda reserva una conexión, como la estrategia secuencial
+            hilos = _config_ejecucion()['WORKERS']
+            tandas = [items[i::hilos] for i in range(min(hilos, len(items)))]
+            futures = [_obtener_pool_hilos().submit(self._generar_tanda, tanda, params, limite) for tanda in tandas]
+            por_pk = {}
+            for future in futures:
+                por_pk.update(future.result())
+            resultados_componentes = [por_pk[item.pk] for item in items]
+        elif estrategia == 'lote':
+            resultados_componentes = self._generar_en_lote(items, params, limite, metricas_lote)
+        else:
+            # Una sola conexión del pool para todo el informe, en lugar de una por componente
+            with conexion_reservada():
+                resultados_componentes = [self._generar_componente_aislado(item, params, limite) for item in items]
 
-        for item_composicion in composicion:
-            componente = item_composicion.componente
-            logger.info(f"Procesando componente (Orden {item_composicion.orden}): '{componente.nombre}'")
+        self.metricas = self._resumir_metricas(estrategia, inicio, resultados_componentes, metricas_lote)
+        observar_informe(self.metricas)
+        logger.info(
+            f"Generación de informe finalizada en {self.metricas['total_ms']:.1f} ms "
+            f"(estrategia '{estrategia}', {len(items)} componentes)."
+        )
+        return resultados_componentes
+
+    def generar_barrido(self, params: dict, provincias=None) -> dict:
+        """
+        Genera el informe para varias provincias a la vez (por ejemplo, para regenerar
+        los 24 informes provinciales después de una carga). Cada componente ejecuta
+        una única consulta agrupada por provincia (ver `ejecutar_consulta_por_provincia`)
+        y el resultado de cada provincia pasa por los mismos `_procesar_*`.
 
-            if not componente.plantilla_sql:
+        Args:
+            params: Los parámetros comunes a todas las provincias (por ejemplo, anio).
+            provincias: Las instancias de Provincia a generar. Por defecto, todas.
+
+        Returns:
+            Un diccionario {provincia_id: resultados}, con los resultados de cada
+            provincia en el mismo formato y orden que devuelve `generar`.
+        """
+        provincias = list(provincias if provincias is not None else Provincia.objects.order_by('provincia_id'))
+        params_por_provincia = {
+            provincia.provincia_id: self._con_contexto({**params, 'provincia_id': provincia.provincia_id})
+            for provincia in provincias
+        }
+        logger.info(f"Iniciando barrido del informe '{self.informe.nombre}' para {len(provincias)} provincias: {params}")
+        inicio = time.perf_counter()
+
+        composicion = self.informe.informecomposicion_set.select_related('componente').order_by('orden')
+        items = [item for item in composicion if item.componente.plantilla_sql]
+        self._plantillas = self._navegar(items)
+        resultados = {provincia_id: [] for provincia_id in params_por_provincia}
+
+        for item_composicion in items:
+            componente = item_composicion.componente
+            try:
+                config = self._config_componente(item_composicion)
+                claves = {pid: clave_resultado(item_composicion, config, p) for pid, p in params_por_provincia.items()}
+                cacheados = {pid: obtener_resultado(clave) if self.leer_cache else NO_ENCONTRADO
+                             for pid, clave in claves.items()}
+                faltantes = [provincia for provincia in provincias if cacheados[provincia.provincia_id] is NO_ENCONTRADO]
+                # Los componentes con "streaming" leen cada provincia con su cursor, sin agruparlas
+                if faltantes and not config.get('streaming'):
+                    dataframes = ejecutar_consulta_por_provincia(self._plantilla(componente), params, faltantes)
+                else:
+                    dataframes = {}
+            except Exception as e:
+                for provincia_id in resultados:
+                    resultados[provincia_id].append(self._resultado_fallido(item_composicion, params_por_provincia[provincia_id], e))
                 continue
 
-            df_datos = ejecutar_consulta_parametrizada(plantilla_sql=componente.plantilla_sql, params=params)
-            config = componente.config_visualizacion.copy()
-            if item_composicion.config_override:
-                config.update(item_composicion.config_override)
-
-            resultado_final = None
-            tipo = componente.tipo_componente
-            subtipo = componente.tipo_grafico
-
-            if tipo == "KPI":
-                resultado_final = self._procesar_kpi(df_datos, config)
-            elif tipo == "TABLA":
-                resultado_final = self._procesar_tabla(df_datos, config, params)
-            elif tipo == "GRAFICO":
-                resultado_final = self._procesar_grafico(df_datos, config, params, subtipo)
-
-            nombre_template = env.from_string(componente.nombre)
-            nombre_renderizado = nombre_template.render(params)
-
-            resultados_componentes.append({
-                'nombre': nombre_renderizado,
-                'orden': item_composicion.orden,
-                'tipo': tipo,
-                'subtipo': subtipo,
-                'resultado': resultado_final
-            })
+            for provincia_id, params_provincia in params_por_provincia.items():
+                try:
+                    resultado_final = cacheados[provincia_id]
+                    if resultado_final is NO_ENCONTRADO:
+                        metricas = {}
+                        if config.get('streaming'):
+                            df_datos = self._obtener_datos(componente, config, params_provincia, metricas=metricas)
+                        else:
+                            df_datos = dataframes[provincia_id]
+                            if config.get('categorias') and not consulta_fallida(df_datos):
+                                # Cada provincia se convierte por separado, como al generarla sola
+                                df_datos = convertir_categorias(df_datos.copy())
+                        resultado_final = self._procesar_datos(df_datos, componente, config, params_provincia)
+                        guardar_resultado(
+                            claves[provincia_id], resultado_final, consulta_fallida(df_datos) or 'error' in metricas
+                        )
+                    resultados[provincia_id].append(self._armar_resultado(item_composicion, params_provincia, resultado_final))
+                except Exception as e:
+                    resultados[provincia_id].append(self._resultado_fallido(item_composicion, params_provincia, e))
+
+        logger.info(
+            f"Barrido finalizado en {(time.perf_counter() - inicio) * 1000:.1f} ms "
+            f"({len(items)} componentes, {len(provincias)} provincias)."
+        )
+        return resultados
+
+    async def agenerar(self, params: dict):
+        """
+        Versión asíncrona de `generar`. Lanza todas las consultas de los componentes a
+        la vez con asyncio.gather sobre asyncpg; la concurrencia real queda acotada por
+        el tamaño del pool de conexiones.
+
+        Args:
+            params: Los parámetros del informe (provincia_id, anio, etc.).
+
+        Returns:
+            La lista de resultados de los componentes, ordenada por InformeComposicion.orden.
+        """
+        params = await sync_to_async(self._con_contexto)(params)
+        logger.info(f"Iniciando generación asíncrona de informe '{self.informe.nombre}' con parámetros: {params}")
+        inicio = time.perf_counter()
+        self.tiempos_componentes = {}
+        self.metricas_componentes = {}
+        limite = self._limite_informe(inicio)
+        composicion = self.informe.informecomposicion_set.select_related('componente').order_by('orden')
+        items = [item async for item in composicion if item.componente.plantilla_sql]
+        self._plantillas = await sync_to_async(self._navegar)(items)
+        self._kpis_compartidos = self._agrupar_kpis_por_fila(items)
+        self._filas_compartidas = {}
+
+        # gather devuelve los resultados en el mismo orden en que recibe las corrutinas.
+        # Los motores de asyncpg se cierran al terminar, porque el loop puede no volver a usarse
+        async with engines_async():
+            resultados_componentes = await asyncio.gather(
+                *(self._agenerar_componente_aislado(item, params, limite) for item in items)
+            )
 
-        logger.info("Generación de informe finalizada.")
+        resultados_componentes = list(resultados_componentes)
+        self.metricas = self._resumir_metricas('async', inicio, resultados_componentes)
+        observar_informe(self.metricas)
+        logger.info(f"Generación asíncrona de informe finalizada en {self.metricas['total_ms']:.1f} ms.")
         return resultados_componentes
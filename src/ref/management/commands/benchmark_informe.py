@@ -0,0 +1,75 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ref.generador import ESTRATEGIAS, GeneradorInforme
+from ref.models import Informe
+from datos_fuente.models import Provincia
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de generación de un informe con cada estrategia de ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--informe', default='Panorama Provincial', help='ID o nombre del informe')
+        parser.add_argument('--provincia', type=int, default=7, help='provincia_id a usar')
+        parser.add_argument('--anio', type=int, default=2023)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument(
+            '--estrategias', nargs='+', default=list(ESTRATEGIAS), choices=ESTRATEGIAS,
+            help='Estrategias a comparar'
+        )
+
+    def handle(self, *args, **options):
+        informe = self._obtener_informe(options['informe'])
+        try:
+            provincia = Provincia.objects.get(pk=options['provincia'])
+        except Provincia.DoesNotExist:
+            raise CommandError(f"La provincia con ID {options['provincia']} no existe.")
+
+        params = {
+            'provincia_id': provincia.provincia_id,
+            'provincia_nombre': provincia.nombre,
+            'anio': options['anio'],
+        }
+        # Sin leer del cache de resultados, para medir la ejecución real de los componentes
+        generador = GeneradorInforme(informe_id=informe.id, leer_cache=False)
+
+        # Una ejecución de calentamiento por estrategia, para abrir las conexiones del pool
+        # y compilar las plantillas antes de medir
+        for estrategia in options['estrategias']:
+            generador.generar(params=params, estrategia=estrategia)
+
+        tiempos = {}
+        for estrategia in options['estrategias']:
+            tiempos[estrategia] = []
+            for _ in range(options['repeticiones']):
+                inicio = time.perf_counter()
+                generador.generar(params=params, estrategia=estrategia)
+                tiempos[estrategia].append(time.perf_counter() - inicio)
+
+        self.stdout.write(f"Informe '{informe.nombre}' - {provincia.nombre} ({options['anio']}), "
+                          f"{options['repeticiones']} repeticiones")
+        self.stdout.write(f"{'Estrategia':<12} {'mínimo':>10} {'mediana':>10} {'máximo':>10}")
+        for estrategia, muestras in tiempos.items():
+            self.stdout.write(
+                f"{estrategia:<12} {min(muestras) * 1000:>8.1f}ms {statistics.median(muestras) * 1000:>8.1f}ms "
+                f"{max(muestras) * 1000:>8.1f}ms"
+            )
+
+        if 'secuencial' in tiempos and len(tiempos) > 1:
+            base = statistics.median(tiempos['secuencial'])
+            for estrategia, muestras in tiempos.items():
+                if estrategia != 'secuencial':
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Aceleración de '{estrategia}' respecto de 'secuencial': {base / statistics.median(muestras):.2f}x"
+                    ))
+
+    def _obtener_informe(self, valor):
+        try:
+            if str(valor).isdigit():
+                return Informe.objects.get(pk=int(valor))
+            return Informe.objects.get(nombre=valor)
+        except Informe.DoesNotExist:
+            raise CommandError(f"El informe '{valor}' no existe.")
@@ -0,0 +1,174 @@
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ref.generador import ESTRATEGIAS, GeneradorInforme
+from ref.models import Componente, Informe
+from datos_fuente.data_handler import reiniciar_engines
+from datos_fuente.models import Provincia
+
+# Valores por defecto, sobrescribibles desde settings.INFORMES_PREGENERACION
+PREGENERACION_POR_DEFECTO = {
+    'INFORMES': None,
+    'ANIOS': '2019-2024',
+    'WORKERS': 4,
+}
+
+
+def _config_pregeneracion() -> dict:
+    return {**PREGENERACION_POR_DEFECTO, **getattr(settings, 'INFORMES_PREGENERACION', {})}
+
+
+def _inicializar_worker():
+    """
+    Prepara cada proceso del pool: las conexiones de Django y el pool de SQLAlchemy
+    heredados del padre no pueden compartirse entre procesos.
+    """
+    django.setup()
+    connections.close_all()
+    reiniciar_engines()
+
+
+def _generar_tarea(informe_id: int, params: dict, estrategia: str) -> dict:
+    """
+    Genera un informe dentro de un proceso del pool. Los resultados quedan en el cache
+    de resultados; al padre solo se devuelven los tiempos.
+    """
+    inicio = time.perf_counter()
+    try:
+        generador = GeneradorInforme(informe_id=informe_id, leer_cache=False)
+        generador.generar(params=params, estrategia=estrategia)
+        return {
+            'segundos': time.perf_counter() - inicio,
+            'componentes': generador.tiempos_componentes,
+            'error': None,
+        }
+    except Exception as e:
+        return {'segundos': time.perf_counter() - inicio, 'componentes': {}, 'error': str(e)}
+
+
+def _parsear_anios(valor: str) -> list:
+    """ Acepta un rango (2019-2024), una lista separada por comas (2019,2021) o una combinación. """
+    anios = set()
+    try:
+        for parte in str(valor).split(','):
+            if '-' in parte:
+                desde, hasta = (int(x) for x in parte.split('-', 1))
+                anios.update(range(desde, hasta + 1))
+            elif parte.strip():
+                anios.add(int(parte))
+    except ValueError:
+        raise CommandError(f"Años inválidos: '{valor}'. Use un rango (2019-2024) o una lista (2019,2021).")
+    return sorted(anios)
+
+
+class Command(BaseCommand):
+    help = 'Pre-genera informes para todas las combinaciones de provincia y año, dejando los resultados en el cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--informe', nargs='+', help='IDs o nombres de los informes (por defecto, todos)')
+        parser.add_argument('--provincias', nargs='+', default=['all'], help="'all' o una lista de provincia_id")
+        parser.add_argument('--anios', help='Rango (2019-2024) o lista (2019,2021) de años')
+        parser.add_argument('--workers', type=int, help='Cantidad de procesos')
+        parser.add_argument(
+            '--estrategia', default='secuencial', choices=ESTRATEGIAS,
+            help='Estrategia de ejecución dentro de cada proceso (el paralelismo ya lo dan los procesos)'
+        )
+
+    def handle(self, *args, **options):
+        config = _config_pregeneracion()
+        informes = self._obtener_informes(options['informe'] or config['INFORMES'])
+        provincias = self._obtener_provincias(options['provincias'])
+        anios = _parsear_anios(options['anios'] or config['ANIOS'])
+        workers = options['workers'] or config['WORKERS']
+
+        tareas = [
+            (informe, {'provincia_id': provincia.provincia_id, 'provincia_nombre': provincia.nombre, 'anio': anio})
+            for informe in informes for provincia in provincias for anio in anios
+        ]
+        self.stdout.write(
+            f"Generando {len(tareas)} informes ({len(informes)} informes x {len(provincias)} provincias x "
+            f"{len(anios)} años) con {workers} procesos..."
+        )
+
+        # Los procesos hijos no deben heredar conexiones abiertas del padre
+        connections.close_all()
+        reiniciar_engines()
+
+        inicio = time.perf_counter()
+        tiempos_componentes = {}
+        nombres = dict(Componente.objects.values_list('pk', 'nombre'))
+        errores = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool:
+            futures = {
+                pool.submit(_generar_tarea, informe.id, params, options['estrategia']): (informe, params)
+                for informe, params in tareas
+            }
+            for future in as_completed(futures):
+                informe, params = futures[future]
+                resultado = future.result()
+                descripcion = f"'{informe.nombre}' - {params['provincia_nombre']} ({params['anio']})"
+                if resultado['error']:
+                    errores += 1
+                    self.stdout.write(self.style.ERROR(f"{descripcion}: error: {resultado['error']}"))
+                    continue
+
+                self.stdout.write(f"{descripcion}: {resultado['segundos'] * 1000:.1f} ms")
+                for pk, segundos in resultado['componentes'].items():
+                    tiempos_componentes.setdefault(pk, []).append(segundos)
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f"    {pk} {nombres.get(pk, '')}: {segundos * 1000:.1f} ms")
+
+        total = time.perf_counter() - inicio
+        self._mostrar_componentes(tiempos_componentes, nombres)
+        generados = len(tareas) - errores
+        self.stdout.write(self.style.SUCCESS(
+            f"{generados} informes generados en {total:.1f} s ({generados / total if total else 0:.2f} informes/s)."
+        ))
+        if errores:
+            self.stdout.write(self.style.ERROR(f"{errores} informes fallaron."))
+
+    def _mostrar_componentes(self, tiempos_componentes: dict, nombres: dict):
+        if not tiempos_componentes:
+            return
+        self.stdout.write(f"\n{'Componente':<60} {'n':>5} {'media':>10} {'máximo':>10} {'total':>10}")
+        # Los componentes que más tiempo acumulan primero
+        for pk, muestras in sorted(tiempos_componentes.items(), key=lambda kv: -sum(kv[1])):
+            nombre = f"{pk} {nombres.get(pk, '')}"
+            self.stdout.write(
+                f"{nombre[:60]:<60} {len(muestras):>5} {statistics.mean(muestras) * 1000:>8.1f}ms "
+                f"{max(muestras) * 1000:>8.1f}ms {sum(muestras):>9.2f}s"
+            )
+        self.stdout.write("")
+
+    def _obtener_informes(self, valores) -> list:
+        if not valores:
+            return list(Informe.objects.order_by('id'))
+        informes = []
+        for valor in valores:
+            try:
+                if str(valor).isdigit():
+                    informes.append(Informe.objects.get(pk=int(valor)))
+                else:
+                    informes.append(Informe.objects.get(nombre=valor))
+            except Informe.DoesNotExist:
+                raise CommandError(f"El informe '{valor}' no existe.")
+        return informes
+
+    def _obtener_provincias(self, valores) -> list:
+        if valores == ['all']:
+            return list(Provincia.objects.order_by('provincia_id'))
+        try:
+            ids = [int(valor) for valor in valores]
+        except ValueError:
+            raise CommandError("Las provincias deben ser 'all' o una lista de provincia_id.")
+        provincias = list(Provincia.objects.filter(provincia_id__in=ids).order_by('provincia_id'))
+        faltantes = set(ids) - {provincia.provincia_id for provincia in provincias}
+        if faltantes:
+            raise CommandError(f"Las provincias {sorted(faltantes)} no existen.")
+        return provincias
@@ -0,0 +1,162 @@
+import json
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from sqlalchemy import text
+
+from ref.models import Informe
+from datos_fuente.contexto import contexto_provincia
+from datos_fuente.data_handler import explicar_consulta, obtener_engine
+from datos_fuente.models import Provincia
+from datos_fuente.navegador_agregados import navegar_agregados
+
+
+def _recorrer_nodos(nodo: dict):
+    """ Recorre un nodo del plan y todos sus hijos. """
+    yield nodo
+    for hijo in nodo.get('Plans', []):
+        yield from _recorrer_nodos(hijo)
+
+
+def _resumir_plan(plan: dict, filas_por_tabla: dict, umbral_filas: int) -> dict:
+    """
+    Extrae del plan de EXPLAIN lo necesario para comparar componentes. Los contadores
+    de buffers del nodo raíz ya incluyen los de sus hijos.
+    """
+    raiz = plan['Plan']
+    seq_scans = sorted({
+        nodo['Relation Name'] for nodo in _recorrer_nodos(raiz)
+        if nodo.get('Node Type') == 'Seq Scan' and filas_por_tabla.get(nodo.get('Relation Name'), 0) >= umbral_filas
+    })
+    return {
+        'ejecucion_ms': plan['Execution Time'],
+        'planificacion_ms': plan['Planning Time'],
+        'filas': raiz.get('Actual Rows', 0),
+        'seq_scans': seq_scans,
+        'buffers_hit': raiz.get('Shared Hit Blocks', 0),
+        'buffers_read': raiz.get('Shared Read Blocks', 0),
+        'temp': raiz.get('Temp Read Blocks', 0) + raiz.get('Temp Written Blocks', 0),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN ANALYZE sobre cada componente de un informe y los ordena por tiempo de ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--informe', default='Panorama Provincial', help='ID o nombre del informe')
+        parser.add_argument('--provincia', default='7', help="provincia_id a usar, o 'all' para todas")
+        parser.add_argument('--anio', type=int, default=2023)
+        parser.add_argument(
+            '--umbral-filas', type=int, default=10000,
+            help='Filas estimadas a partir de las cuales un Seq Scan se considera sobre una tabla grande'
+        )
+        parser.add_argument('--top', type=int, help='Mostrar solo los N componentes más lentos')
+        parser.add_argument('--json', dest='salida_json', help='Archivo donde guardar los planes completos')
+
+    def handle(self, *args, **options):
+        informe = self._obtener_informe(options['informe'])
+        provincias = self._obtener_provincias(options['provincia'])
+        filas_por_tabla = self._filas_por_tabla()
+
+        composicion = informe.informecomposicion_set.select_related('componente').order_by('orden')
+        items = [item for item in composicion if item.componente.plantilla_sql]
+        self.stdout.write(
+            f"Perfilando {len(items)} componentes de '{informe.nombre}' para {len(provincias)} provincia(s), "
+            f"año {options['anio']}..."
+        )
+
+        perfiles = []
+        planes = {}
+        for item_composicion in items:
+            componente = item_composicion.componente
+            resumenes = []
+            errores = []
+            for provincia in provincias:
+                params = {
+                    'provincia_id': provincia.provincia_id, **contexto_provincia(provincia.provincia_id), 'anio': options['anio']
+                }
+                try:
+                    plan = explicar_consulta(
+                        navegar_agregados(componente.plantilla_sql, componente.agregado), params
+                    )
+                except Exception as e:
+                    errores.append(f"{provincia.nombre}: {e}")
+                    continue
+                resumenes.append(_resumir_plan(plan, filas_por_tabla, options['umbral_filas']))
+                planes.setdefault(f"{item_composicion.orden}. {componente.nombre}", {})[provincia.provincia_id] = plan
+            perfiles.append(self._agregar(item_composicion, resumenes, errores))
+
+        perfiles.sort(key=lambda perfil: perfil['ejecucion_ms'], reverse=True)
+        self._mostrar(perfiles[:options['top']] if options['top'] else perfiles, len(provincias))
+        total = sum(perfil['ejecucion_ms'] for perfil in perfiles)
+        self.stdout.write(self.style.SUCCESS(f"Tiempo de ejecución total en el servidor: {total:.1f} ms por informe."))
+
+        if options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump(planes, archivo, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Planes completos guardados en {options['salida_json']}")
+
+    def _agregar(self, item_composicion, resumenes: list, errores: list) -> dict:
+        """ Combina los resúmenes de todas las provincias de un componente. """
+        perfil = {
+            'orden': item_composicion.orden,
+            'nombre': item_composicion.componente.nombre,
+            'errores': errores,
+            'ejecucion_ms': 0.0,
+            'ejecucion_max_ms': 0.0,
+            'filas': 0,
+            'seq_scans': [],
+            'buffers_hit': 0,
+            'buffers_read': 0,
+            'temp': 0,
+        }
+        if resumenes:
+            perfil.update({
+                'ejecucion_ms': statistics.mean(r['ejecucion_ms'] for r in resumenes),
+                'ejecucion_max_ms': max(r['ejecucion_ms'] for r in resumenes),
+                'filas': round(statistics.mean(r['filas'] for r in resumenes)),
+                'seq_scans': sorted(set().union(*(r['seq_scans'] for r in resumenes))),
+                'buffers_hit': round(statistics.mean(r['buffers_hit'] for r in resumenes)),
+                'buffers_read': round(statistics.mean(r['buffers_read'] for r in resumenes)),
+                'temp': round(statistics.mean(r['temp'] for r in resumenes)),
+            })
+        return perfil
+
+    def _mostrar(self, perfiles: list, cantidad_provincias: int):
+        if cantidad_provincias > 1:
+            self.stdout.write(f"Tiempos y buffers promedio sobre {cantidad_provincias} provincias.")
+        self.stdout.write(
+            f"{'#':>5} {'Componente':<55} {'ejec.':>9} {'máx.':>9} {'filas':>7} {'hit':>7} {'read':>7} {'temp':>6}  Seq Scan"
+        )
+        for perfil in perfiles:
+            self.stdout.write(
+                f"{perfil['orden']:>5} {perfil['nombre'][:55]:<55} {perfil['ejecucion_ms']:>7.1f}ms "
+                f"{perfil['ejecucion_max_ms']:>7.1f}ms {perfil['filas']:>7} {perfil['buffers_hit']:>7} "
+                f"{perfil['buffers_read']:>7} {perfil['temp']:>6}  {', '.join(perfil['seq_scans'])}"
+            )
+            for error in perfil['errores']:
+                self.stdout.write(self.style.ERROR(f"      error: {error.splitlines()[0]}"))
+
+    def _filas_por_tabla(self) -> dict:
+        """ Filas estimadas de cada tabla según las estadísticas de PostgreSQL. """
+        with obtener_engine().connect() as connection:
+            filas = connection.execute(text(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p', 'm')"
+            )).all()
+        return {nombre: cantidad for nombre, cantidad in filas}
+
+    def _obtener_informe(self, valor):
+        try:
+            if str(valor).isdigit():
+                return Informe.objects.get(pk=int(valor))
+            return Informe.objects.get(nombre=valor)
+        except Informe.DoesNotExist:
+            raise CommandError(f"El informe '{valor}' no existe.")
+
+    def _obtener_provincias(self, valor) -> list:
+        if valor == 'all':
+            return list(Provincia.objects.order_by('provincia_id'))
+        try:
+            return [Provincia.objects.get(pk=int(valor))]
+        except (ValueError, Provincia.DoesNotExist):
+            raise CommandError(f"La provincia '{valor}' no existe.")
@@ -0,0 +1,63 @@
+"""
+Métricas de Prometheus de la generación de informes y el endpoint que las exporta.
+
+Las métricas de la capa de datos (pool, caches, errores) están en datos_fuente.metricas.
+"""
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+DURACION_INFORME = Histogram(
+    'informes_generacion_segundos',
+    'Tiempo de generación de un informe, sin el render del HTML',
+    ['informe', 'estrategia'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+
+# Los componentes se identifican por id: los nombres son plantillas de Jinja
+DURACION_CONSULTA = Histogram(
+    'informes_componente_consulta_segundos',
+    'Tiempo de ejecución y lectura de la consulta de un componente',
+    ['componente'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+FILAS_COMPONENTE = Histogram(
+    'informes_componente_filas',
+    'Filas devueltas por la consulta de un componente',
+    ['componente'],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+)
+
+
+def observar_componente(componente, metricas: dict):
+    """ Registra la consulta de un componente; los resultados leídos del cache no cuentan. """
+    if metricas.get('cache'):
+        return
+    segundos = (metricas.get('sql_ms', 0.0) + metricas.get('fetch_ms', 0.0)) / 1000
+    DURACION_CONSULTA.labels(componente=str(componente.id)).observe(segundos)
+    FILAS_COMPONENTE.labels(componente=str(componente.id)).observe(metricas.get('filas', 0))
+
+
+def observar_informe(metricas: dict):
+    """ Registra la duración de un informe a partir del resumen de `GeneradorInforme.metricas`. """
+    DURACION_INFORME.labels(informe=metricas['informe'], estrategia=metricas['estrategia']).observe(
+        metricas['total_ms'] / 1000
+    )
+
+
+def exportar() -> tuple:
+    """
+    Arma el texto de todas las métricas en el formato de Prometheus. Si está definido
+    PROMETHEUS_MULTIPROC_DIR se suman los archivos de todos los procesos; si no, se
+    exportan solo las del proceso actual.
+
+    Returns:
+        Una tupla (contenido, content_type).
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
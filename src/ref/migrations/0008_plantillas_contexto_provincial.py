@@ -0,0 +1,55 @@
+import re
+
+from django.db import migrations
+
+# Subconsultas correlacionadas a ref_provincia que se repiten en las plantillas y el
+# parámetro del contexto provincial (datos_fuente.contexto) que las reemplaza
+_SUBCONSULTA = re.compile(
+    r"\(\s*SELECT\s+(provincia|region_cofecyt)\s+FROM\s+ref_provincia\s+"
+    r"WHERE\s+provincia_id\s*=\s*\{\{\s*provincia_id\s*\}\}\s*\)",
+    re.IGNORECASE,
+)
+_PARAMETROS = {'provincia': 'provincia_nombre', 'region_cofecyt': 'region_cofecyt'}
+_PARAMETRO = re.compile(r"\{\{\s*(provincia_nombre|region_cofecyt)\s*\}\}")
+
+
+def usar_contexto_provincial(apps, schema_editor):
+    """
+    Reemplaza las subconsultas a ref_provincia por los parámetros del contexto
+    provincial, para que los filtros sean igualdades simples contra un valor ligado.
+    Se incrementa la versión de cada componente modificado para invalidar su cache.
+    """
+    Componente = apps.get_model('ref', 'Componente')
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        plantilla = _SUBCONSULTA.sub(
+            lambda m: "{{ " + _PARAMETROS[m.group(1).lower()] + " }}", componente.plantilla_sql
+        )
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def restaurar_subconsultas(apps, schema_editor):
+    Componente = apps.get_model('ref', 'Componente')
+    columnas = {parametro: columna for columna, parametro in _PARAMETROS.items()}
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        plantilla = _PARAMETRO.sub(
+            lambda m: f"(SELECT {columnas[m.group(1)]} FROM ref_provincia WHERE provincia_id = {{{{ provincia_id }}}})",
+            componente.plantilla_sql
+        )
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0007_corregir_plantillas_sql_3'),
+    ]
+
+    operations = [
+        migrations.RunPython(usar_contexto_provincial, restaurar_subconsultas),
+    ]
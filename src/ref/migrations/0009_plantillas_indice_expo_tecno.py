@@ -0,0 +1,39 @@
+import re
+
+from django.db import migrations
+
+# ILIKE no puede usar un índice btree; la igualdad sobre lower(cod_prov) sí usa
+# expo_tecno_provincia_anio_idx. Los nombres de provincia no tienen comodines (% o _),
+# así que ambas formas seleccionan las mismas filas.
+_ILIKE = re.compile(r"cod_prov\s+ILIKE\s+\{\{\s*provincia_nombre\s*\}\}", re.IGNORECASE)
+_IGUALDAD = re.compile(r"lower\(cod_prov\)\s*=\s*lower\(\{\{\s*provincia_nombre\s*\}\}\)")
+
+
+def _reemplazar(apps, patron, reemplazo):
+    Componente = apps.get_model('ref', 'Componente')
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        plantilla = patron.sub(reemplazo, componente.plantilla_sql)
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def usar_indice_expo_tecno(apps, schema_editor):
+    _reemplazar(apps, _ILIKE, "lower(cod_prov) = lower({{ provincia_nombre }})")
+
+
+def restaurar_ilike(apps, schema_editor):
+    _reemplazar(apps, _IGUALDAD, "cod_prov ILIKE {{ provincia_nombre }}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0008_plantillas_contexto_provincial'),
+        ('datos_fuente', '0018_indices_predicados_informes'),
+    ]
+
+    operations = [
+        migrations.RunPython(usar_indice_expo_tecno, restaurar_ilike),
+    ]
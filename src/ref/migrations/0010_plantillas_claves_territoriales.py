@@ -0,0 +1,98 @@
+import re
+
+from django.db import migrations
+
+# Los filtros por nombre de territorio de cada tabla, como están en las plantillas, y el
+# filtro por clave entera que los reemplaza (ver datos_fuente.territorios). Las tablas
+# que no figuran usan unidad_territorial.
+_POR_CLAVE = {
+    'provincia': "provincia_id = {{ provincia_id }}",
+    'region': "region_id = {{ region_id }}",
+}
+_FILTROS_UNIDAD_TERRITORIAL = {
+    'provincia': "unidad_territorial = {{ provincia_nombre }}",
+    'region': "unidad_territorial = {{ region_cofecyt }}",
+}
+_FILTROS = {
+    'proyectos_pfi': {
+        'provincia': "provincia ILIKE {{ provincia_nombre }}",
+        'region': "region_cofecyt ILIKE {{ region_cofecyt }}",
+    },
+    'expo_tecno_destino': {'provincia': "lower(cod_prov) = lower({{ provincia_nombre }})"},
+    'patentes_desagregadas_ipc_provincia_region_pais': {'provincia': "provincia = {{ provincia_nombre }}"},
+    'expo_por_provincia_top5': {'provincia': "provincia = {{ provincia_nombre }}"},
+    'listado_unidades_de_id': {'provincia': "provincia = {{ provincia_nombre }}"},
+    # Las filas de provincia tienen la región a la que pertenecen
+    'inversion_y_articulos_por_investigador_provincia_region_pais': {
+        'region': "unidad_territorial IN ( SELECT provincia FROM ref_provincia WHERE region_cofecyt = {{ region_cofecyt }} )",
+    },
+}
+
+# Listas de territorios: una fila de región se distingue de sus provincias por nivel_agregacion
+_LISTAS = [
+    (
+        "unidad_territorial IN ( {{ provincia_nombre }}, {{ region_cofecyt }}, 'Total País' )",
+        "(provincia_id = {{ provincia_id }} OR (nivel_agregacion = 'Región' AND region_id = {{ region_id }})"
+        " OR nivel_agregacion = 'País')",
+    ),
+    (
+        "unidad_territorial IN ( {{ provincia_nombre }}, {{ region_cofecyt }} )",
+        "(provincia_id = {{ provincia_id }} OR (nivel_agregacion = 'Región' AND region_id = {{ region_id }}))",
+    ),
+]
+
+_TABLA = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+
+
+def _patron(texto: str) -> re.Pattern:
+    """ El texto literal, tolerando cualquier espaciado alrededor de cada token. """
+    return re.compile(r"(?<!\w)" + re.escape(texto).replace(r'\ ', r'\s*'), re.IGNORECASE)
+
+
+def _reemplazos(plantilla_sql: str) -> list:
+    """ Pares (texto por nombre, texto por clave) que aplican a la tabla de la plantilla. """
+    tabla = _TABLA.search(plantilla_sql)
+    filtros = _FILTROS.get(tabla.group(1).lower(), _FILTROS_UNIDAD_TERRITORIAL) if tabla else {}
+    return _LISTAS + [(texto, _POR_CLAVE[clave]) for clave, texto in filtros.items()]
+
+
+def _actualizar(apps, convertir):
+    Componente = apps.get_model('ref', 'Componente')
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        plantilla = convertir(componente.plantilla_sql)
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def filtrar_por_claves(apps, schema_editor):
+    """
+    Reemplaza los filtros por nombre de provincia o región (igualdades de texto, ILIKE y
+    listas IN) por igualdades sobre provincia_id y region_id, que están indexadas.
+    """
+    def convertir(plantilla_sql):
+        for por_nombre, por_clave in _reemplazos(plantilla_sql):
+            plantilla_sql = _patron(por_nombre).sub(lambda m: por_clave, plantilla_sql)
+        return plantilla_sql
+    _actualizar(apps, convertir)
+
+
+def filtrar_por_nombres(apps, schema_editor):
+    def convertir(plantilla_sql):
+        for por_nombre, por_clave in _reemplazos(plantilla_sql):
+            plantilla_sql = _patron(por_clave).sub(lambda m: por_nombre, plantilla_sql)
+        return plantilla_sql
+    _actualizar(apps, convertir)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0009_plantillas_indice_expo_tecno'),
+        ('datos_fuente', '0019_claves_territoriales'),
+    ]
+
+    operations = [
+        migrations.RunPython(filtrar_por_claves, filtrar_por_nombres),
+    ]
@@ -0,0 +1,112 @@
+from django.db import migrations
+
+_RRHH = 'rrhh_sicytar_agregado_provincia_region_pais'
+
+# Plantillas que pasan a leer las vistas materializadas de datos_fuente.vistas_materializadas:
+# (consulta sobre la tabla de hechos, consulta equivalente sobre la vista). Se comparan con
+# los espacios normalizados, así que una plantilla modificada a mano no se toca.
+_REEMPLAZOS = [
+    (
+        "SELECT COUNT(DISTINCT lens_id) FROM patentes_desagregadas_ipc_provincia_region_pais "
+        "WHERE anio BETWEEN 2014 AND {{ anio }};",
+        "SELECT COALESCE(SUM(cantidad), 0) AS count\n"
+        "FROM mv_patentes_anio\n"
+        "WHERE anio BETWEEN 2014 AND {{ anio }};",
+    ),
+    (
+        "SELECT COUNT(DISTINCT lens_id) FROM patentes_desagregadas_ipc_provincia_region_pais "
+        "WHERE anio BETWEEN 2014 AND {{ anio }} AND provincia != 'NA';",
+        "SELECT COALESCE(SUM(cantidad_con_provincia), 0) AS count\n"
+        "FROM mv_patentes_anio\n"
+        "WHERE anio BETWEEN 2014 AND {{ anio }};",
+    ),
+    (
+        "SELECT COUNT(DISTINCT lens_id) FROM patentes_desagregadas_ipc_provincia_region_pais "
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE;",
+        "SELECT COALESCE(SUM(cantidad), 0) AS count\n"
+        "FROM mv_patentes_provincia_anio\n"
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE;",
+    ),
+    (
+        "SELECT anio, COUNT(DISTINCT lens_id) as cantidad FROM patentes_desagregadas_ipc_provincia_region_pais "
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE "
+        "GROUP BY anio ORDER BY anio;",
+        "SELECT anio, cantidad\n"
+        "FROM mv_patentes_provincia_anio\n"
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE\n"
+        "ORDER BY anio;",
+    ),
+    (
+        "SELECT institucion, letra_ipc_descripcion, COUNT(DISTINCT lens_id) as cantidad "
+        "FROM patentes_desagregadas_ipc_provincia_region_pais WHERE provincia_id = {{ provincia_id }} "
+        "AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE AND institucion != 'NA' "
+        "GROUP BY institucion, letra_ipc_descripcion;",
+        "SELECT institucion, letra_ipc_descripcion, SUM(cantidad) as cantidad\n"
+        "FROM mv_patentes_provincia_institucion\n"
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE\n"
+        "AND institucion != 'NA'\n"
+        "GROUP BY institucion, letra_ipc_descripcion;",
+    ),
+] + [
+    # mv_rrhh_sicytar tiene las mismas columnas que usan estas consultas
+    (consulta.format(tabla=_RRHH), consulta.format(tabla='mv_rrhh_sicytar'))
+    for consulta in [
+        "WITH total_general AS ( SELECT SUM(cant_personas) as total FROM {tabla} "
+        "WHERE tipo_personal_sicytar = 'INVESTIGADOR' AND nivel_agregacion = 'Provincia' "
+        "AND provincia_id = {{{{ provincia_id }}}} AND anio = {{{{ anio }}}} ) "
+        "SELECT gran_area_experticia, (SUM(cant_personas) * 100.0 / (SELECT total FROM total_general)) as porcentaje "
+        "FROM {tabla} WHERE tipo_personal_sicytar = 'INVESTIGADOR' AND nivel_agregacion = 'Provincia' "
+        "AND provincia_id = {{{{ provincia_id }}}} AND anio = {{{{ anio }}}} AND gran_area_experticia IS NOT NULL "
+        "GROUP BY gran_area_experticia ORDER BY porcentaje DESC;",
+        "SELECT ( SELECT SUM(cant_personas) FROM {tabla} WHERE tipo_personal_sicytar = 'INVESTIGADOR' "
+        "AND anio = {{{{ anio }}}} AND nivel_agregacion = 'Provincia' AND provincia_id = {{{{ provincia_id }}}} ) "
+        "/ ( SELECT pea_miles_censo_2022 FROM indicadores_contexto_y_sicytar WHERE id = {{{{ provincia_id }}}} );",
+        "SELECT ( SELECT SUM(cant_personas) FROM {tabla} WHERE tipo_personal_sicytar = 'INVESTIGADOR' "
+        "AND anio = {{{{ anio }}}} AND nivel_agregacion = 'Región' AND region_id = {{{{ region_id }}}} ) "
+        "/ ( SELECT pea_miles_censo_2022 FROM indicadores_contexto_y_sicytar WHERE provincia = {{{{ region_cofecyt }}}} );",
+        "SELECT ( SELECT SUM(cant_personas) FROM {tabla} WHERE tipo_personal_sicytar = 'INVESTIGADOR' "
+        "AND anio = {{{{ anio }}}} AND nivel_agregacion = 'País' ) "
+        "/ ( SELECT pea_miles_censo_2022 FROM indicadores_contexto_y_sicytar WHERE id = 99 );",
+        "SELECT tipo_personal_sicytar, SUM(cant_personas) as cantidad FROM {tabla} "
+        "WHERE nivel_agregacion = 'Provincia' AND provincia_id = {{{{ provincia_id }}}} AND anio = {{{{ anio }}}} "
+        "GROUP BY tipo_personal_sicytar;",
+        "SELECT anio, SUM(cant_personas) as cantidad_investigadores FROM {tabla} "
+        "WHERE provincia_id = {{{{ provincia_id }}}} AND tipo_personal_sicytar = 'INVESTIGADOR' "
+        "AND anio BETWEEN 2019 AND {{{{ anio }}}} GROUP BY anio ORDER BY anio;",
+    ]
+]
+
+
+def _normalizar(sql: str) -> str:
+    return ' '.join(sql.split())
+
+
+def _actualizar(apps, pares):
+    Componente = apps.get_model('ref', 'Componente')
+    reemplazos = {_normalizar(actual): nueva for actual, nueva in pares}
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        nueva = reemplazos.get(_normalizar(componente.plantilla_sql))
+        if nueva is not None:
+            componente.plantilla_sql = nueva
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def usar_vistas(apps, schema_editor):
+    _actualizar(apps, _REEMPLAZOS)
+
+
+def usar_tablas(apps, schema_editor):
+    _actualizar(apps, [(nueva, actual) for actual, nueva in _REEMPLAZOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0010_plantillas_claves_territoriales'),
+        ('datos_fuente', '0020_vistas_materializadas'),
+    ]
+
+    operations = [
+        migrations.RunPython(usar_vistas, usar_tablas),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:15
+
+import re
+
+from django.db import migrations, models
+
+_RRHH = 'rrhh_sicytar_agregado_provincia_region_pais'
+_VISTA = 'mv_rrhh_sicytar'
+
+
+def _actualizar(apps, origen, destino):
+    Componente = apps.get_model('ref', 'Componente')
+    patron = re.compile(rf"\b{origen}\b")
+    for componente in Componente.objects.filter(plantilla_sql__contains=origen):
+        plantilla = patron.sub(destino, componente.plantilla_sql)
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def leer_tabla_rrhh(apps, schema_editor):
+    """
+    Las plantillas de RRHH vuelven a nombrar la tabla de hechos: el navegador de
+    agregados elige para cada una la vista más chica que la responde.
+    """
+    _actualizar(apps, _VISTA, _RRHH)
+
+
+def leer_vista_rrhh(apps, schema_editor):
+    _actualizar(apps, _RRHH, _VISTA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0011_plantillas_vistas_materializadas'),
+        ('datos_fuente', '0021_vistas_agregados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='componente',
+            name='agregado',
+            field=models.CharField(
+                blank=True,
+                help_text=(
+                    'Vista de agregados desde la que se lee la consulta (ver datos_fuente.vistas_materializadas). '
+                    "Vacío: se elige la más chica que la responda; 'ninguno': se lee la tabla de hechos."
+                ),
+                max_length=100,
+            ),
+        ),
+        migrations.RunPython(leer_tabla_rrhh, leer_vista_rrhh),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations
+
+_TERRITORIO = (
+    "AND EXISTS (\n"
+    "    SELECT 1 FROM puente_patente_institucion_ipc b\n"
+    "    WHERE b.patente_id = p.id AND b.provincia_id = {{ provincia_id }} AND b.es_institucion_nacional = FALSE\n"
+    ")"
+)
+
+# Plantillas provinciales de patentes que pasan de las vistas materializadas a la dimensión
+# de patentes y su tabla puente (ver datos_fuente.patentes): (consulta sobre la vista,
+# consulta equivalente que cuenta filas). Se comparan con los espacios normalizados. Los
+# totales del país siguen en mv_patentes_anio, que ahora se arma desde la dimensión.
+_REEMPLAZOS = [
+    (
+        "SELECT COALESCE(SUM(cantidad), 0) AS count FROM mv_patentes_provincia_anio "
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE;",
+        "SELECT COUNT(*)\n"
+        "FROM dim_patente p\n"
+        "WHERE p.anio BETWEEN 2014 AND {{ anio }}\n"
+        f"{_TERRITORIO};",
+    ),
+    (
+        "SELECT anio, cantidad FROM mv_patentes_provincia_anio "
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE "
+        "ORDER BY anio;",
+        "SELECT p.anio, COUNT(*) as cantidad\n"
+        "FROM dim_patente p\n"
+        "WHERE p.anio BETWEEN 2014 AND {{ anio }}\n"
+        f"{_TERRITORIO}\n"
+        "GROUP BY p.anio\n"
+        "ORDER BY p.anio;",
+    ),
+    (
+        "SELECT institucion, letra_ipc_descripcion, SUM(cantidad) as cantidad FROM mv_patentes_provincia_institucion "
+        "WHERE provincia_id = {{ provincia_id }} AND anio BETWEEN 2014 AND {{ anio }} AND es_institucion_nacional = FALSE "
+        "AND institucion != 'NA' GROUP BY institucion, letra_ipc_descripcion;",
+        "SELECT b.institucion, b.letra_ipc_descripcion, COUNT(*) as cantidad\n"
+        "FROM puente_patente_institucion_ipc b\n"
+        "JOIN dim_patente p ON p.id = b.patente_id\n"
+        "WHERE b.provincia_id = {{ provincia_id }} AND p.anio BETWEEN 2014 AND {{ anio }} AND b.es_institucion_nacional = FALSE\n"
+        "AND b.institucion != 'NA'\n"
+        "GROUP BY b.institucion, b.letra_ipc_descripcion;",
+    ),
+]
+
+
+def _normalizar(sql: str) -> str:
+    return ' '.join(sql.split())
+
+
+def _actualizar(apps, pares):
+    Componente = apps.get_model('ref', 'Componente')
+    reemplazos = {_normalizar(actual): nueva for actual, nueva in pares}
+    for componente in Componente.objects.all():
+        nueva = reemplazos.get(_normalizar(componente.plantilla_sql or ''))
+        if nueva is not None:
+            componente.plantilla_sql = nueva
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def usar_dimension(apps, schema_editor):
+    _actualizar(apps, _REEMPLAZOS)
+
+
+def usar_vistas(apps, schema_editor):
+    _actualizar(apps, [(nueva, actual) for actual, nueva in _REEMPLAZOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0012_componente_agregado'),
+        ('datos_fuente', '0023_dimension_patentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(usar_dimension, usar_vistas),
+    ]
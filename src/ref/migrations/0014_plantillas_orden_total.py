@@ -0,0 +1,84 @@
+import re
+
+from django.db import migrations
+
+# Las plantillas de tablas y gráficos sin un ORDER BY total devuelven las filas en el
+# orden del plan, que cambia entre ejecuciones, estrategias (secuencial, paralelo, lote,
+# barrido) y entre la tabla y las vistas de agregados. Cada par es (fragmento actual,
+# fragmento con el orden completo): se agregan las columnas que desempatan, o el ORDER BY
+# por las claves del GROUP BY cuando no había ninguno. Los fragmentos se comparan
+# tolerando cualquier espaciado.
+_REEMPLAZOS = [
+    ('ORDER BY "{{ anio }}" DESC LIMIT 5', 'ORDER BY "{{ anio }}" DESC, gran_rubro LIMIT 5'),
+    ("ORDER BY inversion_investigador DESC", "ORDER BY inversion_investigador DESC, unidad_territorial"),
+    ("ORDER BY monto_inversion DESC", "ORDER BY monto_inversion DESC, sector_clae"),
+    ("GROUP BY tecnologias, vertical;", "GROUP BY tecnologias, vertical ORDER BY tecnologias, vertical;"),
+    ('GROUP BY "ITEnfoqueindustria";', 'GROUP BY "ITEnfoqueindustria" ORDER BY "ITEnfoqueindustria";'),
+    ("ORDER BY fob_total DESC LIMIT 10", "ORDER BY fob_total DESC, pais_destino LIMIT 10"),
+    (
+        "GROUP BY b.institucion, b.letra_ipc_descripcion;",
+        "GROUP BY b.institucion, b.letra_ipc_descripcion ORDER BY b.institucion, b.letra_ipc_descripcion;",
+    ),
+    (
+        "GROUP BY anio_publica, unidad_territorial;",
+        "GROUP BY anio_publica, unidad_territorial ORDER BY anio_publica, unidad_territorial;",
+    ),
+    (
+        "GROUP BY tipo_producto_cientifico;",
+        "GROUP BY tipo_producto_cientifico ORDER BY tipo_producto_cientifico;",
+    ),
+    (
+        "GROUP BY revista_sjr, unidad_territorial;",
+        "GROUP BY revista_sjr, unidad_territorial ORDER BY revista_sjr, unidad_territorial;",
+    ),
+    ("GROUP BY gran_area ORDER BY porcentaje DESC", "GROUP BY gran_area ORDER BY porcentaje DESC, gran_area"),
+    ("ORDER BY cantidad ASC", "ORDER BY cantidad ASC, nivel_1"),
+    ("ORDER BY total_equipos DESC", "ORDER BY total_equipos DESC, sistema_nacional"),
+    (
+        "GROUP BY gran_area_experticia ORDER BY porcentaje DESC",
+        "GROUP BY gran_area_experticia ORDER BY porcentaje DESC, gran_area_experticia",
+    ),
+    (
+        "GROUP BY tipo_personal_sicytar;",
+        "GROUP BY tipo_personal_sicytar ORDER BY tipo_personal_sicytar;",
+    ),
+    ("ORDER BY valor DESC", "ORDER BY valor DESC, unidad_territorial"),
+]
+
+
+def _patron(texto: str) -> re.Pattern:
+    """ El texto literal, tolerando cualquier espaciado y sin continuar un identificador o un ORDER BY. """
+    return re.compile(
+        r"(?<!\w)" + re.escape(texto).replace(r'\ ', r'\s+') + r"(?![\w,])(?!\s*,)", re.IGNORECASE
+    )
+
+
+def _actualizar(apps, pares):
+    Componente = apps.get_model('ref', 'Componente')
+    for componente in Componente.objects.filter(plantilla_sql__isnull=False):
+        plantilla = componente.plantilla_sql
+        for actual, nueva in pares:
+            plantilla = _patron(actual).sub(lambda m: nueva, plantilla)
+        if plantilla != componente.plantilla_sql:
+            componente.plantilla_sql = plantilla
+            componente.version += 1
+            componente.save(update_fields=['plantilla_sql', 'version'])
+
+
+def ordenar_filas(apps, schema_editor):
+    _actualizar(apps, _REEMPLAZOS)
+
+
+def quitar_desempates(apps, schema_editor):
+    _actualizar(apps, [(nueva, actual) for actual, nueva in _REEMPLAZOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ref', '0013_plantillas_dimension_patentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(ordenar_filas, quitar_desempates),
+    ]
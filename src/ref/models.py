@@ -111,6 +111,14 @@ class Componente(models.Model):
     )
 
     plantilla_sql = models.TextField(blank=True, null=True)
+    agregado = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text=(
+            'Vista de agregados desde la que se lee la consulta (ver datos_fuente.vistas_materializadas). '
+            "Vacío: se elige la más chica que la responda; 'ninguno': se lee la tabla de hechos."
+        )
+    )
     plantilla_prompt = models.TextField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1,5 +1,5 @@
 from django import template
-from jinja2 import Environment
+from datos_fuente.plantillas_jinja import renderizar_plantilla
 
 register = template.Library()
 
@@ -13,9 +13,7 @@ def render_dinamico(template_string, params):
     if not isinstance(template_string, str) or "{{" not in template_string:
         return template_string
 
-    env = Environment()
-    template = env.from_string(template_string)
-    return template.render(params)
+    return renderizar_plantilla(template_string, params)
 
 
 # Register the filter with the template library
@@ -1,3 +1,100 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import cache_resultados
+from .cache_resultados import NO_ENCONTRADO, clave_resultado, guardar_resultado, obtener_resultado
+from .generador import GeneradorInforme
+
+PLANTILLA = "SELECT SUM(valor) FROM t WHERE provincia_id = {{ provincia_id }} AND anio = {{ anio }}"
+
+
+def _item(plantilla_sql=PLANTILLA, version=1, config_override=None):
+    return SimpleNamespace(
+        componente=SimpleNamespace(id=7, version=version, plantilla_sql=plantilla_sql),
+        config_override=config_override,
+    )
+
+
+class ClaveResultadoTests(SimpleTestCase):
+
+    def test_solo_cuentan_los_parametros_que_se_usan(self):
+        clave = clave_resultado(_item(), {}, {'provincia_id': 6, 'anio': 2023})
+        self.assertTrue(clave.startswith('resultado:7:v1:'))
+        self.assertEqual(clave, clave_resultado(_item(), {}, {'anio': 2023, 'provincia_id': 6, 'poblacion': 1000}))
+        self.assertNotEqual(clave, clave_resultado(_item(), {}, {'provincia_id': 6, 'anio': 2022}))
+
+    def test_cuentan_las_variables_de_la_configuracion(self):
+        config = {'titulo': 'Exportaciones de {{ provincia_nombre }}'}
+        clave = clave_resultado(_item(), config, {'provincia_id': 6, 'anio': 2023, 'provincia_nombre': 'Chaco'})
+        self.assertNotEqual(
+            clave, clave_resultado(_item(), config, {'provincia_id': 6, 'anio': 2023, 'provincia_nombre': 'Jujuy'})
+        )
+
+    def test_cuentan_las_variables_de_una_plantilla_de_jinja(self):
+        plantilla = "SELECT * FROM t WHERE provincia LIKE '%{{ provincia_nombre }}%'"
+        clave = clave_resultado(_item(plantilla), {}, {'provincia_nombre': 'Chaco', 'anio': 2023})
+        self.assertEqual(clave, clave_resultado(_item(plantilla), {}, {'provincia_nombre': 'Chaco', 'anio': 2020}))
+        self.assertNotEqual(clave, clave_resultado(_item(plantilla), {}, {'provincia_nombre': 'Jujuy', 'anio': 2023}))
+
+    def test_la_version_y_el_override_cambian_la_clave(self):
+        params = {'provincia_id': 6, 'anio': 2023}
+        clave = clave_resultado(_item(), {}, params)
+        self.assertNotEqual(clave, clave_resultado(_item(version=2), {}, params))
+        self.assertNotEqual(clave, clave_resultado(_item(config_override={'top': 5}), {}, params))
+
+
+@override_settings(INFORMES_CACHE={'HABILITADO': True, 'TTL_VACIO': 30})
+class GuardarResultadoTests(SimpleTestCase):
+
+    def setUp(self):
+        parche = mock.patch.object(cache_resultados, '_cache')
+        self.cache = parche.start().return_value
+        self.addCleanup(parche.stop)
+
+    def test_resultado_con_datos_usa_el_ttl_del_cache(self):
+        guardar_resultado('clave', {'valor': 1})
+        self.cache.set.assert_called_once_with('clave', ({'valor': 1},))
+
+    def test_resultado_vacio_usa_ttl_vacio(self):
+        for vacio in (None, "N/A"):
+            with self.subTest(resultado=vacio):
+                self.cache.reset_mock()
+                guardar_resultado('clave', vacio)
+                self.cache.set.assert_called_once_with('clave', (vacio,), timeout=30)
+
+    def test_consulta_fallida_no_se_guarda(self):
+        guardar_resultado('clave', None, fallido=True)
+        self.cache.set.assert_not_called()
+
+    @override_settings(INFORMES_CACHE={'HABILITADO': False})
+    def test_cache_deshabilitado(self):
+        guardar_resultado('clave', {'valor': 1})
+        self.cache.set.assert_not_called()
+        self.assertIs(obtener_resultado('clave'), NO_ENCONTRADO)
+
+    def test_none_cacheado_se_distingue_de_no_encontrado(self):
+        self.cache.get.return_value = (None,)
+        self.assertIsNone(obtener_resultado('clave'))
+        self.cache.get.return_value = None
+        self.assertIs(obtener_resultado('clave'), NO_ENCONTRADO)
+
+    def test_error_del_cache_cuenta_como_no_encontrado(self):
+        self.cache.get.side_effect = OSError('disco lleno')
+        self.cache.set.side_effect = OSError('disco lleno')
+        self.assertIs(obtener_resultado('clave'), NO_ENCONTRADO)
+        guardar_resultado('clave', {'valor': 1})
+
+
+class AislamientoDeErroresTests(SimpleTestCase):
+
+    def test_componente_fallido_no_frena_el_informe_y_renderiza_su_nombre(self):
+        generador = GeneradorInforme.__new__(GeneradorInforme)
+        item = SimpleNamespace(orden=4108, componente=SimpleNamespace(
+            nombre="Cantidad de patentes (2014-{{anio}})", tipo_componente="TABLA", tipo_grafico=None,
+        ))
+        with mock.patch.object(GeneradorInforme, '_generar_componente', side_effect=RuntimeError("falló")):
+            resultado = generador._generar_componente_aislado(item, {'anio': 2023})
+        self.assertEqual(resultado['nombre'], "Cantidad de patentes (2014-2023)")
+        self.assertIsNone(resultado['resultado'])
@@ -6,4 +6,6 @@ urlpatterns = [
     # La URL debe ser de la forma: /api/v1/informes/<informe_id>/generar/?provincia_id=<id>&anio=<anio>
     # 'informe_id' es un entero que representa el ID del informe a generar
     path('informes/<int:informe_id>/generar/', views.generar_informe_api, name='generar_informe_api'),
+    # Misma API en versión asíncrona, pensada para servirse con un servidor ASGI (orquestador.asgi)
+    path('informes/<int:informe_id>/generar-async/', views.agenerar_informe_api, name='agenerar_informe_api'),
 ]
@@ -1,11 +1,44 @@
 from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
 from django.template.loader import render_to_string
+from asgiref.sync import sync_to_async
+from datos_fuente.contexto import contexto_provincia
 from datos_fuente.models import Provincia
 # from .models import Informe
 from .generador import GeneradorInforme
+from .metricas import exportar
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
+# Una línea JSON por informe generado, para poder filtrarlas y enviarlas aparte
+logger_metricas = logging.getLogger('ref.metricas')
+
+
+def _server_timing(metricas: dict, html_ms: float) -> str:
+    """
+    Arma el header Server-Timing con las etapas del informe, así los tiempos se ven
+    en las herramientas de desarrollo del navegador sin adjuntar un profiler.
+    """
+    etapas = [f"{etapa.removesuffix('_ms')};dur={duracion:.1f}" for etapa, duracion in metricas['etapas'].items()]
+    return ", ".join([*etapas, f"html;dur={html_ms:.1f}", f"total;dur={metricas['total_ms'] + html_ms:.1f}"])
+
+
+def _responder_con_metricas(request, generador, params: dict, html_string: str, html_ms: float) -> HttpResponse:
+    """ Devuelve el HTML con el header Server-Timing y registra las métricas del informe. """
+    response = HttpResponse(html_string)
+    metricas = generador.metricas
+    if metricas:
+        response['Server-Timing'] = _server_timing(metricas, html_ms)
+        logger_metricas.info(json.dumps({
+            'evento': 'informe_generado',
+            'ruta': request.path,
+            'params': params,
+            **metricas,
+            'html_ms': html_ms,
+            'bytes_respuesta': len(response.content),
+        }, ensure_ascii=False, default=str))
+    return response
 
 
 def generar_informe_api(request, informe_id):
@@ -24,7 +57,7 @@ def generar_informe_api(request, informe_id):
     try:
         provincia_id = int(provincia_id_str)
         anio = int(anio_str)
-        provincia = Provincia.objects.get(pk=provincia_id)
+        contexto_prov = contexto_provincia(provincia_id)
     except (ValueError, TypeError):
         return HttpResponseBadRequest("Los parámetros deben ser números enteros.")
     except Provincia.DoesNotExist:
@@ -33,9 +66,10 @@ def generar_informe_api(request, informe_id):
     # 2. Creamos y ejecutamos el generador
     try:
         generador = GeneradorInforme(informe_id=informe_id)
+        # El contexto de la provincia (nombre, regiones, etc.) ya se resolvió al validarla
         params = {
-            'provincia_id': provincia.provincia_id,
-            'provincia_nombre': provincia.nombre,
+            'provincia_id': provincia_id,
+            **contexto_prov,
             'anio': anio
         }
         resultados = generador.generar(params=params)
@@ -53,8 +87,10 @@ def generar_informe_api(request, informe_id):
         }
 
         # 4. Renderizamos el HTML y lo devolvemos en un HttpResponse
+        inicio_html = time.perf_counter()
         html_string = render_to_string('ref/informe_vista.html', contexto)
-        return HttpResponse(html_string)
+        html_ms = (time.perf_counter() - inicio_html) * 1000
+        return _responder_con_metricas(request, generador, params, html_string, html_ms)
         # --- FIN DE LA NUEVA LÓGICA ---
 
     except ValueError as e:
@@ -62,3 +98,68 @@ def generar_informe_api(request, informe_id):
     except Exception as e:
         logger.error(f"Error inesperado al generar el informe: {e}", exc_info=True)
         return JsonResponse({'error': 'Ocurrió un error interno en el servidor.'}, status=500)
+
+
+async def agenerar_informe_api(request, informe_id):
+    """
+    Versión asíncrona de `generar_informe_api`. Bajo un servidor ASGI, mientras las
+    consultas de un informe esperan a la base de datos el worker puede atender otras
+    generaciones.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    # 1. Obtenemos y validamos los parámetros
+    provincia_id_str = request.GET.get('provincia_id')
+    anio_str = request.GET.get('anio')
+    if not all([provincia_id_str, anio_str]):
+        return HttpResponseBadRequest("Los parámetros 'provincia_id' y 'anio' son requeridos.")
+    try:
+        provincia_id = int(provincia_id_str)
+        anio = int(anio_str)
+        contexto_prov = await sync_to_async(contexto_provincia)(provincia_id)
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("Los parámetros deben ser números enteros.")
+    except Provincia.DoesNotExist:
+        return JsonResponse({'error': f'La provincia con ID {provincia_id} no existe.'}, status=404)
+
+    # 2. Creamos y ejecutamos el generador
+    try:
+        generador = await GeneradorInforme.acrear(informe_id=informe_id)
+        # El contexto de la provincia (nombre, regiones, etc.) ya se resolvió al validarla
+        params = {
+            'provincia_id': provincia_id,
+            **contexto_prov,
+            'anio': anio
+        }
+        resultados = await generador.agenerar(params=params)
+
+        if resultados is None:
+            return JsonResponse({'error': 'No se pudo generar el informe.'}, status=500)
+
+        # 3. Renderizamos el HTML con la misma plantilla que la vista sincrónica
+        contexto = {
+            'informe': generador.informe,
+            'resultados': resultados,
+            'params': params,
+        }
+        inicio_html = time.perf_counter()
+        # El render es bloqueante y es la etapa más lenta: corre en un hilo para no frenar el loop
+        html_string = await sync_to_async(render_to_string)('ref/informe_vista.html', contexto)
+        html_ms = (time.perf_counter() - inicio_html) * 1000
+        return _responder_con_metricas(request, generador, params, html_string, html_ms)
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    except Exception as e:
+        logger.error(f"Error inesperado al generar el informe: {e}", exc_info=True)
+        return JsonResponse({'error': 'Ocurrió un error interno en el servidor.'}, status=500)
+
+
+def metricas_prometheus(request):
+    """
+    Expone las métricas de generación de informes en el formato de texto de Prometheus.
+    Con gunicorn suma los valores de todos los workers.
+    """
+    contenido, content_type = exportar()
+    return HttpResponse(contenido, content_type=content_type)